@@ -8,8 +8,10 @@ CREATE TABLE IF NOT EXISTS pcap_files (
     creator VARCHAR(255) NOT NULL COMMENT 'User ID of the creator',
     filename VARCHAR(255) NOT NULL COMMENT 'Original filename',
     file_path VARCHAR(500) NOT NULL COMMENT 'Path to the .pcap file',
-    pcap_data LONGBLOB COMMENT 'Binary PCAP file data',
+    pcap_data LONGBLOB COMMENT 'Binary PCAP file data of files saved before the blob store',
+    pcap_sha256 CHAR(64) COMMENT 'SHA-256 of the capture in the blob store',
     pcap_json JSON COMMENT 'JSON representation of PCAP data for analysis',
+    pcap_summary LONGBLOB COMMENT 'Compressed columnar per-packet summary',
     file_size BIGINT COMMENT 'Size of the file in bytes',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
@@ -22,7 +24,8 @@ CREATE TABLE IF NOT EXISTS pcap_files (
     connection_count INT COMMENT 'Number of connections',
     INDEX idx_creator (creator),
     INDEX idx_created_at (created_at),
-    INDEX idx_topology_type (topology_type)
+    INDEX idx_topology_type (topology_type),
+    INDEX idx_pcap_sha256 (pcap_sha256)
 );
 
 -- Insert some sample data for testing
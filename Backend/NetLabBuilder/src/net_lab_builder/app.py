@@ -18,7 +18,7 @@ app = Flask(__name__)
 CORS(app, supports_credentials=True)
 
 # Import and register blueprints
-from routes.topology import topology_bp
+from routes.topology import topology_bp, topology_service
 from routes.container import container_bp
 from routes.terminal import terminal_bp
 from routes.validation import validation_bp
@@ -30,9 +30,8 @@ app.register_blueprint(terminal_bp)
 app.register_blueprint(validation_bp)
 app.register_blueprint(pcap_db_bp)
 
-from services.terminal_service import TerminalService
-
-terminal_service = TerminalService()
+# One terminal service, sharing the Docker client and container state cache of the topology service
+terminal_service = topology_service.terminal_service
 
 app.terminal_service = terminal_service
 
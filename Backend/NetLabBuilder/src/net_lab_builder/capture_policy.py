@@ -0,0 +1,181 @@
+import os
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .config import _config
+
+# <name>[.<strftime stamp of -G>].pcap[<counter of -C>], e.g. r1.pcap, r1.pcap3 or r1.20240101120000.pcap2
+SEGMENT_PATTERN = re.compile(r"^(?P<name>.+?)(?:\.(?P<stamp>\d{14}))?\.pcap(?P<index>\d*)$")
+SEGMENT_STAMP = "%Y%m%d%H%M%S"
+# Size in bytes and modification time of every capture file on the volume, by path
+Segments = Dict[str, Tuple[int, float]]
+
+
+def parse_segment(path: str) -> Optional[Tuple[str, str, int]]:
+    """
+    Splits the file name of a capture segment into the name of the capture, the time stamp tcpdump put in for time based
+    rotation and the counter it appended for size based rotation.
+
+    Returns:
+        Optional[Tuple[str, str, int]]: (name, stamp or "", counter or 0), or None if the path is no capture file.
+    """
+    match = SEGMENT_PATTERN.match(os.path.basename(path))
+    if match is None:
+        return None
+    return match["name"], match["stamp"] or "", int(match["index"] or 0)
+
+
+def segment_name(path: str) -> Optional[str]:
+    """
+    Returns the name of the capture a segment belongs to, i.e. the container that writes it, or None for other files.
+    """
+    parsed = parse_segment(path)
+    return parsed[0] if parsed else None
+
+
+def sort_segments(paths: Iterable[str], current: Iterable[str] = ()) -> List[str]:
+    """
+    Orders the segments of one capture from the oldest to the newest. Paths in 'current' are written to and come last.
+    """
+    current = set(current)
+    return sorted(paths, key=lambda path: (path in current,) + parse_segment(path)[1:])
+
+
+class CapturePolicy:
+    """
+    How the nodes of a topology capture their traffic and how long the captures are kept.
+
+    Every node runs tcpdump into its own capture on the shared volume. With 'segment_mb' or 'segment_seconds' set, tcpdump
+    rotates the capture into segments (-C and -G), and the retention manager of the DockerAdapter expires closed segments
+    beyond 'max_segments' per node or older than 'max_age' seconds once they are merged, so the volume holds a ring of the
+    most recent traffic. The merged capture is rotated at the same size and kept the same way. tcpdump's own ring (-W)
+    is not used, as together with -G it stops capturing after the last file instead of wrapping around.
+
+    Policies come from the 'capture' section of a topology spec, on top of the 'capture_policy' config value:
+
+        {"capture": {"snaplen": 128, "filter": "not port 22", "segment_mb": 20, "max_segments": 5}}
+
+    Attributes:
+        snaplen (int): Bytes captured per packet, 0 for tcpdump's default of whole packets.
+        filter (str): A BPF expression selecting the captured packets, or None for all packets.
+        segment_mb (int): Starts a new segment once the current one has this many million bytes, 0 to not rotate by size.
+        segment_seconds (int): Starts a new segment every that many seconds, 0 to not rotate by time.
+        max_segments (int): Segments kept per node, including the one being written, 0 for no limit.
+        max_age (int): Seconds closed segments are kept after their last write, 0 for no limit.
+    """
+
+    FIELDS = ("snaplen", "filter", "segment_mb", "segment_seconds", "max_segments", "max_age")
+
+    def __init__(
+        self,
+        snaplen: int = 0,
+        filter: str = None,
+        segment_mb: int = 0,
+        segment_seconds: int = 0,
+        max_segments: int = 0,
+        max_age: int = 0,
+    ) -> None:
+        self.snaplen = snaplen
+        self.filter = filter or None
+        self.segment_mb = segment_mb
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.max_age = max_age
+        self.__validate()
+
+    @classmethod
+    def from_dict(cls, data: Dict = None) -> "CapturePolicy":
+        """
+        Creates a policy from the 'capture' section of a topology spec. Missing fields take the 'capture_policy' config value.
+
+        Raises:
+            ValueError: If the section has unknown fields or invalid values.
+        """
+        data = data or {}
+        unknown = sorted(set(data) - set(cls.FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown capture policy fields: {unknown}, expected some of {cls.FIELDS}")
+        return cls(**{**_config["capture_policy"], **data})
+
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @property
+    def rotates(self) -> bool:
+        return bool(self.segment_mb or self.segment_seconds)
+
+    @property
+    def segment_bytes(self) -> int:
+        """
+        The size at which segments are rotated in bytes, as tcpdump counts it, or 0.
+        """
+        return self.segment_mb * 1_000_000
+
+    def tcpdump_command(self, name: str, directory: str = "/pcap") -> List[str]:
+        """
+        Returns the tcpdump command line capturing all interfaces of a node into the capture 'name'.
+        The filter is passed as one argument, so it is never interpreted by a shell.
+        """
+        command = ["tcpdump", "-i", "any"]
+        if self.snaplen:
+            command += ["-s", str(self.snaplen)]
+        if self.segment_mb:
+            command += ["-C", str(self.segment_mb)]
+        if self.segment_seconds:
+            command += ["-G", str(self.segment_seconds)]
+        if self.rotates:
+            # tcpdump drops its privileges before opening further segments, which then fail on the root owned volume
+            command += ["-Z", "root"]
+        stamp = f".{SEGMENT_STAMP}" if self.segment_seconds else ""
+        command += ["-w", f"{directory}/{name}{stamp}.pcap"]
+        if self.filter:
+            command.append(self.filter)
+        return command
+
+    def expired(
+        self,
+        segments: Segments,
+        now: float,
+        current: Iterable[str] = (),
+        removable: Callable[[str, int], bool] = None,
+    ) -> List[str]:
+        """
+        Selects the segments to delete under this policy.
+
+        The newest segment of every capture is never expired, as it is still being written. Of the others, those beyond
+        'max_segments' per capture and those last written more than 'max_age' seconds ago are expired, oldest first.
+
+        Args:
+            segments (Segments): Size and modification time of the capture files, by path.
+            now (float): The current time, as time.time().
+            current (Iterable[str]): Paths that are the newest segment of their capture regardless of their name.
+            removable (Callable[[str, int], bool], optional): Called with the path and size of each segment that would
+                be expired, e.g. to keep segments that are not fully merged yet. Defaults to all segments.
+
+        Returns:
+            List[str]: The paths to delete.
+        """
+        captures: Dict[str, List[str]] = {}
+        for path in segments:
+            name = segment_name(path)
+            if name is not None:
+                captures.setdefault(name, []).append(path)
+
+        expired = []
+        for paths in captures.values():
+            closed = sort_segments(paths, current)[:-1]
+            excess = len(closed) + 1 - self.max_segments if self.max_segments else 0
+            for position, path in enumerate(closed):
+                size, modified = segments[path]
+                if position < excess or (self.max_age and modified < now - self.max_age):
+                    if removable is None or removable(path, size):
+                        expired.append(path)
+        return expired
+
+    def __validate(self) -> None:
+        for field in ("snaplen", "segment_mb", "segment_seconds", "max_segments", "max_age"):
+            value = getattr(self, field)
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise ValueError(f"Capture policy field '{field}' must be a non-negative integer, got {value!r}")
+        if self.filter is not None and (not isinstance(self.filter, str) or any(c in self.filter for c in "\0\n")):
+            raise ValueError(f"Capture policy filter must be a single line BPF expression, got {self.filter!r}")
@@ -1,52 +1,126 @@
-from io import StringIO
-from typing import List
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Union
+
+TEMPLATE_PATH = Path(__file__).parent.parent.resolve() / "dockerfiles" / "frr-node" / "frr.conf"
+SECTION_KEYWORDS = ("interface ", "router ", "line ", "vrf ", "route-map ", "key chain ")
+
+
+class FrrSection:
+    """
+    A section of an FRR configuration: a header line such as 'interface eth0' and its indented lines.
+    """
+
+    def __init__(self, header: str, lines: List[str] = None) -> None:
+        self.header = header
+        self.lines = lines if lines is not None else []
+
+    def render(self) -> str:
+        return self.header + "".join(self.lines)
 
 
 class FrrConfig:
-    def __init__(self, config_content):
-        self.file_obj = StringIO(config_content)
-        self.config = self._read_config()
-
-    def _read_config(self) -> List[str]:
-        self.file_obj.seek(0)  # Move to the beginning of the file
-        return self.file_obj.readlines()
-
-    def add_ospf_network(self, subnet) -> str:
-        # Check if router ospf section exists
-        router_ospf_index = None
-        for index, line in enumerate(self.config):
-            if "router ospf" in line:
-                router_ospf_index = index
-                break
-
-        # If router ospf section does not exist, create it
-        if router_ospf_index is None:
-            self.config.append("router ospf\n")
-            router_ospf_index = len(self.config) - 1
-
-        # Add the network to router ospf section
-        self.config.insert(router_ospf_index + 1, f"  network {subnet} area 0.0.0.0\n")
-
-        return self._add_interface()
-
-    def _add_interface(self) -> str:
-        # Count existing interfaces
-        interface_count = 0
-        for line in self.config:
-            if line.startswith("interface "):
-                interface_count += 1
-
-        # Determine the next interface name
-        next_interface_name = f"eth{interface_count}"
-
-        # Add the new interface configuration
-        self.config.extend(
-            [f"interface {next_interface_name}\n", "  ip ospf area 0.0.0.0\n"]
-        )
-        return next_interface_name
+    """
+    A structured model of an frr.conf file.
+
+    The configuration is kept as an ordered list of top-level lines and sections. Interface sections and the
+    'router ospf' section are indexed by name, and the OSPF networks are kept in a set, so adding a network
+    does not scan or re-read the file. The rendered text is what get_config returns and digest hashes, which
+    lets callers skip writing a configuration that did not change.
+
+    Attributes
+    ----------
+    interfaces : Dict[str, FrrSection]
+        The interface sections by interface name.
+    ospf_networks : List[str]
+        The subnets announced by OSPF, in the order they were added.
+    """
+
+    __template = None
+
+    def __init__(self, config_content: str) -> None:
+        self.__blocks: List[Union[str, FrrSection]] = []
+        self.interfaces: Dict[str, FrrSection] = {}
+        self.ospf_networks: List[str] = []
+        self.__ospf_network_set = set()
+        self.__ospf = None
+        self.__parse(config_content)
+
+    @classmethod
+    def template(cls) -> "FrrConfig":
+        """
+        Returns a new model of the frr.conf that is baked into the frr-node image, without reading it from a container.
+        """
+        if cls.__template is None:
+            cls.__template = TEMPLATE_PATH.read_text()
+        return cls(cls.__template)
+
+    def add_ospf_network(self, subnet, interface: str = None) -> str:
+        """
+        Announces a subnet in area 0 and adds the OSPF configuration of the interface the subnet is attached to.
+
+        Args:
+            subnet (str): The subnet to announce.
+            interface (str, optional): The name of the interface inside the container, see Node.wait_for_interface.
+                Defaults to the next name in the order networks are added, starting at eth0.
+
+        Returns:
+            str: The name of the added interface.
+        """
+        ospf = self.__get_ospf_section()
+        if subnet not in self.__ospf_network_set:
+            self.__ospf_network_set.add(subnet)
+            self.ospf_networks.append(subnet)
+            ospf.lines.append(f"  network {subnet} area 0.0.0.0\n")
+
+        return self._add_interface(interface)
+
+    def _add_interface(self, interface: str = None) -> str:
+        interface_name = interface or f"eth{len(self.interfaces)}"
+        if interface_name not in self.interfaces:
+            section = FrrSection(f"interface {interface_name}\n", ["  ip ospf area 0.0.0.0\n"])
+            self.interfaces[interface_name] = section
+            self.__blocks.append(section)
+        return interface_name
 
     def get_config(self) -> str:
-        return "".join(self.config)
+        return "".join(
+            block if isinstance(block, str) else block.render() for block in self.__blocks
+        )
+
+    def digest(self) -> str:
+        """
+        Returns a hash of the rendered configuration.
+        """
+        return hashlib.sha256(self.get_config().encode()).hexdigest()
+
+    def __get_ospf_section(self) -> FrrSection:
+        if self.__ospf is None:
+            self.__ospf = FrrSection("router ospf\n")
+            self.__blocks.append(self.__ospf)
+        return self.__ospf
+
+    def __parse(self, config_content: str) -> None:
+        section = None
+        for line in config_content.splitlines(keepends=True):
+            if not line.endswith("\n"):
+                line += "\n"
+            if line.startswith(SECTION_KEYWORDS):
+                section = FrrSection(line)
+                self.__blocks.append(section)
+                if line.startswith("interface "):
+                    self.interfaces[line.split()[1]] = section
+                elif line.strip() == "router ospf":
+                    self.__ospf = section
+            elif section is not None and line[:1] in (" ", "\t"):
+                section.lines.append(line)
+                if section is self.__ospf and line.split()[:1] == ["network"]:
+                    subnet = line.split()[1]
+                    self.__ospf_network_set.add(subnet)
+                    self.ospf_networks.append(subnet)
+            else:
+                section = None
+                self.__blocks.append(line)
 
     def __str__(self):
-        return "".join(self.config)
+        return self.get_config()
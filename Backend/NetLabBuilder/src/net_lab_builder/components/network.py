@@ -1,6 +1,7 @@
+from ipaddress import ip_interface, ip_network
+import threading
 import time
 from typing import List
-from ..utils import create_ipv4_from_subnet
 from .node import Node
 from docker.models.networks import Network as DockerNetwork
 
@@ -17,8 +18,8 @@ class Network:
         The unique identifier of the Docker Network.
     name : str
         The name of the Docker Network.
-    containers : list
-        List of Containers associated with the Network.
+    nodes : list
+        List of Nodes attached to the Network, looked up on access.
     subnet : str
         The subnet of the Docker Network.
     gateway : str
@@ -26,38 +27,72 @@ class Network:
 
     Methods
     -------
-    connect_node(node: Node):
-        Connects a specified Node to the Docker Network.
+    connect_node(node: Node, configure_routing: bool = True) -> str:
+        Connects a specified Node to the Docker Network and returns the IPv4 address it was given.
+        Addresses are handed out in order from the subnet, skipping the gateway and the addresses of already attached containers.
+        Unless configure_routing is False, the Network's subnet is also added to the Node's OSPF configuration.
 
     reload():
         Reloads the Docker Network.
 
     __get_network_containers() -> list:
         Fetches the list of Containers associated with the Docker Network.
+
+    __next_address() -> str:
+        Returns the next unused host address of the subnet.
     """
 
     def __init__(self, docker_network: DockerNetwork) -> None:
         self.__docker_network = docker_network
         self.id = self.__docker_network.id
         self.name = self.__docker_network.name
-        self.nodes = self.__get_network_nodes()
         self.subnet = self.__docker_network.attrs["IPAM"]["Config"][0]["Subnet"]
         self.gateway = self.__docker_network.attrs["IPAM"]["Config"][0]["Gateway"]
+        self.__address_lock = threading.Lock()
+        self.__hosts = None
+        self.__used_addresses = None
 
-    def connect_node(self, node: Node) -> None:
-        self.__docker_network.reload()
+    def connect_node(self, node: Node, configure_routing: bool = True) -> str:
+        ipv4_address = self.__next_address()
         self.__docker_network.connect(
             node.container,
-            ipv4_address=create_ipv4_from_subnet(self.subnet, node.count),
+            ipv4_address=ipv4_address,
         )
         self.__docker_network.reload()
         # TODO node call should come from NetworkController
-        node.add_network(self)
+        if configure_routing:
+            node.add_network(self, node.wait_for_interface(ipv4_address))
+        return ipv4_address
+
+    @property
+    def nodes(self) -> List[Node]:
+        """
+        The Nodes attached to the Docker Network, looked up on access.
+        """
+        return self.__get_network_nodes()
 
     def reload(self) -> None:
         self.__docker_network.reload()
 
+    def __next_address(self) -> str:
+        with self.__address_lock:
+            if self.__hosts is None:
+                # Seed once from the daemon, later addresses are only handed out by this instance
+                self.__docker_network.reload()
+                self.__used_addresses = {self.gateway} | {
+                    str(ip_interface(endpoint["IPv4Address"]).ip)
+                    for endpoint in (self.__docker_network.attrs.get("Containers") or {}).values()
+                    if endpoint.get("IPv4Address")
+                }
+                self.__hosts = ip_network(self.subnet).hosts()
+            for host in self.__hosts:
+                if str(host) not in self.__used_addresses:
+                    self.__used_addresses.add(str(host))
+                    return str(host)
+        raise ValueError(f"No free address left in subnet {self.subnet} of network {self.name}")
+
     def __get_network_nodes(self) -> List[Node]:
+        self.__docker_network.reload()
         docker_containers = self.__docker_network.containers
         containers = []
         for docker_container in docker_containers:
@@ -5,8 +5,10 @@ import time
 from docker.models.containers import ExecResult, Container
 from docker.models.networks import Network as DockerNetwork
 
+from net_lab_builder.capture_policy import CapturePolicy
 from net_lab_builder.components.frr_conf import FrrConfig
 from net_lab_builder import utils
+from net_lab_builder.config import _config
 
 
 class NodeNetworkInterface:
@@ -20,6 +22,10 @@ class Node:
     """
     A class to represent a Node for a Docker Container.
 
+    A Node only wraps the container object it is given and does not talk to the Docker daemon when it is created,
+    so containers from a sparse list can be wrapped for free. The image and the FRR configuration are fetched on
+    first access.
+
     Attributes
     ----------
     container : Container
@@ -28,14 +34,16 @@ class Node:
         The unique identifier of the Docker Container.
     name : str
         The name of the Docker Container.
-    image : str
-        The image used by the Docker Container.
+    image : Image
+        The image used by the Docker Container, fetched on first access.
     status : str
-        The status of the Docker Container.
+        The status of the Docker Container as of the last list or reload.
     count : int
         The count extracted from the Docker Container's name.
     interfaces : list
         List of interfaces associated with the Node.
+    frr_config : FrrConfig
+        The FRR configuration of the Docker Container, read on first access.
 
     Methods
     -------
@@ -48,34 +56,70 @@ class Node:
     exec(command: str) -> ExecResult:
         Executes a specified command in the Docker Container.
 
-    add_network(network: Network):
-        Adds a specified network to the Docker Container.
+    add_network(network: Network, interface: str = None):
+        Adds a specified network, attached via the given interface, to the OSPF configuration of the Docker Container.
+
+    start_tcpdump(policy: CapturePolicy = None):
+        Starts the tcpdump command for capturing network traffic under the given capture policy.
+
+    wait_for_interface(ipv4_address: str, timeout: float) -> str:
+        Waits until an interface with the given address is up inside the Docker Container.
 
-    start_tcpdump():
-        Starts the tcpdump command for capturing network traffic.
+    write_frr_config(config: FrrConfig):
+        Replaces the frr.conf of the Docker Container with the given configuration.
+
+    reload_frr():
+        Applies the current frr.conf to the running FRR daemons without restarting the container.
 
     get_logs() -> str:
         Fetches the logs associated with the Docker Container.
 
-    __get_container_status() -> str:
-        Fetches the status of the Docker Container.
+    get_container_status() -> str:
+        Reloads the Docker Container and returns its current status.
 
     _update_frr_conf(network: Network):
         Updates the FRR (Free Range Routing) configuration of the Docker Container.
     """
 
+    __slots__ = ("container", "id", "name", "count", "interfaces", "_image", "_frr_config", "__logger")
+
     def __init__(self, docker_container: Container) -> None:
         self.container = docker_container
         self.id = self.container.id
-        self.name = self.container.name
-        self.image = self.container.image
-        self._status = self.get_container_status()
+        # Containers from a sparse list only carry 'Names', inspected ones carry 'Name'
+        self.name = self.container.name or self.container.attrs["Names"][0].lstrip("/")
         # self.networks = self.get_node_networks()
         self.count = utils.extract_number(self.name)
-        self.container.reload()
         self.__logger = utils.LoggerFactory.get_logger(self.name, log_level="INFO")
         self.interfaces = []
-        self.frr_config = self._update_frr_conf()
+        self._image = None
+        self._frr_config = None
+
+    @property
+    def status(self) -> str:
+        """
+        The status of the Docker Container as of the last list or reload, without asking the daemon.
+        Use get_container_status for the current status.
+        """
+        return self.container.status
+
+    @property
+    def image(self):
+        """
+        The image of the Docker Container, fetched on first access.
+        """
+        if self._image is None:
+            self._image = self.container.image
+        return self._image
+
+    @property
+    def frr_config(self) -> FrrConfig:
+        """
+        The FRR configuration of the Docker Container, read on first access and kept in sync by the Node's own changes.
+        """
+        if self._frr_config is None:
+            self._update_frr_conf()
+        return self._frr_config
 
     def start(self) -> None:
         try:
@@ -97,23 +141,20 @@ class Node:
         except docker.errors.APIError as e:
             raise ValueError("Server error while executing command")
 
-    def add_network(self, network) -> None:
-        self.container.reload()
-
-        self._add_subnet_to_frr_conf(network.subnet)
+    def add_network(self, network, interface: str = None) -> None:
+        self._add_subnet_to_frr_conf(network.subnet, interface)
         # update frr.conf
         # run tcpdump command
 
-    def start_tcpdump(self) -> None:
+    def start_tcpdump(self, policy: CapturePolicy = None) -> None:
+        policy = policy or CapturePolicy.from_dict()
         self.__logger.info(f"Starting tcpdump for {self.name}")
         try:
             # Ensure the pcap directory exists
             self.container.exec_run("mkdir -p /pcap")
             
             # Start tcpdump in detached mode
-            result = self.container.exec_run(
-                f"tcpdump -i any -w /pcap/{self.name}.pcap", detach=True
-            )
+            result = self.container.exec_run(policy.tcpdump_command(self.name), detach=True)
             
             # Check if tcpdump started successfully
             if result[0] != 0:
@@ -131,6 +172,57 @@ class Node:
             self.__logger.error(f"Unexpected error starting tcpdump for {self.name}: {e}")
             raise ValueError(f"Error starting tcpdump for {self.name}")
 
+    def wait_for_interface(self, ipv4_address: str, timeout: float = None) -> str:
+        """
+        Polls the interface list inside the container until an interface carrying the given IPv4 address shows up.
+
+        Args:
+            ipv4_address (str): The address assigned by the network connect.
+            timeout (float, optional): Maximum number of seconds to wait. Defaults to the 'readiness_timeout' config value.
+
+        Returns:
+            str: The name of the interface holding the address.
+
+        Raises:
+            ValueError: If no interface with the address appeared before the timeout.
+        """
+        timeout = timeout if timeout is not None else _config["readiness_timeout"]
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            try:
+                exit_code, output = self.container.exec_run("ip -o -4 addr show")
+            except docker.errors.APIError as e:
+                raise ValueError(f"Server error while listing interfaces of {self.name}")
+            if exit_code == 0:
+                for line in output.decode().splitlines():
+                    fields = line.split()
+                    if len(fields) > 3 and fields[3].split("/")[0] == ipv4_address:
+                        # Veth interfaces are listed as "eth0@if12"
+                        return fields[1].split("@")[0]
+            if time.monotonic() + delay > deadline:
+                raise ValueError(
+                    f"Interface with address {ipv4_address} did not come up in {self.name} within {timeout}s"
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def reload_frr(self) -> None:
+        """
+        Applies the current /etc/frr/frr.conf to the running FRR daemons with frr-reload.
+        Falls back to restarting the container if the live reload fails.
+        """
+        try:
+            exit_code, output = self.container.exec_run(_config["frr_reload_command"])
+        except docker.errors.APIError as e:
+            raise ValueError(f"Server error while reloading FRR on {self.name}")
+        if exit_code != 0:
+            self.__logger.warning(
+                f"frr-reload failed on {self.name} (exit code {exit_code}), restarting container: "
+                f"{output.decode(errors='replace').strip()}"
+            )
+            self.container.restart()
+
     def get_logs(self) -> Any:
         try:
             return self.container.logs()
@@ -162,18 +254,24 @@ class Node:
         frr_conf_path = "/etc/frr/frr.conf"
         exec_output = self.container.exec_run(f"cat {frr_conf_path}")[1]
         result = exec_output.decode()
-        self.frr_config = FrrConfig(result)
+        self._frr_config = FrrConfig(result)
 
-    def _add_subnet_to_frr_conf(self, subnet: str) -> None:
-        self._update_frr_conf()
-        interface = self.frr_config.add_ospf_network(subnet=subnet)
-        self.interfaces.append(interface)
-        modified_config = self.frr_config.get_config()
+    def write_frr_config(self, config: FrrConfig) -> None:
+        """
+        Replaces /etc/frr/frr.conf in the Docker Container with the given configuration in a single exec.
+        The running FRR daemons only pick it up after reload_frr.
+        """
         exec_instance = self.container.exec_run(
             cmd=["sh", "-c", "cat > /etc/frr/frr.conf"],
             stdin=True,
             socket=True,
         )
         socket = exec_instance.output
-        socket._sock.sendall(modified_config.encode())
+        socket._sock.sendall(config.get_config().encode())
         socket.close()
+        self._frr_config = config
+
+    def _add_subnet_to_frr_conf(self, subnet: str, interface: str = None) -> None:
+        interface = self.frr_config.add_ospf_network(subnet=subnet, interface=interface)
+        self.interfaces.append(interface)
+        self.write_frr_config(self.frr_config)
@@ -1,2 +1,408 @@
+import heapq
+import os
+import socket
+import struct
+from typing import Callable, Dict, List, Optional, Tuple
+
+from docker.models.containers import Container
+
+from net_lab_builder import utils
+from net_lab_builder.capture_policy import Segments, segment_name
+from net_lab_builder.config import _config
+from net_lab_builder.pcap_reader import PCAP_HEADER_LENGTH, PCAP_MAGICS, RECORD_HEADER_LENGTH
+
+# Reads new bytes of capture files: {path: offset} -> {path: (offset the data starts at, data)}, starting at 0 for shrunk files
+Reader = Callable[[Dict[str, int]], Dict[str, Tuple[int, bytes]]]
+# Writes merged bytes to the target file, truncating it first if the flag is set
+Writer = Callable[[bytes, bool], None]
+# Lists the capture files on the volume with their size and modification time, by path as seen inside the containers
+Lister = Callable[[], Segments]
+# Deletes capture files from the volume
+Remover = Callable[[List[str]], None]
+# Renames a capture file on the volume: (path, new path)
+Renamer = Callable[[str, str], None]
+# Receives the new packets of a capture file: (path, link type, [(timestamp in ns, original length, packet data)]),
+# the data are views that are only valid during the call
+Observer = Callable[[str, int, List[Tuple[int, int, bytes]]], None]
+
+# Prints "<path> <offset> <length>" and the new bytes of every (path, offset) argument pair, from offset 0 for shrunk files
+EXEC_READ_SCRIPT = (
+    'while [ $# -gt 0 ]; do f=$1; o=$2; shift 2; [ -f "$f" ] || continue; '
+    's=$(stat -c %s "$f"); [ "$s" -ge "$o" ] || o=0; '
+    'echo "$f $o $((s-o))"; tail -c +$((o+1)) "$f" | head -c $((s-o)); done'
+)
+# Prints "<size> <modification time> <path>" of every capture segment in the directory given as argument
+EXEC_LIST_SCRIPT = 'for f in "$1"/*.pcap*; do [ -f "$f" ] && stat -c "%s %Y %n" "$f"; done; true'
+
+
+class PCapFile:
+    """
+    The read state of one capture file: how far it has been merged and the records that were read but not merged yet.
+    """
+
+    __slots__ = ("path", "offset", "byte_order", "nanoseconds", "linktype", "pending", "skipped")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.offset = 0
+        self.byte_order = None
+        self.nanoseconds = False
+        self.linktype = None
+        self.pending: List[Tuple[int, bytes]] = []
+        self.skipped = False
+
+
 class PCapMerger:
-    pass
+    """
+    Incrementally merges growing pcap files into one pcap file.
+
+    The merger remembers for every input file up to which offset it has been read. On each merge only the bytes appended
+    since then are read, complete records are parsed and merged by timestamp with the new records of the other files,
+    and the result is appended to the target file, so the cost of a merge depends on the new traffic only. A record whose
+    header or data has not been fully written yet is read again on the next merge.
+
+    tcpdump buffers its output, so a file can deliver records that are older than records another file has already
+    delivered. Records are therefore only written up to the oldest "newest record" among the files that received data
+    in this round; the remaining records are kept and written in a later round. Files that did not grow do not hold back
+    the others.
+
+    All files must have the link type of the first file, files with another link type are skipped. The target is written
+    with the byte order and timestamp precision of the first file, records of other files are converted.
+
+    An observer, if given, is called with the packets of every file as soon as they are parsed, before they are held
+    back for ordering, e.g. to stream them to clients while the topology runs.
+
+    Attributes:
+        files (Dict[str, PCapFile]): The read state of every input file, by path.
+        records_written (int): The number of records written to the target so far.
+        target_size (int): The number of bytes written to the current target, see start_new_target.
+    """
+
+    def __init__(self, reader: Reader, writer: Writer, observer: Optional[Observer] = None) -> None:
+        self.__reader = reader
+        self.__writer = writer
+        self.__observer = observer
+        self.__logger = utils.LoggerFactory.get_logger("PCapMerger", log_level=_config["log_level"])
+        self.__header: Optional[PCapFile] = None
+        self.__header_written = False
+        self.files: Dict[str, PCapFile] = {}
+        self.records_written = 0
+        self.target_size = 0
+
+    def merge(self, paths: List[str]) -> int:
+        """
+        Merges the records appended to the given files since the last merge into the target.
+
+        Args:
+            paths (List[str]): The capture files to merge. Files that are no longer listed are forgotten.
+
+        Returns:
+            int: The number of records appended to the target.
+        """
+        for path in list(self.files):
+            if path not in paths:
+                del self.files[path]
+        for path in paths:
+            self.files.setdefault(path, PCapFile(path))
+
+        chunks = self.__reader({path: pcap.offset for path, pcap in self.files.items() if not pcap.skipped})
+        active = []
+        for path, (start, data) in chunks.items():
+            pcap = self.files[path]
+            if start < pcap.offset:
+                self.__logger.info(f"{path} was truncated, reading it from the start")
+                pcap.offset, pcap.byte_order, pcap.pending = 0, None, []
+            if self.__parse(pcap, data, start) and pcap.pending:
+                active.append(pcap)
+
+        watermark = min((pcap.pending[-1][0] for pcap in active), default=None)
+        ready = []
+        for pcap in self.files.values():
+            if not pcap.pending:
+                continue
+            if watermark is None:
+                ready.append(pcap.pending)
+                pcap.pending = []
+            else:
+                split = len(pcap.pending)
+                while split and pcap.pending[split - 1][0] > watermark:
+                    split -= 1
+                ready.append(pcap.pending[:split])
+                pcap.pending = pcap.pending[split:]
+
+        records = [record for _, record in heapq.merge(*ready, key=lambda entry: entry[0])]
+        if self.__header is None or (self.__header_written and not records):
+            return 0
+        data = b"".join(records)
+        truncate = not self.__header_written
+        if truncate:
+            # Start a fresh target, e.g. after the backend restarted
+            data = self.__global_header() + data
+        self.__writer(data, truncate)
+        self.__header_written = True
+        self.records_written += len(records)
+        self.target_size = len(data) if truncate else self.target_size + len(data)
+        return len(records)
+
+    def start_new_target(self) -> None:
+        """
+        Makes the next merge start the target afresh with a global header, e.g. after the current target was rotated away.
+        """
+        self.__header_written = False
+        self.target_size = 0
+
+    def merged_up_to(self, path: str, size: int) -> bool:
+        """
+        Returns whether the first 'size' bytes of an input file have been read and all their records written to the
+        target, so the file can be deleted without losing records.
+        """
+        pcap = self.files.get(path)
+        return pcap is not None and (pcap.skipped or (pcap.offset >= size and not pcap.pending))
+
+    def __parse(self, pcap: PCapFile, data: bytes, start: int) -> bool:
+        """
+        Parses the complete records of a chunk into the file's pending records and advances its offset past them.
+
+        Returns:
+            bool: False if the file is skipped.
+        """
+        position = 0
+        if pcap.byte_order is None:
+            if len(data) < PCAP_HEADER_LENGTH:
+                return True
+            magic = struct.unpack_from("<I", data)[0]
+            if magic not in PCAP_MAGICS:
+                self.__logger.warning(f"{pcap.path} is not a pcap file, skipping it")
+                pcap.skipped = True
+                return False
+            pcap.byte_order, pcap.nanoseconds = PCAP_MAGICS[magic]
+            pcap.linktype = struct.unpack_from(pcap.byte_order + "I", data, 20)[0] & 0x0FFFFFFF
+            if self.__header is None:
+                self.__header = pcap
+            elif pcap.linktype != self.__header.linktype:
+                self.__logger.warning(
+                    f"{pcap.path} has link type {pcap.linktype} instead of {self.__header.linktype}, skipping it"
+                )
+                pcap.skipped = True
+                return False
+            position = PCAP_HEADER_LENGTH
+
+        record_header = struct.Struct(pcap.byte_order + "IIII")
+        scale = 1 if pcap.nanoseconds else 1000
+        convert = pcap.byte_order != self.__header.byte_order or pcap.nanoseconds != self.__header.nanoseconds
+        output_header = struct.Struct(self.__header.byte_order + "IIII")
+        output_scale = 1 if self.__header.nanoseconds else 1000
+        # Packets are passed to the observer as views of the chunk, so observing costs no copies
+        observed, view = ([], memoryview(data)) if self.__observer is not None else (None, None)
+        while position + RECORD_HEADER_LENGTH <= len(data):
+            seconds, fraction, captured, original = record_header.unpack_from(data, position)
+            end = position + RECORD_HEADER_LENGTH + captured
+            if end > len(data):
+                break
+            timestamp = seconds * 1_000_000_000 + fraction * scale
+            if convert:
+                record = output_header.pack(seconds, fraction * scale // output_scale, captured, original)
+                record += data[position + RECORD_HEADER_LENGTH:end]
+            else:
+                record = data[position:end]
+            pcap.pending.append((timestamp, record))
+            if observed is not None:
+                observed.append((timestamp, original, view[position + RECORD_HEADER_LENGTH:end]))
+            position = end
+        pcap.offset = start + position
+        if observed:
+            try:
+                self.__observer(pcap.path, pcap.linktype, observed)
+            except Exception as e:
+                self.__logger.error(f"PCAP observer failed for {pcap.path}: {e}")
+        return True
+
+    def __global_header(self) -> bytes:
+        header = self.__header
+        magic = 0xA1B23C4D if header.nanoseconds else 0xA1B2C3D4
+        return struct.pack(header.byte_order + "IHHiIII", magic, 2, 4, 0, 0, 262144, header.linktype)
+
+
+def local_reader(root: str, mount: str = "/pcap") -> Reader:
+    """
+    Returns a reader for capture files that are reachable on the local file system, e.g. through the mountpoint of
+    the capture volume. Paths are given as seen inside the containers, where the volume is mounted at 'mount'.
+    """
+
+    def read(offsets: Dict[str, int]) -> Dict[str, Tuple[int, bytes]]:
+        chunks = {}
+        for path, offset in offsets.items():
+            local_path = os.path.join(root, os.path.relpath(path, mount))
+            try:
+                with open(local_path, "rb") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    offset = offset if size >= offset else 0
+                    f.seek(offset)
+                    chunks[path] = (offset, f.read(size - offset))
+            except FileNotFoundError:
+                continue
+        return chunks
+
+    return read
+
+
+def local_lister(root: str, mount: str = "/pcap") -> Lister:
+    """
+    Returns a lister for the capture files in a directory on the local file system, e.g. the mountpoint of the capture
+    volume. Paths are returned as seen inside the containers, where the volume is mounted at 'mount'.
+    """
+
+    def list_files() -> Segments:
+        segments = {}
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if segment_name(entry.name) is not None and entry.is_file():
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    segments[f"{mount}/{entry.name}"] = (stat.st_size, stat.st_mtime)
+        return segments
+
+    return list_files
+
+
+def local_remover(root: str, mount: str = "/pcap") -> Remover:
+    """
+    Returns a remover for capture files on the local file system, given as paths seen inside the containers.
+    """
+
+    def remove(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                os.remove(os.path.join(root, os.path.relpath(path, mount)))
+            except FileNotFoundError:
+                continue
+
+    return remove
+
+
+def local_renamer(root: str, mount: str = "/pcap") -> Renamer:
+    """
+    Returns a renamer for capture files on the local file system, given as paths seen inside the containers.
+    """
+
+    def rename(path: str, new_path: str) -> None:
+        os.replace(os.path.join(root, os.path.relpath(path, mount)), os.path.join(root, os.path.relpath(new_path, mount)))
+
+    return rename
+
+
+def local_writer(path: str) -> Writer:
+    """
+    Returns a writer that appends to a file on the local file system.
+    """
+
+    def write(data: bytes, truncate: bool) -> None:
+        with open(path, "wb" if truncate else "ab") as f:
+            f.write(data)
+
+    return write
+
+
+def exec_reader(container: Container) -> Reader:
+    """
+    Returns a reader that fetches the new bytes of all capture files with a single exec in a container that has the
+    capture volume mounted.
+    """
+
+    def read(offsets: Dict[str, int]) -> Dict[str, Tuple[int, bytes]]:
+        arguments = [str(value) for path, offset in offsets.items() for value in (path, offset)]
+        exit_code, (output, errors) = container.exec_run(
+            ["sh", "-c", EXEC_READ_SCRIPT, "sh", *arguments], demux=True
+        )
+        if exit_code != 0:
+            raise ValueError(f"Reading capture files failed: {(errors or b'').decode(errors='replace')}")
+        chunks = {}
+        output = output or b""
+        position = 0
+        while position < len(output):
+            line_end = output.find(b"\n", position)
+            fields = output[position:line_end].decode(errors="replace").split(" ")
+            if line_end == -1 or len(fields) != 3 or fields[0] not in offsets:
+                # A file shrank while it was read, the next merge reads it again
+                break
+            path, offset, length = fields[0], int(fields[1]), int(fields[2])
+            data = output[line_end + 1:line_end + 1 + length]
+            if len(data) < length:
+                break
+            chunks[path] = (offset, data)
+            position = line_end + 1 + length
+        return chunks
+
+    return read
+
+
+def exec_lister(container: Container, directory: str = "/pcap") -> Lister:
+    """
+    Returns a lister that lists the capture files of a directory with a single exec in a container that has the capture
+    volume mounted.
+    """
+
+    def list_files() -> Segments:
+        exit_code, output = container.exec_run(["sh", "-c", EXEC_LIST_SCRIPT, "sh", directory])
+        if exit_code != 0:
+            raise ValueError(f"Listing capture files failed: {output.decode(errors='replace')}")
+        segments = {}
+        for line in output.decode(errors="replace").splitlines():
+            fields = line.split(" ", 2)
+            if len(fields) == 3 and segment_name(fields[2]) is not None:
+                segments[fields[2]] = (int(fields[0]), float(fields[1]))
+        return segments
+
+    return list_files
+
+
+def exec_remover(container: Container) -> Remover:
+    """
+    Returns a remover that deletes capture files with a single exec in a container that has the capture volume mounted.
+    """
+
+    def remove(paths: List[str]) -> None:
+        if not paths:
+            return
+        exit_code, output = container.exec_run(["rm", "-f", "--", *paths])
+        if exit_code != 0:
+            raise ValueError(f"Removing capture files failed: {output.decode(errors='replace')}")
+
+    return remove
+
+
+def exec_renamer(container: Container) -> Renamer:
+    """
+    Returns a renamer that renames a capture file with an exec in a container that has the capture volume mounted.
+    """
+
+    def rename(path: str, new_path: str) -> None:
+        exit_code, output = container.exec_run(["mv", "-f", "--", path, new_path])
+        if exit_code != 0:
+            raise ValueError(f"Renaming {path} failed: {output.decode(errors='replace')}")
+
+    return rename
+
+
+def exec_writer(container: Container, path: str) -> Writer:
+    """
+    Returns a writer that streams merged bytes into a file of a container through the stdin of an exec.
+    """
+
+    def write(data: bytes, truncate: bool) -> None:
+        exec_instance = container.exec_run(
+            cmd=["sh", "-c", f'cat {">" if truncate else ">>"} "$1"', "sh", path],
+            stdin=True,
+            socket=True,
+        )
+        sock = exec_instance.output._sock
+        sock.sendall(data)
+        # Wait for cat to see the end of its input and exit, so the next write cannot overtake this one
+        sock.shutdown(socket.SHUT_WR)
+        while sock.recv(4096):
+            pass
+        sock.close()
+
+    return write
@@ -1,3 +1,5 @@
+import os
+
 _config = {
     "log_level": "DEBUG",  # "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL
     "label": "prototype",
@@ -6,6 +8,52 @@ _config = {
     "client_ip_range": "0.0.3.0/24",
     "pcap_merge_interval": 3,
     "pcap_merge_target": "/pcap/merged.pcap",
+    # default capture policy of topologies whose spec has no "capture" section, see CapturePolicy. Rotation and
+    # retention are opt-in, by default every node writes a single capture that is kept
+    "capture_policy": {
+        "snaplen": 0,  # bytes per packet, 0 for whole packets
+        "filter": None,  # BPF expression
+        "segment_mb": 0,  # rotate captures at this size, 0 to not rotate by size
+        "segment_seconds": 0,  # rotate captures at this interval, 0 to not rotate by time
+        "max_segments": 0,  # segments kept per node and of the merged capture, 0 for no limit
+        "max_age": 0,  # seconds closed segments are kept, 0 for no limit
+    },
+    "provisioning_workers": 8,  # docker-py keeps at most 10 pooled connections per client
+    "readiness_timeout": 10,
+    "frr_reload_command": "python3 /usr/lib/frr/frr-reload.py --reload /etc/frr/frr.conf",
+    "subnet_pool": ("172.101.0.0", "172.254.255.255"),  # first and last address networks are allocated from
+    "subnet_prefixlen": 16,  # e.g. ("10.0.0.0", "10.255.255.255") with 24 gives 65536 networks
+    "link_addressing": "subnet",  # "subnet": every link gets a subnet_prefixlen subnet, "p2p": links are sized to their nodes
+    "link_pool": ("10.128.0.0", "10.255.255.255"),  # pool of the "p2p" link subnets
+    "link_prefixlen": 29,  # smallest link subnet, Docker needs one address of it for the bridge gateway
+    "supervisor_build_workers": 2,  # concurrent topology builds, each using provisioning_workers threads
+    "supervisor_tick_workers": 4,  # concurrent pcap merge ticks across all running topologies
+    "supervisor_teardown_workers": 2,  # concurrent teardown jobs, each using teardown_workers threads
+    "teardown_grace": 1,  # seconds containers get to stop on teardown before they are killed
+    "teardown_workers": 8,  # containers, networks or volumes removed concurrently by one teardown
+    "teardown_job_ttl": 600,  # seconds finished teardown jobs can still be polled
+    "warm_pool_size": 0,  # started node containers kept ready per user, 0 to create every node on demand
+    "warm_pool_workers": 2,  # warm containers created concurrently across all users
+    "pcap_summary_cache_size": 8,  # decoded packet summaries of stored captures kept in memory for paging
+    "pcap_query_cache_size": 32,  # filtered and sorted packet lists of recent queries
+    "pcap_query_max_limit": 1000,  # most packets returned per page
+    "pcap_db_host": os.environ.get("PCAP_DB_HOST", "localhost"),
+    "pcap_db_port": int(os.environ.get("PCAP_DB_PORT", 3307)),  # docker-compose.pcap.yml publishes MySQL on 3307
+    "pcap_db_user": os.environ.get("PCAP_DB_USER", "pcap_user"),
+    "pcap_db_password": os.environ.get("PCAP_DB_PASSWORD", "pcap_user_password"),
+    "pcap_db_name": os.environ.get("PCAP_DB_NAME", "pcap_db"),
+    "pcap_db_pool_size": int(os.environ.get("PCAP_DB_POOL_SIZE", 8)),  # open connections shared by all request threads
+    "pcap_db_pool_timeout": 10,  # seconds a request waits for a free connection
+    "pcap_db_connect_timeout": 5,  # seconds to open a connection
+    "pcap_db_health_check_interval": 30,  # connections idle for longer are pinged before they are reused
+    "pcap_blob_root": os.environ.get("PCAP_BLOB_ROOT", os.path.expanduser("~/.netlab/pcap_blobs")),  # stored captures
+    "live_capture_max_rate": 200,  # packets per second streamed to one live capture client, the rest is dropped
+    "live_capture_queue_size": 2000,  # packets queued for a slow live capture client before the oldest are dropped
+    "live_capture_max_clients": 4,  # live capture clients per topology
+    "live_capture_batch_size": 200,  # packets per live capture event
+    "live_capture_batch_interval": 0.5,  # seconds between live capture events at least
+    "live_capture_heartbeat": 15,  # seconds between live capture events when there is no traffic
+    "pcap_blob_compression": os.environ.get("PCAP_BLOB_COMPRESSION") or None,  # None or "zstd", needs zstandard
 }
 
 
@@ -0,0 +1,285 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import docker
+from docker.models.containers import Container as DockerContainer
+
+from .utils import LoggerFactory
+from .config import _config
+
+# Structured labels the DockerAdapter puts on the containers, networks and volumes of a topology
+USER_LABEL = "netlab.user"
+TOPOLOGY_LABEL = "netlab.topology"
+ROLE_LABEL = "netlab.role"  # "node", "pcap-merger", "link" or "pcap"
+# Name of pooled node containers until they are claimed, see WarmPool
+WARM_NAME_PREFIX = "netlab-warm-"
+
+# container event -> status the container has afterwards
+EVENT_STATUS = {
+    "create": "created",
+    "start": "running",
+    "unpause": "running",
+    "restart": "running",
+    "pause": "paused",
+    "die": "exited",
+    "stop": "exited",
+    "kill": None,
+}
+
+
+class ContainerState:
+    """
+    What the ContainerStateCache knows about one container.
+    """
+
+    __slots__ = ("id", "name", "status", "labels")
+
+    def __init__(self, id: str, name: str, status: str, labels: Dict[str, str]) -> None:
+        self.id = id
+        self.name = name
+        self.status = status
+        self.labels = labels
+
+
+class ContainerStateCache:
+    """
+    The ContainerStateCache class keeps the name, status and labels of every container on the host in memory.
+
+    It is seeded with a single sparse container listing and then follows the container events of the Docker daemon, so
+    questions like "which containers of this label are running" are answered without a daemon call. If the event
+    stream breaks, the cache reconnects and lists the containers again. Containers are indexed by id, name, label key and
+    label key and value, so looking up e.g. the containers of a user costs in proportion to the user's containers; other
+    code that reacts to container events registers a listener instead of opening its own event stream.
+
+    All methods are thread safe. One cache is shared by all DockerAdapters and services of a process, see
+    ContainerStateCache.shared.
+    """
+
+    __shared = None
+    __shared_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self.__logger = LoggerFactory.get_logger(
+            "ContainerStateCache", log_level=_config["log_level"]
+        )
+        self.__lock = threading.Lock()
+        self.__by_name: Dict[str, ContainerState] = {}
+        self.__by_id: Dict[str, ContainerState] = {}
+        self.__by_label: Dict[str, Set[str]] = {}
+        self.__by_label_value: Dict[Tuple[str, str], Set[str]] = {}
+        self.__listeners: List[Callable[[str, ContainerState], None]] = []
+        self.__client = None
+        self.__watcher = None
+
+    @classmethod
+    def shared(cls, client: docker.DockerClient) -> "ContainerStateCache":
+        """
+        Returns the cache of the current process, creating, seeding and starting it on first use.
+
+        Args:
+            client (docker.DockerClient): The client used to list containers and to watch container events.
+
+        Returns:
+            ContainerStateCache: The process-wide cache.
+        """
+        with cls.__shared_lock:
+            if cls.__shared is None:
+                cache = cls()
+                cache.watch(client)
+                cls.__shared = cache
+            return cls.__shared
+
+    def get(self, name: str) -> Optional[ContainerState]:
+        """
+        Returns the state of a container by name, or None if there is no such container.
+        """
+        with self.__lock:
+            return self.__by_name.get(name)
+
+    def status(self, name: str) -> Optional[str]:
+        """
+        Returns the status of a container by name, or None if there is no such container.
+        """
+        state = self.get(name)
+        return state.status if state else None
+
+    def names(self, label: str = None, status: str = None) -> List[str]:
+        """
+        Returns the names of the containers, optionally only those with the given label and status.
+        """
+        return [state.name for state in self.find(label=label, status=status)]
+
+    def find(
+        self, label: str = None, status: str = None, name_contains: str = None, labels: Dict[str, str] = None
+    ) -> List[ContainerState]:
+        """
+        Returns the containers with the given label key, status and part of the name, sorted by name.
+        Like the 'name' filter of the Docker API, name_contains matches anywhere in the name.
+
+        Args:
+            label (str, optional): A label key the containers have, with any value.
+            status (str, optional): The status of the containers.
+            name_contains (str, optional): A part of the container names.
+            labels (Dict[str, str], optional): Labels the containers have with exactly these values.
+        """
+        with self.__lock:
+            candidates = []
+            if label is not None:
+                candidates.append(self.__by_label.get(label, set()))
+            for item in (labels or {}).items():
+                candidates.append(self.__by_label_value.get(item, set()))
+            if candidates:
+                ids = set.intersection(*sorted(candidates, key=len))
+                states = [self.__by_id[container_id] for container_id in ids]
+            else:
+                states = self.__by_name.values()
+            return sorted(
+                (
+                    state
+                    for state in states
+                    if (status is None or state.status == status)
+                    and (name_contains is None or name_contains in state.name)
+                ),
+                key=lambda state: state.name,
+            )
+
+    def user_containers(self, user_id: str, status: str = None, role: str = None) -> List[ContainerState]:
+        """
+        Returns the containers of a user's topologies by the user label, sorted by name. Containers created before the
+        structured labels carry only the label key of the user's topologies and are found by it. Pooled containers that
+        are not claimed yet are left out.
+        """
+        labels = {USER_LABEL: user_id}
+        if role is not None:
+            labels[ROLE_LABEL] = role
+        states = {state.id: state for state in self.find(status=status, labels=labels)}
+        if role is None:
+            for state in self.find(label=f"{_config['label']}-{user_id}", status=status):
+                states.setdefault(state.id, state)
+        return sorted(
+            (state for state in states.values() if not state.name.startswith(WARM_NAME_PREFIX)),
+            key=lambda state: state.name,
+        )
+
+    def add_listener(self, listener: Callable[[str, ContainerState], None]) -> None:
+        """
+        Registers a function that is called with the action and the state of the container after every container
+        event, e.g. ("die", state). It runs on the event thread and must not block.
+        """
+        with self.__lock:
+            self.__listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, ContainerState], None]) -> None:
+        with self.__lock:
+            if listener in self.__listeners:
+                self.__listeners.remove(listener)
+
+    def sync(self, containers: Iterable[DockerContainer]) -> None:
+        """
+        Replaces the cached state with the given containers, which may come from a sparse listing.
+        """
+        states = [
+            ContainerState(
+                container.id,
+                container.name or container.attrs["Names"][0].lstrip("/"),
+                container.status,
+                # Sparse containers carry their labels at the top level instead of in 'Config'
+                container.attrs.get("Labels") or container.attrs.get("Config", {}).get("Labels") or {},
+            )
+            for container in containers
+        ]
+        with self.__lock:
+            self.__by_id = {state.id: state for state in states}
+            self.__by_name = {state.name: state for state in states}
+            self.__by_label = {}
+            self.__by_label_value = {}
+            for state in states:
+                self.__index(state)
+
+    def handle(self, event: Dict) -> None:
+        """
+        Applies a container event of the Docker daemon to the cache.
+        """
+        action = event.get("Action", "").split(":")[0]
+        actor = event.get("Actor", {})
+        container_id = actor.get("ID")
+        attributes = dict(actor.get("Attributes", {}))
+        with self.__lock:
+            state = self.__apply(action, container_id, attributes)
+            listeners = list(self.__listeners)
+        if state is None:
+            return
+        for listener in listeners:
+            try:
+                listener(action, state)
+            except Exception as e:
+                self.__logger.error(f"Container event listener failed on {action} of {state.name}: {e}")
+
+    def __apply(self, action: str, container_id: str, attributes: Dict[str, str]) -> Optional[ContainerState]:
+        """
+        Applies an event with the lock held and returns the state of the container, or None if the event is irrelevant.
+        """
+        state = self.__by_id.get(container_id)
+        if action == "destroy":
+            if state:
+                del self.__by_id[container_id]
+                self.__by_name.pop(state.name, None)
+                for item in state.labels.items():
+                    self.__by_label.get(item[0], set()).discard(container_id)
+                    self.__by_label_value.get(item, set()).discard(container_id)
+            return state
+        if action == "rename" and state:
+            self.__by_name.pop(state.name, None)
+            state.name = attributes.get("name", state.name)
+            self.__by_name[state.name] = state
+            return state
+        if action not in EVENT_STATUS:
+            return None
+        if state is None:
+            name = attributes.pop("name", container_id)
+            attributes.pop("image", None)
+            state = ContainerState(container_id, name, "created", attributes)
+            self.__by_id[container_id] = state
+            self.__by_name[name] = state
+            self.__index(state)
+        if EVENT_STATUS[action]:
+            state.status = EVENT_STATUS[action]
+        return state
+
+    def __index(self, state: ContainerState) -> None:
+        for item in state.labels.items():
+            self.__by_label.setdefault(item[0], set()).add(state.id)
+            self.__by_label_value.setdefault(item, set()).add(state.id)
+
+    def watch(self, client: docker.DockerClient) -> None:
+        """
+        Seeds the cache with one sparse listing of all containers and starts a daemon thread that follows the container
+        events of the Docker daemon. The event stream is opened before listing, so no change in between is missed.
+        """
+        self.__client = client
+        events = self.__open_events()
+        self.sync(client.containers.list(all=True, sparse=True))
+        self.__watcher = threading.Thread(
+            target=self.__watch_events, args=(events,), daemon=True, name="ContainerStateEvents"
+        )
+        self.__watcher.start()
+
+    def __open_events(self):
+        return self.__client.events(
+            since=int(time.time()), filters={"type": "container"}, decode=True
+        )
+
+    def __watch_events(self, events) -> None:
+        while True:
+            try:
+                for event in events:
+                    self.handle(event)
+            except Exception as e:
+                self.__logger.error(f"Container event stream failed, resyncing containers: {e}")
+            time.sleep(1)
+            try:
+                events = self.__open_events()
+                self.sync(self.__client.containers.list(all=True, sparse=True))
+            except Exception as e:
+                self.__logger.error(f"Could not reconnect to container events: {e}")
@@ -1,5 +1,6 @@
+from ipaddress import ip_network
 import os
-from pathlib import Path
+import threading
 import time
 from typing import Dict, List
 
@@ -8,7 +9,27 @@ from docker.models.networks import Network as DockerNetwork
 from docker.models.containers import Container as DockerContainer
 from docker.models.images import Image as DockerImage
 
-from .utils import LoggerFactory
+from .utils import LoggerFactory, prefixlen_for_hosts
+from .subnet_allocator import SubnetAllocator
+from .teardown import Progress, teardown
+from .warm_pool import WarmPool
+from .image_registry import ImageRegistry
+from .container_state_cache import ROLE_LABEL, TOPOLOGY_LABEL, USER_LABEL, WARM_NAME_PREFIX, ContainerStateCache
+from .live_capture import LivePacketHub
+from .capture_policy import SEGMENT_STAMP, CapturePolicy, Segments, segment_name
+from .components.pcap_merger import (
+    PCapMerger,
+    exec_lister,
+    exec_reader,
+    exec_remover,
+    exec_renamer,
+    exec_writer,
+    local_lister,
+    local_reader,
+    local_remover,
+    local_renamer,
+    local_writer,
+)
 
 from .config import _config
 
@@ -20,31 +41,78 @@ class DockerAdapter:
     The class includes methods for creating nodes, setting up and managing Docker networks, checking the health of the Docker daemon, and interacting with Docker containers. It also includes internal methods for initialising Docker images and working with packet capture files.
 
     Attributes:
-        __client: Instance of docker client for communication with Docker daemon.
+        __client: Instance of docker client for communication with Docker daemon. Can be shared between adapters by passing it to the constructor.
         __label: Label to identify objects associated with the current project.
-        images: Docker images used in the project.
-        __pcap_merger: Docker container used for merging pcap files.
-        __pcap_volume: Volume used for storing pcap files.
+        __user_id: The user whose topology the adapter manages, put in the 'netlab.user' label.
+        topology: The name of the topology, put in the 'netlab.topology' label of objects created afterwards.
+        images: Docker images used in the project, by Dockerfile directory, resolved on first use.
+        __images: Process-wide registry that builds every image at most once per version of its Dockerfile.
+        __pcap_merger: Docker container used for merging pcap files, created or looked up on first use.
+        __pcap_engine: Incremental merger that appends new capture records to the merged file, created on first use.
+        __pcap_lister: Lists the capture files on the pcap volume, created together with __pcap_engine.
+        __pcap_remover: Deletes expired capture segments from the pcap volume, created together with __pcap_engine.
+        __pcap_renamer: Rotates the merged capture on the pcap volume, created together with __pcap_engine.
+        capture_policy: The CapturePolicy of the topology, applied by the merge passes and to new nodes.
+        __pcap_volume: Volume used for storing pcap files, created on first use together with __pcap_merger.
+        __subnets: Process-wide allocator that selects subnets for new networks.
+        __link_subnets: Process-wide allocator of the 'link_pool', created on first use when 'link_addressing' is "p2p".
+        __containers: Process-wide, event-driven cache of the names, states and labels of all containers.
+        __warm_pool: Process-wide pool of started node containers that create_node claims, see warm_nodes.
     """
 
-    def __init__(self, label=None) -> None:
+    def __init__(
+        self, label=None, client: docker.DockerClient = None, user_id: str = None, topology: str = None
+    ) -> None:
         self.__logger = LoggerFactory.get_logger(
             "NodeController", log_level=_config["log_level"]
         )
-        self.__client = docker.from_env()
+        self.__client = client if client else docker.from_env()
         self.__label = label if label else _config["label"]
-        self.images = self.__init_docker_images()
+        self.__user_id = user_id
+        self.topology = topology
+        self.__subnets = SubnetAllocator.shared(self.__client)
+        self.__link_subnets = None
+        self.__containers = ContainerStateCache.shared(self.__client)
+        self.__warm_pool = WarmPool.shared(self.__client)
+        self.__images = ImageRegistry.shared(self.__client)
+        self.__pcap_lock = threading.Lock()
         self.__pcap_merger = None
-        self.__pcap_volume = self.__init_pcap()
+        self.__pcap_engine = None
+        self.__pcap_lister = None
+        self.__pcap_remover = None
+        self.__pcap_renamer = None
+        self.capture_policy = CapturePolicy.from_dict()
+        self.__pcap_volume = None
         self.__logger.info(f"DockerAdapter initialized with label: {self.__label}")
 
+    @property
+    def images(self) -> Dict[str, DockerImage]:
+        return self.__images.images()
+
+    def labels(self, role: str) -> Dict[str, str]:
+        """
+        Returns the labels of a new object of the topology: the label key 'self.__label', and 'netlab.user', 'netlab.topology' and
+        'netlab.role' for exact lookups, e.g. by ContainerStateCache.user_containers. The user and topology labels are left out if unknown.
+
+        Args:
+            role (str): What the object is, "node", "pcap-merger", "link" or "pcap".
+        """
+        labels = {self.__label: "", ROLE_LABEL: role}
+        if self.__user_id:
+            labels[USER_LABEL] = self.__user_id
+        if self.topology:
+            labels[TOPOLOGY_LABEL] = self.topology
+        return labels
+
     def create_node(
         self,
         name: str,
     ) -> DockerContainer:
         """
         This method creates and starts a new Docker container with a given name using the 'frr-node' image.
-        The container is created with specific properties such as 'network_mode' set to 'none', 'privileged' set to True, and 'pcap_data' volume mounted to '/pcap'. The container is also labeled with 'self.__label'.
+        The container is created with specific properties such as 'network_mode' set to 'none', 'privileged' set to True, and 'pcap_data' volume mounted to '/pcap'. The container is also labeled with 'self.__label' and the structured labels of the role "node", see labels.
+
+        If the warm pool holds a started container of 'self.__label', see warm_nodes, that container is renamed and returned instead. It lacks the 'netlab.topology' label.
 
         If the specified image is not found, an API error occurs, or an error occurs while creating the container, an error is logged and the corresponding exception is re-raised.
 
@@ -59,17 +127,35 @@ class DockerAdapter:
             docker.errors.APIError: If there is an API error while creating the container.
             docker.errors.ContainerError: If there is a container-related error while creating the container.
         """
-        image = self.images["frr-node"]
+        docker_container = self.__warm_pool.claim(self.__label, name)
+        if docker_container is not None:
+            return docker_container
+        return self.__create_node(name, self.labels("node"))
+
+    def warm_nodes(self, size: int = None) -> None:
+        """
+        This method keeps 'size' started node containers of 'self.__label' ready in the background, so that create_node only has to rename one.
+        The containers carry the labels of the role "node" except 'netlab.topology', which is not known before they are claimed.
+
+        Args:
+            size (int, optional): The number of containers kept ready. Defaults to the 'warm_pool_size' config value, 0 removes the pool.
+        """
+        labels = {key: value for key, value in self.labels("node").items() if key != TOPOLOGY_LABEL}
+        self.__warm_pool.fill(self.__label, lambda name: self.__create_node(name, labels), size)
+
+    def __create_node(self, name: str, labels: Dict[str, str]) -> DockerContainer:
+        image = self.__images.get("frr-node")
         try:
             self.__logger.debug(f"Creating container {name} from image {image}")
             
             # Use the same volume name as in __init_pcap
             volume_name = f"pcap_data_{self.__label}"
+            self.__init_pcap()
             
             docker_container = self.__client.containers.create(
                 image=image,
                 name=name,
-                labels=[self.__label],
+                labels=labels,
                 network_mode="none",
                 privileged=True,
                 volumes=[f"{volume_name}:/pcap"],
@@ -86,45 +172,75 @@ class DockerAdapter:
             self.__logger.error(f"Error creating container: {e}")
             raise
 
-    def create_network(self, name: str) -> DockerNetwork:
+    def create_network(self, name: str, subnet: str = None, hosts: int = None) -> DockerNetwork:
         """
-        This method creates a new Docker network with the specified name. The network is a bridge network with a subnet in the '172.100.0.0/16' to '172.254.0.0/16' range, automatically selecting the first unused subnet in that range.
-        The method uses the IPAM (IP Address Management) system for subnet and gateway specification.
+        This method creates a new Docker network with the specified name. The network is a bridge network whose subnet is taken from the SubnetAllocator, which hands out subnets of the configured 'subnet_pool' and 'subnet_prefixlen' without querying the Docker daemon, unless a subnet is given explicitly.
+        The method uses the IPAM (IP Address Management) system for subnet and gateway specification. The gateway is the first host address of the subnet.
 
-        The network is labeled with 'self.__label'.
+        If the 'link_addressing' config value is "p2p" and the number of nodes of the network is known, the subnet is instead the smallest one
+        of the 'link_pool' that fits the nodes and the gateway, but not smaller than 'link_prefixlen', so a point-to-point link takes a /29.
 
-        If no unused subnets are found in the specified range, a ValueError is raised. If an API error occurs while creating the network, an error is logged and the exception is re-raised.
+        The network is labeled with 'self.__label' and the structured labels of the role "link", see labels.
+
+        If the allocated subnet turns out to be used by a network the allocator did not know about yet, it is blocked in the allocator and the next free subnet is tried. If the pool is exhausted, a ValueError is raised. If an API error occurs while creating the network, an error is logged and the exception is re-raised.
 
         Args:
             name (str): The name to be assigned to the new network.
+            subnet (str, optional): The subnet in CIDR notation to use instead of an automatically selected one.
+            hosts (int, optional): The number of nodes that will be attached to the network.
 
         Returns:
             DockerNetwork: The created Docker network instance.
 
         Raises:
-            ValueError: If no unused subnet could be found in the specified range.
+            ValueError: If no unused subnet is left in the pool.
             docker.errors.APIError: If there is an API error while creating the network.
         """
-        labels = {self.__label: ""}
-        # Iterate from 100 to 255 and find the first free subnet
-        subnet_mask = None
-        for i in range(101, 255):
-            subnet_tmp = f"172.{i}"
-            subnet_cidr = f"{subnet_tmp}.0.0/16"
-            if self.get_network_by_subnet(subnet_cidr) is None:
-                subnet_mask = subnet_tmp
-                self.__logger.debug(f"Found free subnet: {subnet_cidr}")
-                break
-        if subnet_mask is None:
-            raise ValueError("No free subnet found in range 172.101.0.0/16 to 172.254.0.0/16")
-        ipam_pool = docker.types.IPAMPool(
-            subnet=f"{subnet_mask}.0.0/16", gateway=f"{subnet_mask}.0.1"
-        )
+        if subnet is not None:
+            self.__subnets.reserve(subnet)
+            try:
+                network = self.__create_network(name, subnet)
+            except docker.errors.APIError:
+                self.__subnets.release(subnet)
+                raise
+            self.__subnets.bind(subnet, network.id)
+            return network
+
+        allocator, prefixlen = self.__subnets, None
+        if _config["link_addressing"] == "p2p" and hosts:
+            allocator = self.__get_link_subnets()
+            prefixlen = prefixlen_for_hosts(hosts, _config["link_prefixlen"])
+        while True:
+            subnet = allocator.allocate(prefixlen)
+            try:
+                network = self.__create_network(name, subnet)
+            except docker.errors.APIError as e:
+                allocator.release(subnet)
+                if "Pool overlaps" in str(e):
+                    # The subnet overlaps a network the allocator has not seen yet or a route of the host
+                    self.__logger.debug(f"Subnet {subnet} is taken, trying the next one")
+                    allocator.block(subnet)
+                    continue
+                raise
+            allocator.bind(subnet, network.id)
+            return network
+
+    def __get_link_subnets(self) -> SubnetAllocator:
+        if self.__link_subnets is None:
+            self.__link_subnets = SubnetAllocator.shared(
+                self.__client, _config["link_pool"], _config["link_prefixlen"]
+            )
+        return self.__link_subnets
+
+    def __create_network(self, name: str, subnet: str) -> DockerNetwork:
+        labels = self.labels("link")
+        gateway = str(next(ip_network(subnet).hosts()))
+        ipam_pool = docker.types.IPAMPool(subnet=subnet, gateway=gateway)
         ipam_config = docker.types.IPAMConfig(pool_configs=[ipam_pool])
 
         try:
             self.__logger.debug(
-                f"Creating network {name} with subnet {subnet_mask}.0.0/16 and gateway {subnet_mask}.0.1"
+                f"Creating network {name} with subnet {subnet} and gateway {gateway}"
             )
             network = self.__client.networks.create(
                 name=name,
@@ -132,15 +248,51 @@ class DockerAdapter:
                 ipam=ipam_config,
                 labels=labels,
             )
-            self.__logger.info(f"Successfully created network {name} with subnet {subnet_mask}.0.0/16")
+            self.__logger.info(f"Successfully created network {name} with subnet {subnet}")
             return network
         except docker.errors.APIError as e:
             error_msg = f"Error creating network {name}: {e}"
             if "Pool overlaps" in str(e):
-                error_msg += f" - Subnet {subnet_mask}.0.0/16 is already in use by another network"
+                error_msg += f" - Subnet {subnet} is already in use by another network"
             self.__logger.error(error_msg)
             raise
 
+    def wait_for_network_connect(
+        self, network_id: str, container_id: str, since: float, timeout: float = None
+    ) -> bool:
+        """
+        This method blocks until the Docker daemon has emitted the 'connect' event for the given container on the given network.
+        Events are read starting at 'since', so an event that was emitted before this method was called is still seen.
+
+        Args:
+            network_id (str): The id of the network the container is connected to.
+            container_id (str): The id of the container that is being connected.
+            since (float): Unix timestamp taken right before the connect call.
+            timeout (float, optional): Maximum number of seconds to wait. Defaults to the 'readiness_timeout' config value.
+
+        Returns:
+            bool: True if the connect event was seen, False if the timeout expired first.
+        """
+        timeout = timeout if timeout is not None else _config["readiness_timeout"]
+        events = self.__client.events(
+            since=int(since),
+            until=int(time.time() + timeout) + 1,
+            filters={"type": "network", "event": "connect", "network": network_id},
+            decode=True,
+        )
+        try:
+            for event in events:
+                if event.get("Actor", {}).get("Attributes", {}).get("container") == container_id:
+                    return True
+        except docker.errors.APIError as e:
+            self.__logger.error(f"Error while waiting for network connect event: {e}")
+        finally:
+            events.close()
+        self.__logger.warning(
+            f"No connect event for container {container_id} on network {network_id} after {timeout}s"
+        )
+        return False
+
     def check_docker_daemon_health(self) -> bool:
         """
         This method checks the health of the Docker daemon by attempting to ping it. If the ping is successful, the method returns True. If the Docker API raises an error during the ping attempt, the method returns False.
@@ -170,11 +322,15 @@ class DockerAdapter:
             self.__logger.error(f"Error getting used subnets: {e}")
         return used_subnets
 
-    def get_containers(self) -> List[DockerContainer]:
+    def get_containers(self, sparse: bool = False) -> List[DockerContainer]:
         """
         This method retrieves a list of all Docker containers associated with the current project,
         identified by the project label. If an error occurs during the operation, it logs the error.
 
+        Args:
+            sparse (bool, optional): Return the containers as listed instead of inspecting each of them. Sparse containers
+                only carry the list payload, e.g. their name is in attrs["Names"]. Defaults to False.
+
         Returns:
             list: List of Docker containers associated with the current project.
 
@@ -183,11 +339,24 @@ class DockerAdapter:
         """
         try:
             return self.__client.containers.list(
-                all=True, filters={"label": self.__label}
+                all=True, filters={"label": self.__label}, sparse=sparse
             )
         except docker.errors.APIError as e:
             self.__logger.error(f"Error getting containers: {e}")
 
+    def get_node_containers(self, sparse: bool = False) -> List[DockerContainer]:
+        """
+        This method retrieves the node containers associated with the current project, see get_containers. Containers of other roles,
+        e.g. the pcap merger, and warm pool containers that are not claimed yet, see warm_nodes, are left out.
+
+        Args:
+            sparse (bool, optional): Return the containers as listed instead of inspecting each of them. Defaults to False.
+
+        Returns:
+            list: List of the node containers associated with the current project.
+        """
+        return [container for container in self.get_containers(sparse=sparse) or [] if _is_node(container)]
+
     def get_container(self, container_id_or_name: str) -> DockerContainer:
         """
         This method retrieves a Docker container using its id or name. If the container is not found, it returns None. If an error occurs during the operation, it logs the error.
@@ -299,6 +468,22 @@ class DockerAdapter:
         for container in self.get_containers():
             container.stop()
 
+    def teardown(self, volumes: bool = True, progress: Progress = None) -> Dict[str, List[str]]:
+        """
+        This method removes all containers, networks and, optionally, volumes labeled with 'self.__label' in bulk, see teardown.teardown.
+        The warm pool of the label is removed first, its containers are removed with the others.
+        The merge passes of the adapter stop, as the pcap merger container is removed as well.
+
+        Args:
+            volumes (bool, optional): Whether to remove the pcap volume. Defaults to True.
+            progress (Progress, optional): Called whenever an object was removed.
+
+        Returns:
+            Dict[str, List[str]]: The names of the removed "containers", "networks" and "volumes", and the "errors".
+        """
+        self.__warm_pool.remove(self.__label)
+        return teardown(self.__client, self.__label, volumes=volumes, progress=progress)
+
     def prune(self, containers=True, networks=True, volumes=False, images=False) -> None:
         """
         This method performs selective pruning of Docker resources associated with the label specified by 'self.__label'.
@@ -323,54 +508,162 @@ class DockerAdapter:
             self.__logger.debug("Pruning images...")
             self.__client.images.prune(filters={"label": self.__label})
 
-    def pcap_merge(self) -> None:
+    def pcap_merge(self, stop_event: threading.Event = None) -> None:
         """
-        This method continuously merges pcap files from all the containers managed by the current instance.
-        It reloads the state of the pcap merger container and retrieves the paths of the pcap files from all containers.
-        These files are then merged into a single file specified by the 'pcap_merge_target' config value.
-        The merge operation repeats at intervals specified by the 'pcap_merge_interval' config value.
+        This method continuously merges pcap files from all the containers managed by the current instance by calling pcap_merge_once
+        at intervals specified by the 'pcap_merge_interval' config value, until the merger container is gone or the stop event is set.
+
+        Args:
+            stop_event (threading.Event, optional): Ends the loop once set.
 
         Note:
-            This is a continuous loop intended to be used with an exception interrupt. Without an interrupt, this method will keep running indefinitely.
+            Without a stop event this is a continuous loop intended to be used with an exception interrupt and will keep running indefinitely.
         """
-        while True:
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
             try:
-                # Check if pcap merger container still exists
-                if self.__pcap_merger is None:
-                    self.__logger.error("PCAP merger container is None, cannot merge files")
+                if not self.pcap_merge_once():
                     break
-                    
-                self.__pcap_merger.reload()
-                pcap_files = self.__get_pcap_files()
-                
-                # Only attempt to merge if we have PCAP files
-                if pcap_files:
-                    pcap_files_str = " ".join(pcap_files)
-                    command = f"mergecap -w {_config['pcap_merge_target']} {pcap_files_str}"
-                    self.__logger.info(
-                        f"Merge pcap files to {_config['pcap_merge_target']}: {pcap_files_str}"
-                    )
-                    try:
-                        result = self.__pcap_merger.exec_run(command)
-                        if result[0] != 0:
-                            self.__logger.warning(f"Mergecap command returned non-zero exit code: {result[0]}")
-                            self.__logger.debug(f"Mergecap stderr: {result[1].decode('utf-8')}")
-                        else:
-                            self.__logger.info("PCAP files merged successfully")
-                    except docker.errors.APIError as e:
-                        self.__logger.error(f"Error while merging pcap files: {e.explanation}")
-                        # Don't raise here, just log and continue
-                    except docker.errors.NotFound:
-                        self.__logger.error("PCAP merger container not found, stopping merge")
-                        break
-                else:
-                    self.__logger.debug("No PCAP files found to merge, waiting...")
-                    
-                time.sleep(_config["pcap_merge_interval"])
             except Exception as e:
                 self.__logger.error(f"Unexpected error in pcap_merge: {str(e)}")
                 # Don't break on unexpected errors, just log and continue
-                time.sleep(_config["pcap_merge_interval"])
+            stop_event.wait(_config["pcap_merge_interval"])
+
+    def pcap_merge_once(self) -> bool:
+        """
+        This method performs a single merge pass. It looks up the pcap merger container in the container state cache and lists the pcap files of the running containers on the pcap volume.
+        The records appended to these files since the last pass are then merged by the incremental PCapMerger and appended to the file specified by the 'pcap_merge_target' config value.
+        If the incremental merge fails, e.g. because a file is not a plain pcap file, the whole target is rebuilt with mergecap instead and the next pass starts a fresh incremental merge.
+        After a successful merge the capture policy is applied: the target is rotated once it reached the segment size, and expired segments are deleted, see __apply_retention.
+
+        Returns:
+            bool: False if the daemon reports the pcap merger container as gone and merging should stop, True otherwise.
+        """
+        # Check if pcap merger container still exists
+        merger_name = f"{self.__label}-pcap-merger"
+        if self.__pcap_merger is None or self.__containers.status(merger_name) is None:
+            # The cache may not have seen the merger yet, or it was created by another adapter of the label, e.g.
+            # before the backend restarted, so only a daemon that does not know the container stops merging
+            try:
+                self.__pcap_merger = self.__client.containers.get(merger_name)
+            except docker.errors.NotFound:
+                self.__logger.error("PCAP merger container not found, stopping merge")
+                return False
+            except docker.errors.APIError as e:
+                self.__logger.warning(f"Could not look up the PCAP merger container, skipping merge pass: {e}")
+                return True
+        try:
+            segments = self.__get_pcap_segments()
+            pcap_files = self.__get_pcap_files(segments)
+        except docker.errors.NotFound:
+            self.__logger.error("PCAP merger container not found, stopping merge")
+            return False
+
+        # Only attempt to merge if we have PCAP files
+        if not pcap_files:
+            self.__logger.debug("No PCAP files found to merge, waiting...")
+            return True
+
+        try:
+            merged = self.__get_pcap_engine().merge(pcap_files)
+            self.__logger.debug(f"Appended {merged} records to {_config['pcap_merge_target']}")
+            self.__apply_retention(segments, pcap_files)
+            return True
+        except docker.errors.NotFound:
+            self.__logger.error("PCAP merger container not found, stopping merge")
+            return False
+        except Exception as e:
+            self.__logger.warning(f"Incremental pcap merge failed, falling back to mergecap: {e}")
+            self.__reset_pcap_engine()
+        return self.__mergecap(pcap_files)
+
+    def __mergecap(self, pcap_files: List[str]) -> bool:
+        pcap_files_str = " ".join(pcap_files)
+        command = f"mergecap -w {_config['pcap_merge_target']} {pcap_files_str}"
+        self.__logger.info(
+            f"Merge pcap files to {_config['pcap_merge_target']}: {pcap_files_str}"
+        )
+        try:
+            result = self.__pcap_merger.exec_run(command)
+            if result[0] != 0:
+                self.__logger.warning(f"Mergecap command returned non-zero exit code: {result[0]}")
+                self.__logger.debug(f"Mergecap stderr: {result[1].decode('utf-8')}")
+            else:
+                self.__logger.info("PCAP files merged successfully")
+        except docker.errors.NotFound:
+            self.__logger.error("PCAP merger container not found, stopping merge")
+            return False
+        except docker.errors.APIError as e:
+            self.__logger.error(f"Error while merging pcap files: {e.explanation}")
+            # Don't raise here, just log and continue
+        return True
+
+    def __get_pcap_engine(self) -> PCapMerger:
+        """
+        Returns the incremental merger of this adapter, creating it on first use. If the mountpoint of the pcap volume is
+        accessible, e.g. because the backend runs on the Docker host, the files are read and written directly, otherwise
+        through execs in the pcap merger container.
+        """
+        if self.__pcap_engine is None:
+            target = _config["pcap_merge_target"]
+            volume = self.__client.volumes.get(f"pcap_data_{self.__label}")
+            mountpoint = volume.attrs.get("Mountpoint")
+            if mountpoint and os.access(mountpoint, os.R_OK | os.W_OK):
+                self.__logger.debug(f"Merging pcap files in {mountpoint}")
+                reader = local_reader(mountpoint)
+                writer = local_writer(os.path.join(mountpoint, os.path.relpath(target, "/pcap")))
+                self.__pcap_lister = local_lister(mountpoint)
+                self.__pcap_remover = local_remover(mountpoint)
+                self.__pcap_renamer = local_renamer(mountpoint)
+            else:
+                reader = exec_reader(self.__pcap_merger)
+                writer = exec_writer(self.__pcap_merger, target)
+                self.__pcap_lister = exec_lister(self.__pcap_merger)
+                self.__pcap_remover = exec_remover(self.__pcap_merger)
+                self.__pcap_renamer = exec_renamer(self.__pcap_merger)
+            self.__pcap_engine = PCapMerger(reader, writer, observer=LivePacketHub.shared().observer(self.__label))
+        return self.__pcap_engine
+
+    def __reset_pcap_engine(self) -> None:
+        """
+        Drops the incremental merger together with the lister, remover and renamer created with it, so the next pass creates all of them again
+        with the same access to the pcap volume.
+        """
+        self.__pcap_engine = None
+        self.__pcap_lister = None
+        self.__pcap_remover = None
+        self.__pcap_renamer = None
+
+    def __apply_retention(self, segments: Segments, pcap_files: List[str]) -> None:
+        """
+        Applies the capture policy after a merge pass. The merged target is renamed to '<name>.<time stamp>.pcap' once it
+        reached the segment size of the policy, and the next pass starts a new target. Closed segments of the nodes and
+        of the merged capture that the policy expires are deleted, but only once all their records have been merged.
+
+        Args:
+            segments (Segments): The listing of the pcap volume the pass merged.
+            pcap_files (List[str]): The files the pass merged.
+        """
+        policy = self.capture_policy
+        engine = self.__pcap_engine
+        target = _config["pcap_merge_target"]
+        if policy.segment_bytes and engine.target_size >= policy.segment_bytes:
+            root, extension = os.path.splitext(target)
+            rotated = f"{root}.{time.strftime(SEGMENT_STAMP)}{extension}"
+            self.__pcap_renamer(target, rotated)
+            engine.start_new_target()
+            self.__logger.info(f"Rotated {target} to {rotated}")
+
+        merging = set(pcap_files)
+        expired = policy.expired(
+            segments,
+            time.time(),
+            current=[target],
+            removable=lambda path, size: path not in merging or engine.merged_up_to(path, size),
+        )
+        if expired:
+            self.__pcap_remover(expired)
+            self.__logger.info(f"Deleted {len(expired)} expired capture segments: {expired}")
 
     def remove_container_from_none_network(self, container: DockerContainer) -> None:
         """
@@ -395,143 +688,81 @@ class DockerAdapter:
                 raise
         container.reload()
 
-    def __init_docker_images(self) -> Dict[str, DockerImage]:
+    def __init_pcap(self) -> None:
         """
-        This method initializes Docker images from Dockerfiles located in the 'dockerfiles' directory.
-        It first fetches the Dockerfiles, then tries to get the corresponding Docker images.
-        If an image does not exist, it triggers the image build process.
-        Finally, it returns a dictionary mapping Dockerfiles to Docker images.
-
-        Raises:
-            ValueError: If no Dockerfiles were found in the specified directory.
+        This method initializes the 'pcap_data' volume if it does not exist and starts a new container
+        using the 'linuxserver/wireshark' image if a container with the name '{self.__label}-pcap-merger'
+        does not already exist. The new container is detached, labeled with 'self.__label' and the structured labels of the role "pcap-merger",
+        and the 'pcap_data' volume is mounted to '/pcap' in the container.
 
-        Returns:
-            Dict[str, DockerImage]: A dictionary where keys are Dockerfile names and values are corresponding DockerImage objects.
+        It runs once per adapter, before the first node is created, so constructing an adapter costs no daemon call. An existing
+        merger, e.g. of an adapter of the same label in another process, is adopted.
         """
-        dockerfiles = self.__get_dockerfiles()
-        if len(dockerfiles) == 0:
-            self.__logger.error("No dockerfiles found")
-            raise ValueError("No dockerfiles found")
-        self.__logger.debug(f"Found dockerfiles: {dockerfiles}")
-
-        images = {}
-        for dockerfile in dockerfiles:
+        if self.__pcap_merger is not None:
+            return
+        with self.__pcap_lock:
+            if self.__pcap_merger is not None:
+                return
+            # Create unique volume per user to avoid conflicts
+            volume_name = f"pcap_data_{self.__label}"
             try:
-                image = self.__client.images.get(f"{dockerfile}-image")
-            except docker.errors.ImageNotFound:
-                self.__logger.debug(
-                    f"Image {dockerfile}-image not found. Building image..."
-                )
-                image = self.__build_docker_image(dockerfile)
-            images[dockerfile] = image
-        self.__logger.debug(f"Initialized docker images: {images}")
-        return images
+                self.__pcap_volume = self.__client.volumes.get(volume_name)
+            except docker.errors.NotFound:
+                self.__pcap_volume = self.__client.volumes.create(name=volume_name, labels=self.labels("pcap"))
+
+            merger_name = f"{self.__label}-pcap-merger"
+            pcap_merger = self.get_container(merger_name)
+            if pcap_merger is None:
+                try:
+                    pcap_merger = self.__client.containers.run(
+                        image="linuxserver/wireshark",
+                        name=merger_name,
+                        detach=True,
+                        volumes=[f"{volume_name}:/pcap"],
+                        labels=self.labels("pcap-merger"),
+                    )
+                    pcap_merger.reload()
+                except docker.errors.APIError as e:
+                    if e.status_code != 409:
+                        raise
+                    # Created concurrently by another adapter of the label
+                    pcap_merger = self.__client.containers.get(merger_name)
+            self.__pcap_merger = pcap_merger
 
-    def __get_dockerfiles(self) -> List[str]:
+    def __get_pcap_segments(self) -> Segments:
         """
-        This method searches for Dockerfiles in the 'dockerfiles' directory. It checks each sub-directory for the presence of a 'Dockerfile' and appends the sub-directory name to a list if a Dockerfile is found.
-
-        Returns:
-            List[str]: A list of sub-directory names where Dockerfiles were found.
+        This method lists the capture segments on the pcap volume with their sizes and modification times with a single directory listing.
         """
-        path = Path(__file__).parent.resolve().__str__() + "/dockerfiles/"
-        dockerfiles = []
-        with os.scandir(path) as entries:
-            for entry in entries:
-                if entry.is_dir():
-                    # Check if 'Dockerfile' exists in the sub-directory
-                    if os.path.isfile(os.path.join(entry.path, "Dockerfile")):
-                        dockerfiles.append(entry.name)
-        return dockerfiles
+        self.__get_pcap_engine()
+        return self.__pcap_lister()
 
-    def __build_docker_image(self, dockerfile: str) -> DockerImage:
+    def __get_pcap_files(self, segments: Segments) -> List[str]:
         """
-        This method builds a Docker image from a specified Dockerfile. The Dockerfile is located based on the provided dockerfile name. The resulting Docker image is tagged with the dockerfile name appended by '-image'.
+        This method keeps the capture segments of the running containers managed by the current instance, excluding the one named
+        '{self.__label}-pcap-merger'. Every container captures to segments named like the container, see CapturePolicy.
+        Which containers are running is taken from the container state cache, so a call costs no daemon call regardless of the number of containers.
 
         Args:
-            dockerfile (str): The name of the Dockerfile from which to build the Docker image.
-
-        Raises:
-            ValueError: If an error was encountered during the build process.
+            segments (Segments): The listing of the pcap volume.
 
         Returns:
-            DockerImage: The Docker image object built from the Dockerfile.
+            List[str]: A list of paths to the pcap files of the running containers.
         """
-        dict_path = (
-            Path(__file__).parent.resolve().__str__() + "/dockerfiles/" + dockerfile
-        )
-        file_path = dict_path + "/Dockerfile"
-        image_name = f"{dockerfile}-image"
-        try:
-            image = self.__client.images.build(
-                path=dict_path,
-                dockerfile=file_path,
-                tag=image_name,
-                labels={self.__label: ""},
-            )[0]
-            return image
-        except docker.errors.BuildError as e:
-            self.__logger.error(e)
-            raise ValueError(f"BuildError while building image {image_name}")
-        except docker.errors.APIError as e:
-            self.__logger.error(e)
-            raise ValueError(f"APIError while building image {image_name}")
-
-    def __init_pcap(self) -> None:
-        """
-        This method initializes the 'pcap_data' volume if it does not exist and starts a new container
-        using the 'linuxserver/wireshark' image if a container with the name '{self.__label}-pcap-merger'
-        does not already exist. The new container is detached, labeled with 'self.__label',
-        and the 'pcap_data' volume is mounted to '/pcap' in the container.
-        """
-        # Create unique volume per user to avoid conflicts
-        volume_name = f"pcap_data_{self.__label}"
-        if volume_name not in [v.name for v in self.__client.volumes.list()]:
-            self.__client.volumes.create(name=volume_name, labels={self.__label: ""})
-
-        if not self.get_container(f"{self.__label}-pcap-merger"):
-            self.__pcap_merger = self.__client.containers.run(
-                image="linuxserver/wireshark",
-                name=f"{self.__label}-pcap-merger",
-                detach=True,
-                volumes=[f"{volume_name}:/pcap"],
-                labels=[self.__label],
-            )
-            self.__pcap_merger.reload()
-
-    def __get_pcap_files(self) -> List[str]:
-        """
-        This method scans all the containers managed by the current instance, excluding the one named '{self.__label}-pcap-merger',
-        and attempts to locate a pcap file in the '/pcap' directory of each container. The pcap file is expected to have the same name as the container with a '.pcap' extension.
+        running = set(self.__containers.names(label=self.__label, status="running"))
+        running.discard(f"{self.__label}-pcap-merger")
+        pcap_files = sorted(path for path in segments if segment_name(path) in running)
+        self.__logger.debug(f"Found PCAP files: {pcap_files}")
+        return pcap_files
 
-        If a pcap file is found, its path is appended to the list of pcap file paths to be returned. If a pcap file is not found, a debug message is logged.
 
-        Returns:
-            List[str]: A list of paths to the pcap files found in the scanned containers.
-        """
-        pcap_files = []
-        containers = self.get_containers()
-        
-        for container in containers:
-            try:
-                container.reload()
-                if container.status == "running":
-                    if container.name != f"{self.__label}-pcap-merger":
-                        pcap_file_path = f"/pcap/{container.name}.pcap"
-                        try:
-                            pcap_file_ls = container.exec_run(f"ls {pcap_file_path}")
-                            if pcap_file_ls[0] == 0 and pcap_file_path in pcap_file_ls[1].decode("utf-8"):
-                                pcap_files.append(f"/pcap/{container.name}.pcap")
-                                self.__logger.debug(f"Found PCAP file: {pcap_file_path}")
-                            else:
-                                self.__logger.debug(
-                                    f"PCAP file {pcap_file_path} not found in container {container.name} (exit code: {pcap_file_ls[0]})"
-                                )
-                        except docker.errors.APIError as e:
-                            self.__logger.debug(f"Error checking PCAP file in container {container.name}: {e}")
-                        except Exception as e:
-                            self.__logger.debug(f"Unexpected error checking PCAP file in container {container.name}: {e}")
-            except Exception as e:
-                self.__logger.debug(f"Error processing container {container.name}: {e}")
-                
-        return pcap_files
+def _is_node(container: DockerContainer) -> bool:
+    # Sparse containers carry their name in 'Names' and their labels at the top level
+    name = container.attrs.get("Name") or container.attrs["Names"][0]
+    name = name.lstrip("/")
+    labels = container.attrs.get("Labels") or container.attrs.get("Config", {}).get("Labels") or {}
+    # Containers created before the structured labels only have the label key
+    return (
+        labels.get(ROLE_LABEL, "node") == "node"
+        and not name.startswith(WARM_NAME_PREFIX)
+        and not name.endswith("-pcap-merger")
+    )
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import docker
+from docker.models.images import Image as DockerImage
+
+from .config import _config
+from .utils import LoggerFactory
+
+# Digest of the build context an image was built from, see dockerfile_digest
+DIGEST_LABEL = "netlab.dockerfile-digest"
+DOCKERFILES = Path(__file__).parent.resolve() / "dockerfiles"
+
+
+def dockerfile_digest(path: str) -> str:
+    """
+    Returns the SHA-256 over the relative paths and contents of all files of a build context, so any edit of the
+    Dockerfile or of a file it copies changes the digest. Python bytecode caches are skipped.
+    """
+    digest = hashlib.sha256()
+    for directory, subdirectories, files in os.walk(path):
+        subdirectories[:] = sorted(d for d in subdirectories if d != "__pycache__")
+        for name in sorted(files):
+            file_path = os.path.join(directory, name)
+            digest.update(os.path.relpath(file_path, path).encode() + b"\0")
+            with open(file_path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+class ImageRegistry:
+    """
+    The ImageRegistry class resolves the images built from the sub-directories of 'dockerfiles', building each image at
+    most once per process.
+
+    An image is named '<directory>-image' and labeled with the digest of its build context, see dockerfile_digest. The
+    first lookup of an image computes the digest and reuses the image of that name if it carries the same digest, so an
+    image is only rebuilt when its Dockerfile or build context changed. Later lookups are answered from memory.
+
+    All methods are thread safe, concurrent lookups of the same image wait for one build. One registry is shared by all
+    DockerAdapters of a process, see ImageRegistry.shared.
+    """
+
+    __shared = None
+    __shared_lock = threading.Lock()
+
+    def __init__(self, client: docker.DockerClient, directory: str = None) -> None:
+        self.__logger = LoggerFactory.get_logger("ImageRegistry", log_level=_config["log_level"])
+        self.__client = client
+        self.__directory = str(directory or DOCKERFILES)
+        self.__lock = threading.Lock()
+        self.__build_locks: Dict[str, threading.Lock] = {}
+        self.__images: Dict[str, DockerImage] = {}
+
+    @classmethod
+    def shared(cls, client: docker.DockerClient) -> "ImageRegistry":
+        """
+        Returns the registry of the current process, creating it on first use.
+
+        Args:
+            client (docker.DockerClient): The client used to look up and build the images.
+
+        Returns:
+            ImageRegistry: The process-wide registry.
+        """
+        with cls.__shared_lock:
+            if cls.__shared is None:
+                cls.__shared = cls(client)
+            return cls.__shared
+
+    def names(self) -> List[str]:
+        """
+        Returns the names of the sub-directories that contain a Dockerfile, sorted.
+        """
+        with os.scandir(self.__directory) as entries:
+            return sorted(
+                entry.name
+                for entry in entries
+                if entry.is_dir() and os.path.isfile(os.path.join(entry.path, "Dockerfile"))
+            )
+
+    def get(self, name: str) -> DockerImage:
+        """
+        Returns the image of a Dockerfile directory, building it if there is no image of its current digest.
+
+        Args:
+            name (str): The name of the directory, e.g. "frr-node".
+
+        Raises:
+            ValueError: If the directory has no Dockerfile or the image cannot be built.
+
+        Returns:
+            DockerImage: The image.
+        """
+        image = self.__images.get(name)
+        if image is not None:
+            return image
+        with self.__lock:
+            build_lock = self.__build_locks.setdefault(name, threading.Lock())
+        with build_lock:
+            if name not in self.__images:
+                self.__images[name] = self.__resolve(name)
+            return self.__images[name]
+
+    def images(self) -> Dict[str, DockerImage]:
+        """
+        Returns the images of all Dockerfile directories by name, see get.
+
+        Raises:
+            ValueError: If no Dockerfiles were found.
+        """
+        names = self.names()
+        if not names:
+            self.__logger.error("No dockerfiles found")
+            raise ValueError("No dockerfiles found")
+        return {name: self.get(name) for name in names}
+
+    def __resolve(self, name: str) -> DockerImage:
+        path = os.path.join(self.__directory, name)
+        if not os.path.isfile(os.path.join(path, "Dockerfile")):
+            raise ValueError(f"No Dockerfile found in {path}")
+        digest = dockerfile_digest(path)
+        image_name = f"{name}-image"
+        try:
+            image = self.__client.images.get(image_name)
+            if image.labels.get(DIGEST_LABEL) == digest:
+                self.__logger.debug(f"Image {image_name} is up to date")
+                return image
+            self.__logger.info(f"Image {image_name} was built from another version of {name}, rebuilding it...")
+        except docker.errors.ImageNotFound:
+            self.__logger.debug(f"Image {image_name} not found. Building image...")
+        return self.__build(name, path, image_name, digest)
+
+    def __build(self, name: str, path: str, image_name: str, digest: str) -> DockerImage:
+        try:
+            image = self.__client.images.build(
+                path=path,
+                dockerfile=os.path.join(path, "Dockerfile"),
+                tag=image_name,
+                labels={_config["label"]: "", DIGEST_LABEL: digest},
+            )[0]
+            self.__logger.info(f"Built image {image_name} from {name} with digest {digest[:12]}")
+            return image
+        except docker.errors.BuildError as e:
+            self.__logger.error(e)
+            raise ValueError(f"BuildError while building image {image_name}")
+        except docker.errors.APIError as e:
+            self.__logger.error(e)
+            raise ValueError(f"APIError while building image {image_name}")
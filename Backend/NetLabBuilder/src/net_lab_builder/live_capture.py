@@ -0,0 +1,208 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+from .capture_policy import segment_name
+from .config import _config
+from .pcap_analysis import dissect
+from .utils import LoggerFactory
+
+
+class LiveSubscription:
+    """
+    One client of the live packet stream of a topology.
+
+    Packets are queued until the client takes them. The queue is bounded and a token bucket limits how many packets per
+    second are queued, so a slow or overwhelmed client never blocks the merger: packets beyond the rate or the queue
+    size are dropped, oldest first for a full queue, and counted so the client can show that it missed some.
+
+    Attributes:
+        max_rate (float): The packets per second that are queued at most, bursts up to one second of packets.
+        dropped (int): The number of packets dropped since the client last took packets.
+    """
+
+    def __init__(self, max_rate: float, queue_size: int) -> None:
+        self.max_rate = max_rate
+        self.dropped = 0
+        self.closed = False
+        self.__packets: deque = deque(maxlen=queue_size)
+        self.__condition = threading.Condition()
+        self.__tokens = float(max_rate)
+        self.__refilled = time.monotonic()
+
+    def offer(self, packets: List[Dict[str, Any]]) -> None:
+        """
+        Queues as many of the packets as the rate limit and the queue size allow.
+        """
+        with self.__condition:
+            now = time.monotonic()
+            self.__tokens = min(self.max_rate, self.__tokens + (now - self.__refilled) * self.max_rate)
+            self.__refilled = now
+            accepted = min(len(packets), int(self.__tokens))
+            self.__tokens -= accepted
+            overflow = max(0, len(self.__packets) + accepted - self.__packets.maxlen)
+            self.dropped += len(packets) - accepted + overflow
+            self.__packets.extend(packets[:accepted])
+            self.__condition.notify_all()
+
+    def take(self, max_packets: int, timeout: float) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Waits up to timeout seconds for packets and takes at most max_packets of them.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: The packets and the number of packets dropped since the last call.
+        """
+        with self.__condition:
+            if not self.__packets and not self.closed:
+                self.__condition.wait(timeout)
+            count = min(max_packets, len(self.__packets))
+            packets = [self.__packets.popleft() for _ in range(count)]
+            dropped, self.dropped = self.dropped, 0
+            return packets, dropped
+
+    def close(self) -> None:
+        with self.__condition:
+            self.closed = True
+            self.__condition.notify_all()
+
+
+class LivePacketHub:
+    """
+    Distributes the packets of running topologies to the clients of the live packet stream.
+
+    The PCapMerger of every topology reports the packets it reads from the capture files of the nodes, see
+    LivePacketHub.observer. The hub decodes their headers and hands packet summaries to the subscriptions of the
+    topology, and counts packets and bytes per node and per pair of addresses for the graph. Topologies without
+    subscribers cost nothing but a dictionary lookup per capture file and merge.
+
+    All methods are thread safe. One hub is shared by the whole process, see LivePacketHub.shared.
+    """
+
+    __shared = None
+    __shared_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self.__logger = LoggerFactory.get_logger("LivePacketHub", log_level=_config["log_level"])
+        self.__lock = threading.Lock()
+        self.__subscriptions: Dict[str, List[LiveSubscription]] = {}
+        self.__nodes: Dict[str, Dict[str, List[int]]] = {}
+        self.__links: Dict[str, Dict[Tuple[str, str], List[int]]] = {}
+
+    @classmethod
+    def shared(cls) -> "LivePacketHub":
+        """
+        Returns the hub of the current process, creating it on first use.
+        """
+        with cls.__shared_lock:
+            if cls.__shared is None:
+                cls.__shared = cls()
+            return cls.__shared
+
+    def subscribe(self, label: str, max_rate: float = None, queue_size: int = None) -> LiveSubscription:
+        """
+        Adds a client to the live packets of a topology.
+
+        Args:
+            label (str): The label of the topology.
+            max_rate (float): Packets per second, at most and by default the 'live_capture_max_rate' config value.
+            queue_size (int): Packets queued for the client, by default the 'live_capture_queue_size' config value.
+
+        Raises:
+            ValueError: If the topology already has 'live_capture_max_clients' clients.
+        """
+        max_rate = min(max_rate or _config["live_capture_max_rate"], _config["live_capture_max_rate"])
+        subscription = LiveSubscription(max_rate, queue_size or _config["live_capture_queue_size"])
+        with self.__lock:
+            subscriptions = self.__subscriptions.setdefault(label, [])
+            if len(subscriptions) >= _config["live_capture_max_clients"]:
+                raise ValueError(f"Topology {label} already has {len(subscriptions)} live capture clients")
+            subscriptions.append(subscription)
+        self.__logger.debug(f"Live capture client added to {label}")
+        return subscription
+
+    def unsubscribe(self, label: str, subscription: LiveSubscription) -> None:
+        """
+        Removes a client. The counters of a topology are reset when its last client leaves.
+        """
+        subscription.close()
+        with self.__lock:
+            subscriptions = self.__subscriptions.get(label, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self.__subscriptions.pop(label, None)
+                self.__nodes.pop(label, None)
+                self.__links.pop(label, None)
+        self.__logger.debug(f"Live capture client removed from {label}")
+
+    def observer(self, label: str):
+        """
+        Returns the observer to pass to the PCapMerger of a topology.
+        """
+
+        def observe(path: str, linktype: int, packets: List[Tuple[int, int, bytes]]) -> None:
+            self.publish(label, path, linktype, packets)
+
+        return observe
+
+    def publish(self, label: str, path: str, linktype: int, packets: List[Tuple[int, int, bytes]]) -> None:
+        """
+        Decodes the new packets of a node's capture file and offers them to the clients of the topology.
+
+        Args:
+            label (str): The label of the topology.
+            path (str): The capture segment, named after the node's container.
+            linktype (int): The link type of the capture file.
+            packets (List[Tuple[int, int, bytes]]): The timestamp in nanoseconds, original length and data of each packet.
+        """
+        with self.__lock:
+            subscriptions = list(self.__subscriptions.get(label, ()))
+            if not subscriptions:
+                return
+            nodes = self.__nodes.setdefault(label, {})
+            links = self.__links.setdefault(label, {})
+        node = segment_name(path) or path
+        summaries = []
+        counted = []
+        for timestamp, length, data in packets:
+            packet = dissect(data, 0, linktype, timestamp, 0, len(data), length)
+            src, dst = packet.src or packet.src6, packet.dst or packet.dst6
+            summaries.append({
+                "time": timestamp / 1e9,
+                "node": node,
+                "src": src,
+                "dst": dst,
+                "protocol": packet.top_protocol,
+                "length": length,
+                "info": packet.info,
+            })
+            if src and dst:
+                counted.append(((src, dst), length))
+        with self.__lock:
+            counter = nodes.setdefault(node, [0, 0])
+            counter[0] += len(packets)
+            counter[1] += sum(length for _, length, _ in packets)
+            for key, length in counted:
+                counter = links.setdefault(key, [0, 0])
+                counter[0] += 1
+                counter[1] += length
+        for subscription in subscriptions:
+            subscription.offer(summaries)
+
+    def counters(self, label: str) -> Dict[str, Any]:
+        """
+        Returns the packets and bytes counted per node and per address pair of a topology since its first client
+        subscribed.
+        """
+        with self.__lock:
+            return {
+                "nodes": {
+                    node: {"packets": packets, "bytes": size}
+                    for node, (packets, size) in self.__nodes.get(label, {}).items()
+                },
+                "links": [
+                    {"source": src, "target": dst, "packets": packets, "bytes": size}
+                    for (src, dst), (packets, size) in self.__links.get(label, {}).items()
+                ],
+            }
@@ -1,7 +1,10 @@
+import threading
 import time
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List
 
 from .utils import LoggerFactory
+from .components.frr_conf import FrrConfig
 from .components.network import Network
 from .components.node import Node
 from .docker_adapter import DockerAdapter
@@ -12,14 +15,20 @@ class NetworkController:
     """
     The NetworkController class is responsible for managing Docker nodes and networks.
     It provides methods for creating, retrieving, connecting nodes to networks and managing system resources.
+
+    The controller owns a model of every node's FRR configuration. Attaching a node to networks only changes the
+    model, and push_frr_config writes the resulting frr.conf to the node once, skipping nodes whose configuration
+    has not changed since it was last written.
     """
 
-    def __init__(self, user_id=None):
+    def __init__(self, user_id=None, client=None, topology=None):
         """
         Initialize a new instance of the NetworkController class.
         
         Args:
             user_id (str, optional): User ID to create unique labels for isolation
+            client (docker.DockerClient, optional): Docker client to share with other controllers
+            topology (str, optional): Name of the topology, put in the labels of the created objects
         """
         self.__user_id = user_id
         # Create unique label per user to prevent conflicts
@@ -28,12 +37,22 @@ class NetworkController:
         else:
             self.__label = _config["label"]
             
-        self.adapter = DockerAdapter(self.__label)
+        self.adapter = DockerAdapter(self.__label, client=client, user_id=user_id, topology=topology)
+        self.__frr_lock = threading.Lock()
+        self.__frr_configs: Dict[str, FrrConfig] = {}
+        self.__frr_digests: Dict[str, str] = {}
         self.__logger = LoggerFactory.get_logger(
             "NetworkController", log_level=_config["log_level"]
         )
         self.__logger.info(f"NetworkController initialized with label: {self.__label}")
 
+    @property
+    def label(self) -> str:
+        """
+        The label that identifies the Docker objects managed by this controller.
+        """
+        return self.__label
+
     def create_node(self, base_name: str = "node") -> Node:
         """
         Create a new Docker node.
@@ -47,7 +66,9 @@ class NetworkController:
         node_name = self.__generate_container_name(base_name)
         self.__logger.info(f"Creating node {node_name}")
         docker_container = self.adapter.create_node(name=node_name)
-        return Node(docker_container)
+        node = Node(docker_container)
+        self.__track_new_node(node)
+        return node
 
     def get_node_by_name_or_id(
         self, node_id: str = None, node_name: str = None
@@ -75,12 +96,12 @@ class NetworkController:
 
     def get_nodes(self) -> List[Node]:
         """
-        Retrieve all Docker nodes.
+        Retrieve all Docker nodes with a single list call to the Docker daemon.
 
         Returns:
             List[Node]: A list of Node objects representing all Docker nodes.
         """
-        containers = self.adapter.get_containers()
+        containers = self.adapter.get_containers(sparse=True)
         nodes = []
         for container in containers:
             nodes.append(Node(container))
@@ -111,7 +132,6 @@ class NetworkController:
         """
         networks = []
         for docker_network in self.adapter.get_networks():
-            docker_network.reload()
             networks.append(Network(docker_network))
         return networks
 
@@ -126,21 +146,191 @@ class NetworkController:
         for node in nodes:
             self.__logger.info(f"Connecting {node.name} to {network.name}")
             self.adapter.remove_container_from_none_network(node.container)
-            network.connect_node(node)
-        # TODO sleep makes it slow. find a better way to wait for the network to be ready
-        time.sleep(2)
+            self.__connect_and_wait(network, node)
 
         for node in nodes:
-            node.container.restart()
+            self.__apply_frr_config(node)
 
-    def pcap_merge(self) -> None:
+    def frr_config(self, node: Node) -> FrrConfig:
+        """
+        Returns the controller's model of a node's FRR configuration. Nodes created by this controller start from
+        the frr.conf of the frr-node image, other nodes are read from their container once.
+
+        Args:
+            node (Node): The node whose configuration to return.
+
+        Returns:
+            FrrConfig: The configuration model, shared by all callers.
+        """
+        with self.__frr_lock:
+            config = self.__frr_configs.get(node.name)
+        if config is None:
+            config = node.frr_config
+            with self.__frr_lock:
+                config = self.__frr_configs.setdefault(node.name, config)
+                self.__frr_digests.setdefault(node.name, config.digest())
+        return config
+
+    def push_frr_config(self, node: Node) -> bool:
+        """
+        Writes the modelled FRR configuration of a node to its container, unless it is unchanged since the last write.
+
+        Args:
+            node (Node): The node whose configuration to write.
+
+        Returns:
+            bool: True if the configuration was written and FRR needs to be reloaded, False if nothing changed.
+        """
+        config = self.frr_config(node)
+        digest = config.digest()
+        with self.__frr_lock:
+            if self.__frr_digests.get(node.name) == digest:
+                return False
+        node.write_frr_config(config)
+        with self.__frr_lock:
+            self.__frr_digests[node.name] = digest
+        return True
+
+    def build_topology(
+        self,
+        spec: Dict,
+        capture: bool = True,
+        existing: Dict = None,
+        progress: Callable[[str, int, int], None] = None,
+    ) -> Dict:
+        """
+        Provision a whole topology in one batch instead of calling create_node, create_network and
+        connect_node_to_network one at a time.
+
+        Nodes and networks are created concurrently, then every node is attached to its networks
+        (one worker per node, so the node's FRR configuration model is only edited by one thread) and waits
+        until the new interfaces are up, then each node's final frr.conf is written once and FRR is reloaded,
+        and tcpdump is started on the new nodes.
+        Each phase runs on a thread pool bounded by the 'provisioning_workers' config value and only
+        starts after the previous phase has finished.
+
+        Args:
+            spec (dict): The topology to build, in the form
+                {"nodes": {<node key>: <base name>, ...}, "networks": {<network name>: [<node key>, ...], ...}}
+                with the optional keys
+                "node_names": {<node key>: <container name>} to use fixed container names,
+                "subnets": {<network name>: <subnet>} to pin the subnet of new networks,
+                "routing": "ospf" or "none" (defaults to "ospf") and
+                "capture_policy": the CapturePolicy of the topology's captures (defaults to the adapter's).
+            capture (bool): Whether to start tcpdump on every new node once the topology is up. Defaults to True.
+            existing (dict, optional): Already running objects the spec may refer to, in the form
+                {"nodes": {<node key>: Node}, "networks": {<network name>: Network}}. Existing nodes and
+                networks are not created again, only the attachments listed in the spec are made.
+            progress (Callable, optional): Called as progress(phase, completed, total) whenever a step of a
+                phase has finished successfully, and once with completed=0 when a phase starts.
+
+        Returns:
+            dict: {"nodes": {<node key>: Node}, "networks": {<network name>: Network}, "timings": {<phase>: seconds}}
+
+        Raises:
+            ValueError: If a network references a node key that is neither declared in the spec nor existing.
+        """
+        existing = existing or {}
+        existing_nodes = existing.get("nodes", {})
+        existing_networks = existing.get("networks", {})
+        node_specs = spec.get("nodes", {})
+        network_specs = spec.get("networks", {})
+        subnets = spec.get("subnets", {})
+        configure_routing = spec.get("routing", "ospf") != "none"
+        if spec.get("capture_policy") is not None:
+            self.adapter.capture_policy = spec["capture_policy"]
+        capture_policy = self.adapter.capture_policy
+        for network_name, node_keys in network_specs.items():
+            unknown = [key for key in node_keys if key not in node_specs and key not in existing_nodes]
+            if unknown:
+                raise ValueError(f"Network {network_name} references unknown nodes: {unknown}")
+
+        timings = {}
+        total_start = time.perf_counter()
+        node_names = spec.get("node_names") or dict(
+            zip(node_specs.keys(), self.__generate_container_names(list(node_specs.values())))
+        )
+
+        progress = progress or (lambda phase, completed, total: None)
+        with ThreadPoolExecutor(max_workers=_config["provisioning_workers"]) as pool:
+            start = time.perf_counter()
+            on_created = self.__progress_counter(
+                progress, "create", len(node_specs) + len(set(network_specs) - set(existing_networks))
+            )
+            node_futures = {
+                key: pool.submit(on_created(self.adapter.create_node), name=node_names[key])
+                for key in node_specs
+            }
+            network_futures = {
+                name: pool.submit(
+                    on_created(self.adapter.create_network),
+                    name=name,
+                    subnet=subnets.get(name),
+                    hosts=len(network_specs[name]),
+                )
+                for name in network_specs
+                if name not in existing_networks
+            }
+            new_nodes = {key: Node(future.result()) for key, future in node_futures.items()}
+            for node in new_nodes.values():
+                self.__track_new_node(node)
+            nodes = {**existing_nodes, **new_nodes}
+            networks = dict(existing_networks)
+            networks.update({name: Network(future.result()) for name, future in network_futures.items()})
+            timings["create"] = time.perf_counter() - start
+
+            attachments = {}
+            for network_name, node_keys in network_specs.items():
+                for key in node_keys:
+                    attachments.setdefault(key, []).append(networks[network_name])
+
+            start = time.perf_counter()
+            self.__run_parallel(
+                pool,
+                lambda key: self.__attach_node(nodes[key], attachments[key], configure_routing),
+                attachments,
+                self.__progress_counter(progress, "connect", len(attachments)),
+            )
+            timings["connect"] = time.perf_counter() - start
+
+            if configure_routing:
+                start = time.perf_counter()
+                self.__run_parallel(
+                    pool,
+                    lambda key: self.__apply_frr_config(nodes[key]),
+                    attachments,
+                    self.__progress_counter(progress, "reload", len(attachments)),
+                )
+                timings["reload"] = time.perf_counter() - start
+
+            if capture:
+                start = time.perf_counter()
+                self.__run_parallel(
+                    pool,
+                    lambda node: node.start_tcpdump(capture_policy),
+                    new_nodes.values(),
+                    self.__progress_counter(progress, "capture", len(new_nodes)),
+                )
+                timings["capture"] = time.perf_counter() - start
+
+        timings["total"] = time.perf_counter() - total_start
+        self.__logger.info(
+            f"Built topology with {len(new_nodes)} new nodes and {len(network_futures)} new networks: "
+            + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items())
+        )
+        return {"nodes": nodes, "networks": networks, "timings": timings}
+
+    def pcap_merge(self, stop_event: threading.Event = None) -> None:
         """
         Merge packet capture (pcap) files at intervals specified in the config.
+
+        Args:
+            stop_event (threading.Event, optional): Ends the merge loop once set. Without it the loop runs until interrupted.
         """
         self.__logger.info(
             f"Merging pcaps every {_config['pcap_merge_interval']} seconds..."
         )
-        self.adapter.pcap_merge()
+        self.adapter.pcap_merge(stop_event)
 
     def restart_all_nodes(self):
         self.adapter.restart_all_nodes()
@@ -150,14 +340,18 @@ class NetworkController:
         self.adapter.stop_all_nodes()
         self.__logger.info("All nodes stopped")
 
-    def stop_user_topology(self):
+    def stop_user_topology(self, progress: Callable[[str, int, int], None] = None) -> Dict:
         """
-        Stop and clean up only the containers and networks for this specific user.
+        Stop and clean up only the containers, networks and the capture volume for this specific user.
+        Containers are removed concurrently after a short grace period, see DockerAdapter.teardown.
+
+        Returns:
+            dict: The names of the removed "containers", "networks" and "volumes", and the "errors".
         """
         self.__logger.info(f"Stopping topology for user {self.__user_id}...")
-        self.adapter.stop_all_nodes()
-        self.adapter.prune(containers=True, networks=True, volumes=False, images=False)
+        result = self.adapter.teardown(progress=progress)
         self.__logger.info(f"Topology for user {self.__user_id} stopped and cleaned up")
+        return result
 
     def prune_all(self):
         """
@@ -178,11 +372,121 @@ class NetworkController:
             str: A unique container name.
         """
         node_count = 100
-        containers = self.adapter.get_containers()
+        containers = self.adapter.get_node_containers(sparse=True)
         for node in containers:
             node_count += 1
         return f"{self.__label}_{base_name}_{node_count}"
 
+    def __apply_frr_config(self, node: Node) -> None:
+        """
+        Writes a node's modelled FRR configuration and reloads FRR, if the configuration changed.
+        """
+        if self.push_frr_config(node):
+            node.reload_frr()
+
+    def __track_new_node(self, node: Node) -> None:
+        """
+        Starts the FRR configuration model of a node that was just created from the frr-node image, whose frr.conf
+        is the bundled template, so it does not have to be read from the container.
+        """
+        config = FrrConfig.template()
+        with self.__frr_lock:
+            self.__frr_configs[node.name] = config
+            self.__frr_digests[node.name] = config.digest()
+
+    def __generate_container_names(self, base_names: List[str]) -> List[str]:
+        """
+        Generates unique container names for a batch of nodes with a single container lookup,
+        numbering them the same way as __generate_container_name would if they were created one by one.
+
+        Args:
+            base_names (List[str]): The base names of the containers, in creation order.
+
+        Returns:
+            List[str]: A unique container name for every base name.
+        """
+        node_count = 100 + len(self.adapter.get_node_containers(sparse=True))
+        return [
+            f"{self.__label}_{base_name}_{node_count + index}"
+            for index, base_name in enumerate(base_names)
+        ]
+
+    def __attach_node(self, node: Node, networks: List[Network], configure_routing: bool = True) -> None:
+        """
+        Connects a single node to all of its networks, one network at a time.
+
+        Args:
+            node (Node): The node to connect.
+            networks (List[Network]): The networks the node should be attached to.
+            configure_routing (bool): Whether to add the networks to the node's OSPF configuration.
+        """
+        self.adapter.remove_container_from_none_network(node.container)
+        for network in networks:
+            self.__logger.info(f"Connecting {node.name} to {network.name}")
+            self.__connect_and_wait(network, node, configure_routing)
+
+    def __connect_and_wait(self, network: Network, node: Node, configure_routing: bool = True) -> None:
+        """
+        Connects a node to a network and blocks until the attachment is usable: the daemon has reported
+        the connect event and the interface carrying the node's address is up inside the container.
+
+        Args:
+            network (Network): The network to connect to.
+            node (Node): The node to connect.
+            configure_routing (bool): Whether to add the network to the node's OSPF configuration model, under the
+                name of the interface detected inside the container.
+        """
+        since = time.time()
+        ipv4_address = network.connect_node(node, configure_routing=False)
+        self.adapter.wait_for_network_connect(network.id, node.id, since)
+        interface = node.wait_for_interface(ipv4_address)
+        if configure_routing:
+            node.interfaces.append(self.frr_config(node).add_ospf_network(network.subnet, interface=interface))
+        self.__logger.debug(f"{node.name} is up on {network.name} via {interface} ({ipv4_address})")
+
+    @staticmethod
+    def __run_parallel(
+        pool: ThreadPoolExecutor, func: Callable, items: Iterable, counter: Callable = None
+    ) -> list:
+        """
+        Runs func for every item on the given pool and waits for all of them.
+
+        Args:
+            counter (Callable, optional): A wrapper from __progress_counter that reports each finished call.
+
+        Returns:
+            list: The results in the order of items.
+
+        Raises:
+            Exception: The first exception raised by any of the calls.
+        """
+        if counter:
+            func = counter(func)
+        futures = [pool.submit(func, item) for item in items]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def __progress_counter(progress: Callable, phase: str, total: int) -> Callable:
+        """
+        Reports the start of a phase and returns a decorator for the phase's steps that reports every
+        step which finished successfully.
+        """
+        lock = threading.Lock()
+        completed = [0]
+        progress(phase, 0, total)
+
+        def counter(func):
+            def step(*args, **kwargs):
+                result = func(*args, **kwargs)
+                with lock:
+                    completed[0] += 1
+                    progress(phase, completed[0], total)
+                return result
+
+            return step
+
+        return counter
+
     def __generate_network_name(self) -> str:
         """
         Generates a unique network name based on the label and the number of networks associated with that label.
@@ -0,0 +1,377 @@
+import socket
+import struct
+from typing import Any, Dict, List, Optional
+
+try:
+    from .pcap_reader import (
+        ETHERTYPE_IPV4,
+        ETHERTYPE_IPV6,
+        LINKTYPE_ETHERNET,
+        LINKTYPE_LINUX_SLL,
+        LINKTYPE_LINUX_SLL2,
+        LINKTYPE_LOOP,
+        LINKTYPE_NULL,
+        Buffer,
+        Source,
+        iter_records,
+        network_layer,
+        open_capture,
+    )
+    from .pcap_summary import PacketSummary, format_relative_time
+except ImportError:
+    from pcap_reader import (
+        ETHERTYPE_IPV4,
+        ETHERTYPE_IPV6,
+        LINKTYPE_ETHERNET,
+        LINKTYPE_LINUX_SLL,
+        LINKTYPE_LINUX_SLL2,
+        LINKTYPE_LOOP,
+        LINKTYPE_NULL,
+        Buffer,
+        Source,
+        iter_records,
+        network_layer,
+        open_capture,
+    )
+    from pcap_summary import PacketSummary, format_relative_time
+
+ETHERTYPE_ARP = 0x0806
+LINK_PROTOCOLS = {
+    LINKTYPE_ETHERNET: "eth",
+    LINKTYPE_LINUX_SLL: "sll",
+    LINKTYPE_LINUX_SLL2: "sll2",
+    LINKTYPE_NULL: "null",
+    LINKTYPE_LOOP: "loop",
+}
+# IP protocol number -> name in frame.protocols
+IP_PROTOCOLS = {1: "icmp", 2: "igmp", 6: "tcp", 17: "udp", 47: "gre", 58: "icmpv6", 89: "ospf", 103: "pim", 112: "vrrp", 132: "sctp"}
+# well-known UDP/TCP port -> application protocol name
+PORT_PROTOCOLS = {53: "dns", 67: "dhcp", 68: "dhcp", 123: "ntp", 179: "bgp", 520: "rip", 22: "ssh", 80: "http", 443: "tls"}
+TCP_FLAGS = ((0x02, "SYN"), (0x10, "ACK"), (0x01, "FIN"), (0x04, "RST"), (0x08, "PSH"), (0x20, "URG"))
+ICMP_TYPES = {0: "Echo (ping) reply", 3: "Destination unreachable", 8: "Echo (ping) request", 11: "Time-to-live exceeded"}
+ICMPV6_TYPES = {
+    128: "Echo (ping) request", 129: "Echo (ping) reply",
+    133: "Router Solicitation", 134: "Router Advertisement", 135: "Neighbor Solicitation", 136: "Neighbor Advertisement",
+}
+OSPF_TYPES = {1: "Hello Packet", 2: "DB Description", 3: "LS Request", 4: "LS Update", 5: "LS Acknowledge"}
+# IPv6 extension headers that are skipped to find the transport protocol
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+
+
+class Packet:
+    """
+    The header fields of one captured packet, decoded once and shared by all aggregators of an analysis.
+
+    Attributes:
+        number (int): The 1-based number of the packet in the capture.
+        timestamp (int): The capture time in nanoseconds since the epoch.
+        length (int): The length of the packet on the wire.
+        protocols (List[str]): The protocol stack, e.g. ["eth", "ethertype", "ip", "tcp"].
+        src, dst (str): The IPv4 addresses, or None.
+        src6, dst6 (str): The IPv6 addresses, or None.
+        ipv4_pair (bytes): The raw source and destination IPv4 address, or None. Cheaper to count than src and dst.
+        src_port, dst_port (int): The TCP/UDP ports, or None.
+        info (str): A one-line description in the style of Wireshark's Info column.
+    """
+
+    __slots__ = (
+        "number", "timestamp", "length", "protocols",
+        "src", "dst", "src6", "dst6", "ipv4_pair", "src_port", "dst_port", "info",
+    )
+
+    def __init__(self, number: int, timestamp: int, length: int) -> None:
+        self.number = number
+        self.timestamp = timestamp
+        self.length = length
+        self.protocols: List[str] = []
+        self.src = self.dst = self.src6 = self.dst6 = None
+        self.ipv4_pair: Optional[bytes] = None
+        self.src_port = self.dst_port = None
+        self.info = ""
+
+    @property
+    def top_protocol(self) -> str:
+        return self.protocols[-1] if self.protocols else ""
+
+
+def dissect(buffer: Buffer, number: int, linktype: int, timestamp: int, start: int, end: int, length: int) -> Packet:
+    """
+    Decodes the link, network and transport headers of a packet record, see pcap_reader.iter_records.
+    Payloads are not decoded, application protocols are named after their well-known port.
+    """
+    packet = Packet(number, timestamp, length)
+    protocols = packet.protocols
+    protocols.append(LINK_PROTOCOLS.get(linktype, "raw"))
+    ethertype, offset = network_layer(buffer, linktype, start, end)
+    if ethertype < 0:
+        return packet
+    if linktype in (LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL, LINKTYPE_LINUX_SLL2):
+        protocols.append("ethertype")
+    if ethertype == ETHERTYPE_IPV4 and offset + 20 <= end:
+        protocols.append("ip")
+        header_length = (buffer[offset] & 0x0F) * 4
+        packet.ipv4_pair = bytes(buffer[offset + 12:offset + 20])
+        packet.src = socket.inet_ntoa(packet.ipv4_pair[:4])
+        packet.dst = socket.inet_ntoa(packet.ipv4_pair[4:])
+        # Only the first fragment carries the transport header
+        fragment_offset = ((buffer[offset + 6] & 0x1F) << 8) | buffer[offset + 7]
+        protocol = buffer[offset + 9] if fragment_offset == 0 else -1
+        _dissect_transport(buffer, packet, protocol, offset + header_length, end)
+    elif ethertype == ETHERTYPE_IPV6 and offset + 40 <= end:
+        protocols.append("ipv6")
+        packet.src6 = socket.inet_ntop(socket.AF_INET6, bytes(buffer[offset + 8:offset + 24]))
+        packet.dst6 = socket.inet_ntop(socket.AF_INET6, bytes(buffer[offset + 24:offset + 40]))
+        protocol, offset = buffer[offset + 6], offset + 40
+        while protocol in IPV6_EXTENSION_HEADERS and offset + 8 <= end:
+            protocol, offset = buffer[offset], offset + 8 + buffer[offset + 1] * 8
+        _dissect_transport(buffer, packet, protocol, offset, end)
+    elif ethertype == ETHERTYPE_ARP and offset + 28 <= end:
+        protocols.append("arp")
+        operation = (buffer[offset + 6] << 8) | buffer[offset + 7]
+        sender = socket.inet_ntoa(bytes(buffer[offset + 14:offset + 18]))
+        target = socket.inet_ntoa(bytes(buffer[offset + 24:offset + 28]))
+        if operation == 1:
+            packet.info = f"Who has {target}? Tell {sender}"
+        elif operation == 2:
+            mac = ":".join(f"{byte:02x}" for byte in bytes(buffer[offset + 8:offset + 14]))
+            packet.info = f"{sender} is at {mac}"
+    return packet
+
+
+def _dissect_transport(buffer: Buffer, packet: Packet, protocol: int, offset: int, end: int) -> None:
+    if protocol < 0:
+        packet.info = "Fragmented IP protocol"
+        return
+    name = IP_PROTOCOLS.get(protocol)
+    if name is None:
+        packet.info = f"IP protocol {protocol}"
+        return
+    packet.protocols.append(name)
+    if protocol in (6, 17) and offset + 4 <= end:
+        packet.src_port, packet.dst_port = struct.unpack_from("!HH", buffer, offset)
+        application = PORT_PROTOCOLS.get(packet.dst_port) or PORT_PROTOCOLS.get(packet.src_port)
+        if protocol == 6 and offset + 20 <= end:
+            sequence, acknowledgement, data_offset, flags, window = struct.unpack_from("!IIBBH", buffer, offset + 4)
+            payload = max(end - offset - (data_offset >> 4) * 4, 0)
+            names = ", ".join(flag_name for bit, flag_name in TCP_FLAGS if flags & bit)
+            packet.info = (
+                f"{packet.src_port} → {packet.dst_port} [{names}] Seq={sequence} Ack={acknowledgement} Win={window} Len={payload}"
+            )
+            if application and payload:
+                packet.protocols.append(application)
+        elif protocol == 17 and offset + 8 <= end:
+            length = struct.unpack_from("!H", buffer, offset + 4)[0]
+            packet.info = f"{packet.src_port} → {packet.dst_port} Len={max(length - 8, 0)}"
+            if application and length > 8:
+                packet.protocols.append(application)
+    elif protocol in (1, 58) and offset + 2 <= end:
+        types = ICMP_TYPES if protocol == 1 else ICMPV6_TYPES
+        packet.info = types.get(buffer[offset], f"Type {buffer[offset]}")
+    elif protocol == 89 and offset + 2 <= end:
+        packet.info = OSPF_TYPES.get(buffer[offset + 1], "OSPF")
+
+
+class PcapAggregator:
+    """
+    Base class of the aggregators of an analysis. An aggregator sees every packet once, in capture order, and
+    summarises it into its result.
+
+    Attributes:
+        name (str): The key of the aggregator's result in the result of analyze_capture.
+    """
+
+    name = ""
+
+    def add(self, packet: Packet) -> None:
+        raise NotImplementedError
+
+    def result(self) -> Any:
+        raise NotImplementedError
+
+
+class ConnectionAggregator(PcapAggregator):
+    """
+    Counts the packets per IPv4 (source, destination) pair, in the format of pcap_parser.parse_pcap_connections.
+    """
+
+    name = "connections"
+
+    def __init__(self) -> None:
+        self.__counts: Dict[bytes, int] = {}
+
+    def add(self, packet: Packet) -> None:
+        if packet.ipv4_pair is not None:
+            self.__counts[packet.ipv4_pair] = self.__counts.get(packet.ipv4_pair, 0) + 1
+
+    def result(self) -> List[Dict]:
+        return [
+            {"source": socket.inet_ntoa(key[:4]), "destination": socket.inet_ntoa(key[4:]), "packets": count}
+            for key, count in self.__counts.items()
+        ]
+
+
+class ProtocolAggregator(PcapAggregator):
+    """
+    Counts the packets per top-level protocol, e.g. {"tcp": 10, "ospf": 4, "arp": 2}.
+    """
+
+    name = "protocols"
+
+    def __init__(self) -> None:
+        self.__counts: Dict[str, int] = {}
+
+    def add(self, packet: Packet) -> None:
+        protocol = packet.top_protocol
+        self.__counts[protocol] = self.__counts.get(protocol, 0) + 1
+
+    def result(self) -> Dict[str, int]:
+        return dict(sorted(self.__counts.items(), key=lambda item: -item[1]))
+
+
+class TotalsAggregator(PcapAggregator):
+    """
+    Counts the packets and the bytes they had on the wire.
+    """
+
+    name = "totals"
+
+    def __init__(self) -> None:
+        self.packets = 0
+        self.bytes = 0
+
+    def add(self, packet: Packet) -> None:
+        self.packets += 1
+        self.bytes += packet.length
+
+    def result(self) -> Dict[str, int]:
+        return {"packets": self.packets, "bytes": self.bytes}
+
+
+class TimeRangeAggregator(PcapAggregator):
+    """
+    Records the capture times of the first and the last packet, in nanoseconds since the epoch.
+    """
+
+    name = "time_range"
+
+    def __init__(self) -> None:
+        self.first = None
+        self.last = None
+
+    def add(self, packet: Packet) -> None:
+        if self.first is None or packet.timestamp < self.first:
+            self.first = packet.timestamp
+        if self.last is None or packet.timestamp > self.last:
+            self.last = packet.timestamp
+
+    def result(self) -> Dict[str, Optional[float]]:
+        if self.first is None:
+            return {"first": None, "last": None, "duration": 0.0}
+        return {"first": self.first / 1e9, "last": self.last / 1e9, "duration": (self.last - self.first) / 1e9}
+
+
+class SummaryRowAggregator(PcapAggregator):
+    """
+    Builds one row per packet with the fields that convert_pcap_to_json exports from tshark, so the rows can be
+    stored as the capture's JSON without running tshark.
+    """
+
+    name = "rows"
+
+    def __init__(self) -> None:
+        self.rows: List[Dict[str, str]] = []
+        self.__first = None
+
+    def add(self, packet: Packet) -> None:
+        if self.__first is None:
+            self.__first = packet.timestamp
+        self.rows.append({
+            "frame.number": str(packet.number),
+            "frame.time_relative": format_relative_time(packet.timestamp - self.__first),
+            "ip.src": packet.src or "",
+            "ip.dst": packet.dst or "",
+            "ipv6.src": packet.src6 or "",
+            "ipv6.dst": packet.dst6 or "",
+            "frame.protocols": ":".join(packet.protocols),
+            "frame.len": str(packet.length),
+            "_ws.col.Info": packet.info,
+        })
+
+    def result(self) -> List[Dict[str, str]]:
+        return self.rows
+
+
+class PacketSummaryAggregator(PcapAggregator):
+    """
+    Collects the fields of SummaryRowAggregator column by column into a PacketSummary, which takes a fraction of the
+    memory of the rows and is stored as a compressed blob.
+    """
+
+    name = "summary"
+
+    def __init__(self) -> None:
+        self.summary = PacketSummary()
+
+    def add(self, packet: Packet) -> None:
+        self.summary.append(
+            packet.timestamp,
+            packet.src or packet.src6,
+            packet.dst or packet.dst6,
+            ":".join(packet.protocols),
+            packet.length,
+            packet.info,
+        )
+
+    def result(self) -> PacketSummary:
+        return self.summary
+
+
+def default_aggregators() -> List[PcapAggregator]:
+    """
+    Returns new instances of the aggregators that run when a capture is saved.
+    """
+    return [ConnectionAggregator(), ProtocolAggregator(), TotalsAggregator(), TimeRangeAggregator(), PacketSummaryAggregator()]
+
+
+def capture_metadata(results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the metadata that is stored with a saved capture, from the results of the default aggregators.
+    The packet count is exact, 'estimated_packets' is kept for readers of older metadata.
+    """
+    totals = results["totals"]
+    time_range = results["time_range"]
+    return {
+        "packet_count": totals["packets"],
+        "estimated_packets": totals["packets"],
+        "total_bytes": totals["bytes"],
+        "protocols": [protocol.upper() for protocol in results["protocols"] if protocol],
+        "protocol_counts": results["protocols"],
+        "first_packet_time": time_range["first"],
+        "last_packet_time": time_range["last"],
+        "capture_duration": time_range["duration"],
+        "analysis_method": "single_pass",
+    }
+
+
+def analyze_capture(source: Source, aggregators: List[PcapAggregator] = None) -> Dict[str, Any]:
+    """
+    Reads a capture once and feeds every packet to all aggregators.
+
+    Args:
+        source (Source): A path, the capture itself or a binary stream, see pcap_reader.open_capture.
+        aggregators (List[PcapAggregator], optional): The aggregators to run. Defaults to default_aggregators().
+
+    Returns:
+        Dict[str, Any]: The result of every aggregator, by the aggregator's name.
+
+    Raises:
+        ValueError: If the source is neither a pcap nor a pcapng capture.
+    """
+    aggregators = aggregators if aggregators is not None else default_aggregators()
+    adders = [aggregator.add for aggregator in aggregators]
+    with open_capture(source) as buffer:
+        for number, (linktype, timestamp, start, end, length) in enumerate(iter_records(buffer), 1):
+            packet = dissect(buffer, number, linktype, timestamp, start, end, length)
+            for add in adders:
+                add(packet)
+    return {aggregator.name: aggregator.result() for aggregator in aggregators}
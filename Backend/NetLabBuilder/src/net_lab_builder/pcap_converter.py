@@ -1,18 +1,32 @@
 import subprocess
+import csv
+import io
 import json
-import tempfile
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
-def convert_pcap_to_json(pcap_file_path):
+TSHARK_FIELDS = [
+    'frame.number',
+    'frame.time_relative',
+    'ip.src',
+    'ip.dst',
+    'ipv6.src',
+    'ipv6.dst',
+    'frame.protocols',
+    'frame.len',
+    '_ws.col.Info',
+]
+
+def convert_pcap_to_json(source):
     """
-    Convert PCAP file to JSON format using tshark
-    
+    Convert a PCAP capture to JSON format using tshark.
+    Captures that are not a path are fed to tshark on stdin, so they are never written to a temporary file.
+
     Args:
-        pcap_file_path: Path to the PCAP file
-        
+        source: Path to the PCAP file, its bytes or memoryview, or a binary stream
+
     Returns:
         JSON string representation of the PCAP data or None if conversion fails
     """
@@ -21,99 +35,57 @@ def convert_pcap_to_json(pcap_file_path):
     except (subprocess.CalledProcessError, FileNotFoundError):
         logger.error("tshark is not available. Please install Wireshark/tshark.")
         return None
-    
+
     try:
-        with tempfile.NamedTemporaryFile(mode='w+', suffix='.json', delete=False) as temp_json:
-            temp_json_path = temp_json.name
-        
-        cmd = [
-            'tshark', '-r', pcap_file_path, '-T', 'fields',
-            '-e', 'frame.number',
-            '-e', 'frame.time_relative',
-            '-e', 'ip.src',
-            '-e', 'ip.dst',
-            '-e', 'ipv6.src',
-            '-e', 'ipv6.dst',
-            '-e', 'frame.protocols',
-            '-e', 'frame.len',
-            '-e', '_ws.col.Info',
-            '-E', 'header=y', '-E', 'separator=,', '-E', 'quote=d'
-        ]
-        
-        tshark_process = subprocess.Popen(
+        stdin, data = None, None
+        if isinstance(source, (str, os.PathLike)):
+            path = source
+        else:
+            path = '-'
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                data = source
+            else:
+                try:
+                    source.fileno()
+                    stdin = source
+                except (AttributeError, OSError, io.UnsupportedOperation):
+                    data = source.read()
+
+        cmd = ['tshark', '-r', path, '-T', 'fields']
+        for field in TSHARK_FIELDS:
+            cmd += ['-e', field]
+        cmd += ['-E', 'header=y', '-E', 'separator=,', '-E', 'quote=d']
+
+        result = subprocess.run(
             cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+            stdin=stdin,
+            input=data,
+            capture_output=True
         )
-        
-        # Python script to convert CSV to JSON
-        python_script = '''
-import csv, json, sys
-try:
-    reader = csv.DictReader(sys.stdin)
-    data = list(reader)
-    print(json.dumps(data, indent=2))
-except Exception as e:
-    print(json.dumps({"error": str(e)}), file=sys.stderr)
-    sys.exit(1)
-'''
-        
-        python_process = subprocess.Popen(
-            ['python3', '-c', python_script],
-            stdin=tshark_process.stdout,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        stdout, stderr = python_process.communicate()
-        tshark_process.wait()
-        
-        if python_process.returncode != 0:
-            logger.error(f"Error converting PCAP to JSON: {stderr}")
+
+        if result.returncode != 0:
+            logger.error(f"Error converting PCAP to JSON: {result.stderr.decode(errors='replace')}")
             return None
-        
+
         try:
-            json_data = json.loads(stdout)
-            return json.dumps(json_data, indent=2)
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing JSON output: {e}")
+            reader = csv.DictReader(io.StringIO(result.stdout.decode(errors='replace')))
+            return json.dumps(list(reader), indent=2)
+        except csv.Error as e:
+            logger.error(f"Error parsing tshark output: {e}")
             return None
-            
+
     except Exception as e:
         logger.error(f"Error during PCAP conversion: {str(e)}")
         return None
-    finally:
-        if 'temp_json_path' in locals() and os.path.exists(temp_json_path):
-            try:
-                os.unlink(temp_json_path)
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary file: {e}")
 
 def convert_pcap_data_to_json(pcap_data):
     """
-    Convert PCAP binary data to JSON format
-    
+    Convert PCAP binary data to JSON format, see convert_pcap_to_json
+
     Args:
         pcap_data: Binary PCAP data
-        
+
     Returns:
         JSON string representation of the PCAP data or None if conversion fails
     """
-    try:
-        with tempfile.NamedTemporaryFile(suffix='.pcap', delete=False) as temp_pcap:
-            temp_pcap.write(pcap_data)
-            temp_pcap_path = temp_pcap.name
-        
-        return convert_pcap_to_json(temp_pcap_path)
-        
-    except Exception as e:
-        logger.error(f"Error converting PCAP data to JSON: {str(e)}")
-        return None
-    finally:
-        if 'temp_pcap_path' in locals() and os.path.exists(temp_pcap_path):
-            try:
-                os.unlink(temp_pcap_path)
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary PCAP file: {e}") 
\ No newline at end of file
+    return convert_pcap_to_json(pcap_data)
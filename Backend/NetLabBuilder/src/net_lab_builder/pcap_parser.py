@@ -1,92 +1,62 @@
-import json
 import os
 import logging
-import warnings
-from typing import List, Dict, Optional
+from typing import List, Dict
 
-# Suppress scapy warnings about network interfaces
-warnings.filterwarnings("ignore", category=UserWarning, module="scapy.runtime")
-warnings.filterwarnings("ignore", message="No IPv4 address found")
-
-# Suppress scapy logging
-import logging
-scapy_logger = logging.getLogger("scapy.runtime")
-scapy_logger.setLevel(logging.ERROR)
-
-from scapy.all import rdpcap
+try:
+    from .pcap_reader import Source, count_ipv4_pairs, ipv4_pair, open_capture
+except ImportError:
+    from pcap_reader import Source, count_ipv4_pairs, ipv4_pair, open_capture
 
 logger = logging.getLogger(__name__)
 
-def parse_pcap_connections(file_path: str) -> List[Dict]:
+def _connections(counts: Dict[bytes, int]) -> List[Dict]:
+    result = []
+    for key, count in counts.items():
+        src, dst = ipv4_pair(key)
+        result.append({
+            "source": src,
+            "destination": dst,
+            "packets": count
+        })
+    return result
+
+def parse_pcap_connections(source: Source) -> List[Dict]:
     """
-    Parse PCAP file and extract connection data with packet counts
+    Parse a PCAP capture and extract connection data with packet counts.
+    The capture is streamed record by record, only the link and IPv4 headers are read.
     
     Args:
-        file_path: Path to the PCAP file
+        source: Path to the PCAP or PCAPNG file, its bytes or memoryview, or a binary stream
         
     Returns:
         List of connection dictionaries with source, destination, and packet count
     """
     try:
-        if not os.path.exists(file_path):
-            logger.error(f"PCAP file not found: {file_path}")
+        if isinstance(source, (str, os.PathLike)) and not os.path.exists(source):
+            logger.error(f"PCAP file not found: {source}")
             return []
-            
-        packets = rdpcap(file_path)
-        connections = {}
-
-        for pkt in packets:
-            if pkt.haslayer('IP'):
-                src = pkt['IP'].src
-                dst = pkt['IP'].dst
-                key = (src, dst)
-                if key not in connections:
-                    connections[key] = 0
-                connections[key] += 1
 
-        result = []
-        for (src, dst), count in connections.items():
-            result.append({
-                "source": src,
-                "destination": dst,
-                "packets": count
-            })
+        with open_capture(source) as capture:
+            result = _connections(count_ipv4_pairs(capture))
 
-        logger.info(f"Parsed {len(result)} connections from PCAP file")
+        logger.info(f"Parsed {len(result)} connections from PCAP capture")
         return result
         
     except Exception as e:
-        logger.error(f"Error parsing PCAP file {file_path}: {str(e)}")
+        logger.error(f"Error parsing PCAP capture: {str(e)}")
         return []
 
 def parse_pcap_connections_from_data(pcap_data: bytes) -> List[Dict]:
     """
-    Parse PCAP data from bytes and extract connection data
+    Parse PCAP data from bytes and extract connection data, see parse_pcap_connections
     
     Args:
-        pcap_data: Binary PCAP data
+        pcap_data: Binary PCAP or PCAPNG data
         
     Returns:
         List of connection dictionaries with source, destination, and packet count
     """
-    try:
-        import tempfile
-        with tempfile.NamedTemporaryFile(suffix='.pcap', delete=False) as temp_pcap:
-            temp_pcap.write(pcap_data)
-            temp_pcap_path = temp_pcap.name
-        
-        try:
-            return parse_pcap_connections(temp_pcap_path)
-        finally:
-            if os.path.exists(temp_pcap_path):
-                try:
-                    os.unlink(temp_pcap_path)
-                except Exception as e:
-                    logger.warning(f"Failed to clean up temporary PCAP file: {e}")
-                    
-    except Exception as e:
-        logger.error(f"Error parsing PCAP data: {str(e)}")
-        return []
+    return parse_pcap_connections(pcap_data)
 
 def convert_connections_to_graph_format(connections: List[Dict]) -> List[Dict]:
     """
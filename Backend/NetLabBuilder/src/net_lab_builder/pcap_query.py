@@ -0,0 +1,197 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from ipaddress import ip_address
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence
+
+try:
+    from .pcap_summary import PacketSummary
+except ImportError:
+    from pcap_summary import PacketSummary
+
+# sort parameter -> column the packets are ordered by, "number" is the capture order
+SORT_KEYS = ("number", "time", "length", "src", "dst", "protocol")
+
+
+class LRUCache:
+    """
+    A thread-safe mapping that keeps the most recently used entries up to a maximum number.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.__entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get_or_create(self, key: Hashable, create: Callable[[], Any]) -> Any:
+        """
+        Returns the entry of a key, creating it with 'create' if it is missing. Results of None are not cached.
+        """
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                return self.__entries[key]
+        value = create()
+        if value is not None and self.maxsize > 0:
+            with self.__lock:
+                self.__entries[key] = value
+                self.__entries.move_to_end(key)
+                while len(self.__entries) > self.maxsize:
+                    self.__entries.popitem(last=False)
+        return value
+
+    def discard(self, match: Callable[[Hashable], bool]) -> None:
+        """
+        Removes all entries whose key matches.
+        """
+        with self.__lock:
+            for key in [key for key in self.__entries if match(key)]:
+                del self.__entries[key]
+
+
+class PacketQuery:
+    """
+    The filters and the order of a query over a stored capture. Queries with equal parameters are equal, so the
+    matching packets can be cached per query.
+
+    Attributes:
+        ip (str): Only packets from or to this address.
+        protocols (tuple): Only packets whose top-level protocol, e.g. "tcp" or "ospf", is one of these.
+        start, end (float): Only packets captured in this range, in seconds relative to the first packet, inclusive.
+        sort (str): One of SORT_KEYS.
+        descending (bool): Whether to return the packets in descending order.
+    """
+
+    __slots__ = ("ip", "protocols", "start", "end", "sort", "descending")
+
+    def __init__(
+        self,
+        ip: str = None,
+        protocols: Sequence[str] = (),
+        start: float = None,
+        end: float = None,
+        sort: str = "number",
+        descending: bool = False,
+    ) -> None:
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Cannot sort by '{sort}', expected one of {', '.join(SORT_KEYS)}")
+        self.ip = str(ip_address(ip)) if ip else None
+        self.protocols = tuple(sorted({protocol.lower() for protocol in protocols if protocol}))
+        self.start = float(start) if start is not None else None
+        self.end = float(end) if end is not None else None
+        self.sort = sort
+        self.descending = descending
+
+    def key(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def matches(self, summary: PacketSummary) -> Sequence[int]:
+        """
+        Returns the indices of the matching packets in the query's order.
+
+        The address and protocol filters intersect posting lists of the summary's index, the time range is found by
+        bisection when the capture is in time order. Without filters the result is a range, so it costs no memory.
+        """
+        if summary.address_postings is None:
+            summary.build_index()
+        candidates: Optional[Sequence[int]] = None
+
+        if self.ip is not None:
+            try:
+                address = summary.addresses.index(self.ip)
+            except ValueError:
+                return ()
+            candidates = summary.address_postings.get(address, ())
+        if self.protocols:
+            postings = [summary.protocol_postings.get(protocol, ()) for protocol in self.protocols]
+            union = postings[0] if len(postings) == 1 else array("I", sorted(set().union(*postings)))
+            candidates = union if candidates is None else _intersect(candidates, union)
+        if self.start is not None or self.end is not None:
+            candidates = self.__filter_time(summary, candidates)
+        if candidates is None:
+            candidates = range(len(summary))
+
+        if self.sort == "number":
+            return candidates[::-1] if self.descending else candidates
+        return sorted(candidates, key=self.__sort_key(summary), reverse=self.descending)
+
+    def __filter_time(self, summary: PacketSummary, candidates: Optional[Sequence[int]]) -> Sequence[int]:
+        times = summary.columns["time_relative"]
+        low = round(self.start * 1e9) if self.start is not None else float("-inf")
+        high = round(self.end * 1e9) if self.end is not None else float("inf")
+        if not summary.time_sorted:
+            packets = candidates if candidates is not None else range(len(summary))
+            return array("I", (index for index in packets if low <= times[index] <= high))
+        first, last = bisect_left(times, low), bisect_right(times, high)
+        if candidates is None:
+            return range(first, last)
+        # Packet indices in time order, so the candidates in the range are a slice as well
+        return candidates[bisect_left(candidates, first):bisect_left(candidates, last)]
+
+    def __sort_key(self, summary: PacketSummary) -> Callable[[int], Any]:
+        columns = summary.columns
+        if self.sort in ("src", "dst"):
+            # Order addresses numerically, IPv4 before IPv6, and missing addresses first
+            order = sorted(range(len(summary.addresses)), key=lambda index: _address_key(summary.addresses[index]))
+            ranks = {index: rank for rank, index in enumerate(order)}
+            column = columns[self.sort]
+            return lambda index: ranks[column[index]]
+        if self.sort == "protocol":
+            names = [name.rsplit(":", 1)[-1] for name in summary.protocol_names]
+            column = columns["protocols"]
+            return lambda index: names[column[index]]
+        return columns["time_relative" if self.sort == "time" else "length"].__getitem__
+
+
+def _address_key(address: str) -> tuple:
+    if not address:
+        return (0, 0)
+    parsed = ip_address(address)
+    return (parsed.version, int(parsed))
+
+
+def _intersect(first: Sequence[int], second: Sequence[int]) -> array:
+    smaller, larger = (first, second) if len(first) <= len(second) else (second, first)
+    members = set(smaller)
+    return array("I", (index for index in larger if index in members))
+
+
+def page_packets(
+    summary: PacketSummary,
+    matches: Sequence[int],
+    query: PacketQuery,
+    offset: int = 0,
+    limit: int = 100,
+    after: int = None,
+) -> Dict[str, Any]:
+    """
+    Returns one page of the matching packets in the format of convert_pcap_to_json.
+
+    Pages are addressed by offset, or, when sorting by number, by the frame number of the last packet of the previous
+    page ('after'), which is found by bisection and stays stable while the viewer pages through the capture.
+
+    Returns:
+        Dict[str, Any]: 'packets', the 'total' number of matches, and 'next_offset' and 'next_cursor' for the next page,
+            which are None on the last page.
+    """
+    if offset < 0 or limit < 1:
+        raise ValueError("offset must not be negative and limit must be positive")
+    if after is not None:
+        if query.sort != "number":
+            raise ValueError("Cursors are only supported when sorting by number")
+        index = after - 1
+        if query.descending:
+            # matches are in descending order, count the matches above the cursor
+            offset = len(matches) - bisect_left(matches[::-1], index)
+        else:
+            offset = bisect_right(matches, index)
+    page = matches[offset:offset + limit]
+    next_offset = offset + len(page) if offset + len(page) < len(matches) else None
+    return {
+        "total": len(matches),
+        "offset": offset,
+        "packets": [summary.row(index) for index in page],
+        "next_offset": next_offset,
+        "next_cursor": page[-1] + 1 if next_offset is not None and query.sort == "number" else None,
+    }
@@ -0,0 +1,286 @@
+import io
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from ipaddress import IPv4Address
+from typing import BinaryIO, Dict, Iterator, List, Tuple, Union
+
+PCAP_HEADER_LENGTH = 24
+RECORD_HEADER_LENGTH = 16
+# magic number as read in little endian -> (byte order of the file, timestamps in nanoseconds)
+PCAP_MAGICS = {
+    0xA1B2C3D4: ("<", False),
+    0xD4C3B2A1: (">", False),
+    0xA1B23C4D: ("<", True),
+    0x4D3CB2A1: (">", True),
+}
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_BYTE_ORDER_MAGIC_SWAPPED = 0x4D3C2B1A
+PCAPNG_INTERFACE_DESCRIPTION = 1
+PCAPNG_OBSOLETE_PACKET = 2
+PCAPNG_SIMPLE_PACKET = 3
+PCAPNG_ENHANCED_PACKET = 6
+PCAPNG_OPTION_TSRESOL = 9
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+# link types whose packets start with the IP header
+LINKTYPES_RAW = (12, 14, 101, 228)
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPES_VLAN = (0x8100, 0x88A8, 0x9100)
+AF_INET = 2
+# AF_INET6 differs between the systems that write loopback captures
+AF_INET6 = (10, 24, 28, 30)
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+# Anything a capture can be read from: a path, the capture itself, or a binary stream
+Source = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+# (link type, timestamp in nanoseconds, offset of the first and behind the last captured byte in the buffer, original length)
+Record = Tuple[int, int, int, int, int]
+
+
+@contextmanager
+def open_capture(source: Source) -> Iterator[Buffer]:
+    """
+    Makes a capture available as a buffer without copying it where possible.
+
+    Paths and streams backed by a file are mapped into memory read-only, so records are parsed in place and only the
+    pages that are touched are loaded. Bytes and memoryviews are used as they are, in-memory streams through their
+    buffer, and other streams are read once. Empty files are returned as an empty buffer, which mmap cannot map.
+
+    Args:
+        source (Source): A path, the capture itself or a binary stream positioned at the start of the capture.
+
+    Yields:
+        Buffer: The capture.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield memoryview(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            with _map_file(f) as buffer:
+                yield buffer
+    elif isinstance(source, io.BytesIO):
+        yield source.getbuffer()[source.tell():]
+    else:
+        try:
+            mappable = source.fileno() >= 0 and source.tell() == 0
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            mappable = False
+        if mappable:
+            with _map_file(source) as buffer:
+                yield buffer
+        else:
+            yield memoryview(source.read())
+
+
+@contextmanager
+def _map_file(f: BinaryIO) -> Iterator[Buffer]:
+    try:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        yield b""
+        return
+    try:
+        yield buffer
+    finally:
+        buffer.close()
+
+
+def iter_records(buffer: Buffer) -> Iterator[Record]:
+    """
+    Iterates over the packet records of a pcap or pcapng capture without copying them.
+
+    Only the record headers are parsed. The packet bytes stay in the buffer and are addressed by offset, so callers
+    can read just the header fields they need with struct.unpack_from or a slice. A record that was cut off at the end
+    of the buffer, e.g. because tcpdump is still writing it, ends the iteration.
+
+    Args:
+        buffer (Buffer): The capture, e.g. from open_capture.
+
+    Yields:
+        Record: The link type, timestamp, data offsets and length on the wire of every packet.
+
+    Raises:
+        ValueError: If the buffer is neither a pcap nor a pcapng capture.
+    """
+    if len(buffer) < 4:
+        return
+    magic = struct.unpack_from("<I", buffer)[0]
+    if magic == PCAPNG_SECTION_HEADER:
+        yield from _iter_pcapng_records(buffer)
+    elif magic in PCAP_MAGICS:
+        yield from _iter_pcap_records(buffer)
+    else:
+        raise ValueError(f"Not a pcap or pcapng capture (magic 0x{magic:08x})")
+
+
+def _iter_pcap_records(buffer: Buffer) -> Iterator[Record]:
+    if len(buffer) < PCAP_HEADER_LENGTH:
+        return
+    byte_order, nanoseconds = PCAP_MAGICS[struct.unpack_from("<I", buffer)[0]]
+    linktype = struct.unpack_from(byte_order + "I", buffer, 20)[0] & 0x0FFFFFFF
+    scale = 1 if nanoseconds else 1000
+    unpack_record = struct.Struct(byte_order + "IIII").unpack_from
+    size = len(buffer)
+    position = PCAP_HEADER_LENGTH
+    while position + RECORD_HEADER_LENGTH <= size:
+        seconds, fraction, captured, original = unpack_record(buffer, position)
+        start = position + RECORD_HEADER_LENGTH
+        position = start + captured
+        if position > size:
+            return
+        yield linktype, seconds * 1_000_000_000 + fraction * scale, start, position, original
+
+
+def _iter_pcapng_records(buffer: Buffer) -> Iterator[Record]:
+    size = len(buffer)
+    position = 0
+    byte_order = "<"
+    # (link type, snap length, timestamp units per second) of every interface of the current section
+    interfaces: List[Tuple[int, int, int]] = []
+    while position + 12 <= size:
+        block_type = struct.unpack_from(byte_order + "I", buffer, position)[0]
+        if block_type == PCAPNG_SECTION_HEADER:
+            # The byte order magic follows the block type and length, whose byte order is not known yet
+            bom = struct.unpack_from("<I", buffer, position + 8)[0]
+            if bom == PCAPNG_BYTE_ORDER_MAGIC:
+                byte_order = "<"
+            elif bom == PCAPNG_BYTE_ORDER_MAGIC_SWAPPED:
+                byte_order = ">"
+            else:
+                raise ValueError("Invalid pcapng section header")
+            interfaces = []
+        block_length = struct.unpack_from(byte_order + "I", buffer, position + 4)[0]
+        if block_length < 12 or block_length % 4:
+            raise ValueError(f"Invalid pcapng block length {block_length} at offset {position}")
+        block_end = position + block_length
+        if block_end > size:
+            return
+        body = position + 8
+
+        if block_type == PCAPNG_ENHANCED_PACKET:
+            interface, high, low, captured, original = struct.unpack_from(byte_order + "IIIII", buffer, body)
+            linktype, _, units = interfaces[interface]
+            start = body + 20
+            end = min(start + captured, block_end - 4)
+            yield linktype, _to_nanoseconds((high << 32) | low, units), start, end, original
+        elif block_type == PCAPNG_SIMPLE_PACKET:
+            original = struct.unpack_from(byte_order + "I", buffer, body)[0]
+            linktype, snaplen, _ = interfaces[0]
+            start = body + 4
+            captured = min(original, snaplen) if snaplen else original
+            yield linktype, 0, start, min(start + captured, block_end - 4), original
+        elif block_type == PCAPNG_OBSOLETE_PACKET:
+            interface, _, high, low, captured, original = struct.unpack_from(byte_order + "HHIIII", buffer, body)
+            linktype, _, units = interfaces[interface]
+            start = body + 20
+            end = min(start + captured, block_end - 4)
+            yield linktype, _to_nanoseconds((high << 32) | low, units), start, end, original
+        elif block_type == PCAPNG_INTERFACE_DESCRIPTION:
+            linktype, _, snaplen = struct.unpack_from(byte_order + "HHI", buffer, body)
+            interfaces.append((linktype, snaplen, _tsresol(buffer, byte_order, body + 8, block_end - 4)))
+        position = block_end
+
+
+def _tsresol(buffer: Buffer, byte_order: str, position: int, end: int) -> int:
+    """
+    Returns the timestamp units per second given by the if_tsresol option of an interface, microseconds by default.
+    """
+    while position + 4 <= end:
+        code, length = struct.unpack_from(byte_order + "HH", buffer, position)
+        if code == 0:
+            break
+        if code == PCAPNG_OPTION_TSRESOL and length >= 1:
+            resolution = buffer[position + 4]
+            return 2 ** (resolution & 0x7F) if resolution & 0x80 else 10 ** resolution
+        position += 4 + (length + 3) // 4 * 4
+    return 1_000_000
+
+
+def _to_nanoseconds(timestamp: int, units: int) -> int:
+    if units == 1_000_000_000:
+        return timestamp
+    return timestamp * 1_000_000_000 // units
+
+
+def network_layer(buffer: Buffer, linktype: int, start: int, end: int) -> Tuple[int, int]:
+    """
+    Returns the ethertype of the network layer protocol of a packet and the offset of its header, or (-1, -1) if the
+    link layer is not understood or cut off.
+
+    Ethernet (including 802.1Q/802.1ad tags), raw IP, BSD loopback and Linux cooked captures v1 and v2, which tcpdump
+    writes for '-i any', are understood.
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        position = start + 12
+        if position + 2 > end:
+            return -1, -1
+        ethertype = (buffer[position] << 8) | buffer[position + 1]
+        while ethertype in ETHERTYPES_VLAN and position + 6 <= end:
+            position += 4
+            ethertype = (buffer[position] << 8) | buffer[position + 1]
+        return ethertype, position + 2
+    if linktype == LINKTYPE_LINUX_SLL:
+        if start + 16 > end:
+            return -1, -1
+        return (buffer[start + 14] << 8) | buffer[start + 15], start + 16
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if start + 20 > end:
+            return -1, -1
+        return (buffer[start] << 8) | buffer[start + 1], start + 20
+    if linktype in LINKTYPES_RAW:
+        if start >= end:
+            return -1, -1
+        version = buffer[start] >> 4
+        return ETHERTYPE_IPV4 if version == 4 else ETHERTYPE_IPV6 if version == 6 else -1, start
+    if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        if start + 4 > end:
+            return -1, -1
+        # The address family is in host byte order for NULL and in network byte order for LOOP
+        family = buffer[start] or buffer[start + 3]
+        if family == AF_INET:
+            return ETHERTYPE_IPV4, start + 4
+        if family in AF_INET6:
+            return ETHERTYPE_IPV6, start + 4
+    return -1, -1
+
+
+def ipv4_offset(buffer: Buffer, linktype: int, start: int, end: int) -> int:
+    """
+    Returns the offset of the IPv4 header of a packet, or -1 if the packet does not carry a complete IPv4 header.
+    See network_layer for the understood link types.
+    """
+    ethertype, offset = network_layer(buffer, linktype, start, end)
+    if ethertype != ETHERTYPE_IPV4 or offset + 20 > end or buffer[offset] >> 4 != 4:
+        return -1
+    return offset
+
+
+def count_ipv4_pairs(buffer: Buffer) -> Dict[bytes, int]:
+    """
+    Counts the packets of a capture per IPv4 (source, destination) pair in a single pass over the buffer.
+
+    Returns:
+        Dict[bytes, int]: The packet count by the 8 raw address bytes of the pair, see ipv4_pair.
+    """
+    counts: Dict[bytes, int] = {}
+    for linktype, _, start, end, _ in iter_records(buffer):
+        offset = ipv4_offset(buffer, linktype, start, end)
+        if offset >= 0:
+            key = bytes(buffer[offset + 12:offset + 20])
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def ipv4_pair(key: bytes) -> Tuple[str, str]:
+    """
+    Returns the dotted source and destination address of a key counted by count_ipv4_pairs.
+    """
+    return str(IPv4Address(key[:4])), str(IPv4Address(key[4:]))
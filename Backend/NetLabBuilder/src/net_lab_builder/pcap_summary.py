@@ -0,0 +1,249 @@
+import json
+import struct
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional
+
+SUMMARY_MAGIC = b"NLS1"
+# name -> typecode of the integer columns, in the order they are stored
+COLUMNS = (
+    ("time_relative", "q"),
+    ("src", "I"),
+    ("dst", "I"),
+    ("length", "I"),
+    ("protocols", "I"),
+    ("info", "I"),
+)
+POSTINGS_COLUMN = "postings"
+# columns that are stored as differences to the previous value, which compress much better for increasing values
+DELTA_COLUMNS = ("time_relative", POSTINGS_COLUMN)
+DICTIONARIES = ("addresses", "protocol_names", "infos")
+
+
+def format_relative_time(nanoseconds: int) -> str:
+    """
+    Formats a time in nanoseconds like tshark's frame.time_relative, e.g. "1.000250000", without float rounding.
+    """
+    sign = "-" if nanoseconds < 0 else ""
+    seconds, fraction = divmod(abs(nanoseconds), 1_000_000_000)
+    return f"{sign}{seconds}.{fraction:09d}"
+
+
+class _Dictionary:
+    """
+    Maps strings to small integers. Index 0 is the empty string, so a missing value costs nothing to encode.
+    """
+
+    __slots__ = ("values", "__index")
+
+    def __init__(self, values: List[str] = None) -> None:
+        self.values = values if values is not None else [""]
+        self.__index = {value: index for index, value in enumerate(self.values)}
+
+    def encode(self, value: Optional[str]) -> int:
+        if not value:
+            return 0
+        index = self.__index.get(value)
+        if index is None:
+            index = self.__index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+class PacketSummary:
+    """
+    The per-packet summary of a capture, stored column by column.
+
+    Every field is an integer array with one entry per packet: the time relative to the first packet in nanoseconds,
+    the length on the wire, and indices into dictionaries of the addresses, protocol stacks and info texts, which
+    repeat a lot in a capture. Frame numbers are not stored, packet i has number i + 1. encode turns the columns into
+    a compressed blob that is stored once, decode restores them without creating a row per packet, and rows builds
+    rows with the tshark field names of convert_pcap_to_json only for the packets that are asked for.
+
+    build_index adds posting lists, the sorted indices of the packets of every address and of every top-level protocol,
+    which are stored in the blob as well, so stored captures can be filtered without scanning them, see pcap_query.
+
+    Attributes:
+        columns (Dict[str, array]): The integer columns, see COLUMNS.
+        addresses (List[str]): The IPv4 and IPv6 addresses, referenced by the 'src' and 'dst' columns.
+        protocol_names (List[str]): The protocol stacks such as "eth:ethertype:ip:tcp", referenced by 'protocols'.
+        infos (List[str]): The info texts, referenced by 'info'.
+        address_postings (Dict[int, array]): The packets from or to each address, by address index. None until indexed.
+        protocol_postings (Dict[str, array]): The packets of each top-level protocol, e.g. "tcp". None until indexed.
+        time_sorted (bool): Whether the packets are in time order, so time ranges can be found by bisection.
+    """
+
+    def __init__(self) -> None:
+        self.columns: Dict[str, array] = {name: array(typecode) for name, typecode in COLUMNS}
+        self.__addresses = _Dictionary()
+        self.__protocol_names = _Dictionary()
+        self.__infos = _Dictionary()
+        self.__first_timestamp = None
+        self.address_postings: Optional[Dict[int, array]] = None
+        self.protocol_postings: Optional[Dict[str, array]] = None
+        self.time_sorted = True
+
+    @property
+    def addresses(self) -> List[str]:
+        return self.__addresses.values
+
+    @property
+    def protocol_names(self) -> List[str]:
+        return self.__protocol_names.values
+
+    @property
+    def infos(self) -> List[str]:
+        return self.__infos.values
+
+    def __len__(self) -> int:
+        return len(self.columns["length"])
+
+    def append(self, timestamp: int, src: Optional[str], dst: Optional[str], protocols: str, length: int, info: str) -> None:
+        """
+        Adds the next packet. The first packet's timestamp, in nanoseconds, is the origin of the relative times.
+        """
+        if self.__first_timestamp is None:
+            self.__first_timestamp = timestamp
+        columns = self.columns
+        columns["time_relative"].append(timestamp - self.__first_timestamp)
+        columns["src"].append(self.__addresses.encode(src))
+        columns["dst"].append(self.__addresses.encode(dst))
+        columns["length"].append(length)
+        columns["protocols"].append(self.__protocol_names.encode(protocols))
+        columns["info"].append(self.__infos.encode(info))
+
+    def build_index(self) -> None:
+        """
+        Builds the posting lists of the addresses and top-level protocols in one pass over the columns.
+        """
+        address_postings: Dict[int, array] = {}
+        protocol_postings: Dict[str, array] = {}
+        top_protocols = [names.rsplit(":", 1)[-1] for names in self.protocol_names]
+        columns = self.columns
+        for index, (src, dst, protocols) in enumerate(zip(columns["src"], columns["dst"], columns["protocols"])):
+            if src:
+                address_postings.setdefault(src, array("I")).append(index)
+            if dst and dst != src:
+                address_postings.setdefault(dst, array("I")).append(index)
+            protocol_postings.setdefault(top_protocols[protocols], array("I")).append(index)
+        times = columns["time_relative"]
+        self.time_sorted = all(previous <= value for previous, value in zip(times, times[1:]))
+        self.address_postings = address_postings
+        self.protocol_postings = protocol_postings
+
+    def row(self, index: int) -> Dict[str, str]:
+        """
+        Returns a packet in the format of convert_pcap_to_json.
+        """
+        columns = self.columns
+        src = self.addresses[columns["src"][index]]
+        dst = self.addresses[columns["dst"][index]]
+        ipv6 = ":" in src or ":" in dst
+        return {
+            "frame.number": str(index + 1),
+            "frame.time_relative": format_relative_time(columns["time_relative"][index]),
+            "ip.src": "" if ipv6 else src,
+            "ip.dst": "" if ipv6 else dst,
+            "ipv6.src": src if ipv6 else "",
+            "ipv6.dst": dst if ipv6 else "",
+            "frame.protocols": self.protocol_names[columns["protocols"][index]],
+            "frame.len": str(columns["length"][index]),
+            "_ws.col.Info": self.infos[columns["info"][index]],
+        }
+
+    def rows(self, start: int = 0, stop: int = None) -> List[Dict[str, str]]:
+        """
+        Returns the packets from index start up to stop in the format of convert_pcap_to_json.
+        """
+        return [self.row(index) for index in range(*slice(start, stop).indices(len(self)))]
+
+    def to_columns(self) -> Dict:
+        """
+        Returns the summary as JSON-serializable columns and dictionaries, which are several times smaller than rows.
+        """
+        return {
+            "count": len(self),
+            "columns": {name: column.tolist() for name, column in self.columns.items()},
+            "addresses": self.addresses,
+            "protocol_names": self.protocol_names,
+            "infos": self.infos,
+        }
+
+    def encode(self, level: int = 6) -> bytes:
+        """
+        Returns the summary as a compressed blob, see decode.
+        """
+        if self.address_postings is None:
+            self.build_index()
+        header = {"count": len(self), "columns": [], **{name: getattr(self, name) for name in DICTIONARIES}}
+        # All posting lists are stored back to back in one column, the header keeps where each one starts and ends
+        postings, header["address_postings"], header["protocol_postings"] = array("I"), [], []
+        for key, packets in self.address_postings.items():
+            header["address_postings"].append([key, len(postings), len(postings) + len(packets)])
+            postings.extend(packets)
+        for key, packets in self.protocol_postings.items():
+            header["protocol_postings"].append([key, len(postings), len(postings) + len(packets)])
+            postings.extend(packets)
+        header["time_sorted"] = self.time_sorted
+        payload = []
+        for name, typecode in (*COLUMNS, (POSTINGS_COLUMN, "i")):
+            column = self.columns[name] if name != POSTINGS_COLUMN else postings
+            if name in DELTA_COLUMNS:
+                column = array(typecode, (value - previous for previous, value in zip([0, *column], column)))
+            elif sys.byteorder != "little":
+                column = array(typecode, column)
+            if sys.byteorder != "little":
+                column.byteswap()
+            data = column.tobytes()
+            header["columns"].append([name, typecode, len(data)])
+            payload.append(data)
+        header_data = json.dumps(header, separators=(",", ":")).encode()
+        return SUMMARY_MAGIC + zlib.compress(struct.pack("<I", len(header_data)) + header_data + b"".join(payload), level)
+
+    @classmethod
+    def decode(cls, blob: bytes) -> "PacketSummary":
+        """
+        Restores a summary from a blob created by encode.
+
+        Raises:
+            ValueError: If the blob is not an encoded summary.
+        """
+        if not blob or bytes(blob[:4]) != SUMMARY_MAGIC:
+            raise ValueError("Not an encoded packet summary")
+        data = memoryview(zlib.decompress(blob[4:]))
+        header_length = struct.unpack_from("<I", data)[0]
+        header = json.loads(bytes(data[4:4 + header_length]))
+        summary = cls()
+        summary.__addresses = _Dictionary(header["addresses"])
+        summary.__protocol_names = _Dictionary(header["protocol_names"])
+        summary.__infos = _Dictionary(header["infos"])
+        position = 4 + header_length
+        postings = None
+        for name, typecode, length in header["columns"]:
+            column = array(typecode)
+            column.frombytes(data[position:position + length])
+            if sys.byteorder != "little":
+                column.byteswap()
+            if name in DELTA_COLUMNS:
+                column = array(typecode, accumulate(column))
+            if name == POSTINGS_COLUMN:
+                postings = column
+            else:
+                summary.columns[name] = column
+            position += length
+        if postings is None:
+            summary.build_index()
+        else:
+            summary.address_postings = {
+                key: array("I", postings[start:end]) for key, start, end in header["address_postings"]
+            }
+            summary.protocol_postings = {
+                key: array("I", postings[start:end]) for key, start, end in header["protocol_postings"]
+            }
+            summary.time_sorted = header["time_sorted"]
+        return summary
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        return (self.row(index) for index in range(len(self)))
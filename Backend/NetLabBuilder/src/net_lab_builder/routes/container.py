@@ -1,12 +1,12 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify
 import logging
-import os
-import subprocess
+from services.capture_stream_service import CaptureStreamService
 from services.container_service import ContainerService
 
 logger = logging.getLogger(__name__)
 container_bp = Blueprint('container', __name__, url_prefix='/api')
 container_service = ContainerService()
+capture_stream_service = CaptureStreamService(container_service.client)
 
 @container_bp.route('/start-container', methods=['POST'])
 def start_container():
@@ -28,66 +28,32 @@ def start_container():
 
 @container_bp.route('/download-pcap/<user_id>', methods=['GET'])
 def download_pcap(user_id):
-    """Download merged PCAP file for a specific user"""
+    """Download merged PCAP file for a specific user, streamed while it is read from the topology"""
     try:
         if not user_id:
             return jsonify({'status': 'error', 'message': 'user_id required'}), 400
 
-        container_name = f"prototype-{user_id}-pcap-merger"
-    
         try:
-            result = subprocess.run(
-                ['docker', 'ps', '--filter', f'name={container_name}', '--format', '{{.Names}}'],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            print(result)
-
-            if container_name not in result.stdout:
-                return jsonify({
-                    'status': 'error', 
-                    'message': f'PCAP merger container for user {user_id} not found or not running'
-                }), 404
-                
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Error checking container status: {str(e)}")
-            return jsonify({'status': 'error', 'message': 'Failed to check container status'}), 500
-
-        temp_file_path = f"/tmp/merged_pcap_{user_id}.pcap"
-        
-        try:
-            copy_result = subprocess.run([
-                'docker', 'cp', f'{container_name}:/pcap/merged.pcap', temp_file_path
-            ], capture_output=True, text=True, check=True)
-            
-            if not os.path.exists(temp_file_path):
-                return jsonify({
-                    'status': 'error', 
-                    'message': 'PCAP file not found in container or failed to copy'
-                }), 404
-                
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Error copying PCAP file: {str(e)}")
-            return jsonify({'status': 'error', 'message': 'Failed to copy PCAP file from container'}), 500
-
-        try:
-            return send_file(
-                temp_file_path,
-                as_attachment=True,
-                download_name=f'merged_pcap_{user_id}.pcap',
-                mimetype='application/vnd.tcpdump.pcap'
-            )
-        except Exception as e:
-            logger.error(f"Error sending file: {str(e)}")
-            return jsonify({'status': 'error', 'message': 'Failed to send PCAP file'}), 500
-        finally:
-            try:
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary file {temp_file_path}: {str(e)}")
+            capture = capture_stream_service.open_merged_capture(user_id)
+        except FileNotFoundError as e:
+            logger.error(f"Merged PCAP file not found: {str(e)}")
+            return jsonify({'status': 'error', 'message': 'PCAP file not found in container'}), 404
+
+        if capture is None:
+            return jsonify({
+                'status': 'error', 
+                'message': f'PCAP merger container for user {user_id} not found or not running'
+            }), 404
+
+        return Response(
+            iter(capture),
+            mimetype='application/vnd.tcpdump.pcap',
+            headers={
+                'Content-Disposition': f'attachment; filename="merged_pcap_{user_id}.pcap"',
+                'Content-Length': str(capture.size)
+            }
+        )
 
     except Exception as e:
         logger.error(f"PCAP download failed: {str(e)}")
-        return jsonify({'status': 'error', 'message': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1,15 +1,14 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file, stream_with_context
 import logging
-import subprocess
-import os
 import json
-import tempfile
-from datetime import datetime
+from services.capture_stream_service import CaptureStreamService
 from services.pcap_database_service import PcapDatabaseService
+from pcap_query import PacketQuery
 
 logger = logging.getLogger(__name__)
 pcap_db_bp = Blueprint('pcap_database', __name__, url_prefix='/api')
 pcap_service = PcapDatabaseService()
+capture_stream_service = CaptureStreamService()
 
 @pcap_db_bp.route('/save-pcap/<user_id>', methods=['POST'])
 def save_pcap_to_database(user_id):
@@ -23,65 +22,33 @@ def save_pcap_to_database(user_id):
         if creator_in_body and creator_in_body != user_id:
             return jsonify({'status': 'error', 'message': 'User ID mismatch: not allowed to save for another user.'}), 403
 
-        container_name = f"prototype-{user_id}-pcap-merger"
-    
         try:
-            result = subprocess.run(
-                ['docker', 'ps', '--filter', f'name={container_name}', '--format', '{{.Names}}'],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-
-            if container_name not in result.stdout:
-                return jsonify({
-                    'status': 'error', 
-                    'message': f'PCAP merger container for user {user_id} not found or not running'
-                }), 404
-                
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Error checking container status: {str(e)}")
-            return jsonify({'status': 'error', 'message': 'Failed to check container status'}), 500
+            capture = capture_stream_service.open_merged_capture(user_id)
+        except FileNotFoundError as e:
+            logger.error(f"Merged PCAP file not found: {str(e)}")
+            return jsonify({'status': 'error', 'message': 'PCAP file not found in container'}), 404
 
-        temp_file_path = f"/tmp/merged_pcap_{user_id}.pcap"
-        
-        try:
-            copy_result = subprocess.run([
-                'docker', 'cp', f'{container_name}:/pcap/merged.pcap', temp_file_path
-            ], capture_output=True, text=True, check=True)
-            
-            if not os.path.exists(temp_file_path):
-                return jsonify({
-                    'status': 'error', 
-                    'message': 'PCAP file not found in container or failed to copy'
-                }), 404
-                
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Error copying PCAP file: {str(e)}")
-            return jsonify({'status': 'error', 'message': 'Failed to copy PCAP file from container'}), 500
+        if capture is None:
+            return jsonify({
+                'status': 'error', 
+                'message': f'PCAP merger container for user {user_id} not found or not running'
+            }), 404
 
         topology_info = request_data.get('topology_info', {})
         
-        metadata = generate_pcap_metadata(temp_file_path)
-        
         connections = request_data.get('connections', [])
         
-        pcap_id = pcap_service.save_pcap_file(
+        # The capture is hashed and written to the blob store while it is read from the topology
+        pcap_id = pcap_service.save_pcap_stream(
             creator=user_id,
-            file_path=temp_file_path,
+            chunks=capture,
+            filename=f"merged_pcap_{user_id}.pcap",
             topology_info=topology_info,
-            metadata=metadata,
+            metadata=capture.metadata(),
             connections=connections
         )
         
         if pcap_id:
-            # Clean up temporary file after saving to database
-            try:
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary file {temp_file_path}: {str(e)}")
-            
             return jsonify({
                 'status': 'success',
                 'message': 'PCAP file and metadata saved to database successfully',
@@ -156,11 +123,42 @@ def download_pcap_from_db(pcap_id):
         if not pcap_id:
             return jsonify({'status': 'error', 'message': 'pcap_id required'}), 400
 
-        pcap = pcap_service.get_pcap_file_by_id(int(pcap_id), include_data=True)
+        pcap = pcap_service.get_pcap_file_by_id(int(pcap_id), include_data=False)
         
         if not pcap:
             return jsonify({'status': 'error', 'message': 'PCAP file not found'}), 404
         
+        if pcap.get('pcap_sha256'):
+            location = pcap_service.locate_pcap_blob(pcap['pcap_sha256'])
+            if location is None:
+                return jsonify({'status': 'error', 'message': 'PCAP file data not found in blob store'}), 404
+            
+            path, compressed = location
+            if not compressed:
+                # Streamed from disk, conditional responses support Range requests and ETags
+                return send_file(
+                    path,
+                    as_attachment=True,
+                    download_name=pcap['filename'],
+                    mimetype='application/vnd.tcpdump.pcap',
+                    conditional=True,
+                    etag=pcap['pcap_sha256']
+                )
+            
+            # Compressed blobs are decompressed while they are sent, without Range support
+            return Response(
+                stream_with_context(pcap_service.iter_pcap_blob(pcap['pcap_sha256'])),
+                mimetype='application/vnd.tcpdump.pcap',
+                headers={
+                    'Content-Disposition': f'attachment; filename="{pcap["filename"]}"',
+                    'Content-Length': str(pcap['file_size']),
+                    'ETag': f'"{pcap["pcap_sha256"]}"'
+                }
+            )
+        
+        # Files saved before the blob store keep their data in the pcap_data column
+        pcap = pcap_service.get_pcap_file_by_id(int(pcap_id), include_data=True)
+        
         if not pcap.get('pcap_data'):
             return jsonify({'status': 'error', 'message': 'PCAP file data not found in database'}), 404
         
@@ -193,26 +191,89 @@ def get_pcap_json(pcap_id):
         if not pcap:
             return jsonify({'status': 'error', 'message': 'PCAP file not found'}), 404
         
-        pcap_json = pcap_service.get_pcap_json_by_id(int(pcap_id))
-        
-        if not pcap_json:
-            return jsonify({'status': 'error', 'message': 'PCAP JSON data not found in database'}), 404
+        summary = pcap_service.get_pcap_summary_by_id(int(pcap_id))
         
-        try:
-            json_data = json.loads(pcap_json)
+        if summary is not None:
+            # ?format=columns returns the columns and dictionaries instead of one object per packet
+            if request.args.get('format') == 'columns':
+                return jsonify({
+                    'status': 'success',
+                    'pcap_id': pcap_id,
+                    'format': 'columns',
+                    'data': summary.to_columns()
+                }), 200
             return jsonify({
                 'status': 'success',
                 'pcap_id': pcap_id,
-                'data': json_data
+                'format': 'rows',
+                'data': summary.rows()
             }), 200
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse PCAP JSON data: {str(e)}")
-            return jsonify({'status': 'error', 'message': 'Invalid JSON data in database'}), 500
+        
+        # Files saved before the packet summary existed only have the JSON representation
+        pcap_json = pcap_service.get_pcap_json_by_id(int(pcap_id))
+        
+        if not pcap_json:
+            return jsonify({'status': 'error', 'message': 'PCAP JSON data not found in database'}), 404
+        
+        # The JSON column only holds valid JSON, so it is embedded as is instead of being parsed and serialized again
+        body = f'{{"status": "success", "pcap_id": {json.dumps(pcap_id)}, "data": {pcap_json}}}'
+        return Response(body, status=200, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Failed to get PCAP JSON {pcap_id}: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@pcap_db_bp.route('/pcap/<pcap_id>/packets', methods=['GET'])
+def query_pcap_packets(pcap_id):
+    """
+    Get one page of the packets of a stored PCAP file
+
+    Query parameters:
+        offset, limit: page of the matching packets, limit defaults to 100
+        after: frame number of the last packet of the previous page (next_cursor), instead of offset
+        start, end: time range in seconds relative to the first packet
+        ip: only packets from or to this address
+        protocol: comma-separated top-level protocols, e.g. tcp,ospf
+        sort: number (default), time, length, src, dst or protocol
+        order: asc (default) or desc
+    """
+    try:
+        if not pcap_id:
+            return jsonify({'status': 'error', 'message': 'pcap_id required'}), 400
+
+        args = request.args
+        try:
+            query = PacketQuery(
+                ip=args.get('ip'),
+                protocols=args.get('protocol', '').split(','),
+                start=args.get('start', type=float),
+                end=args.get('end', type=float),
+                sort=args.get('sort', 'number'),
+                descending=args.get('order', 'asc') == 'desc',
+            )
+            page = pcap_service.query_packets(
+                int(pcap_id),
+                query,
+                offset=int(args.get('offset', 0)),
+                limit=int(args.get('limit', 100)),
+                after=int(args['after']) if args.get('after') else None
+            )
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        if page is None:
+            return jsonify({'status': 'error', 'message': 'PCAP packet summary not found'}), 404
+
+        return jsonify({
+            'status': 'success',
+            'pcap_id': pcap_id,
+            **page
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Failed to query PCAP packets {pcap_id}: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @pcap_db_bp.route('/pcap/<pcap_id>/connections', methods=['GET'])
 def get_pcap_connections(pcap_id):
     """Get PCAP connections data for graph visualization"""
@@ -271,40 +332,15 @@ def delete_pcap(pcap_id):
         logger.error(f"Failed to delete PCAP {pcap_id}: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-def generate_pcap_metadata(file_path):
-    """Generate metadata from PCAP file using tcpdump"""
+@pcap_db_bp.route('/pcap-db/pool', methods=['GET'])
+def get_pool_stats():
+    """Get the database connection pool metrics, e.g. how long requests waited for a connection"""
     try:
-        file_size = os.path.getsize(file_path)
-        file_stats = os.stat(file_path)
-        
-        result = subprocess.run([
-            'tcpdump', '-r', file_path, '-n', '-q', '-c', '1000'
-        ], capture_output=True, text=True)
-        
-        packet_count = len(result.stdout.splitlines())
-        
-        protocols = set()
-        for line in result.stdout.splitlines():
-            if 'IP' in line:
-                if 'TCP' in line:
-                    protocols.add('TCP')
-                elif 'UDP' in line:
-                    protocols.add('UDP')
-                elif 'ICMP' in line:
-                    protocols.add('ICMP')
-        
-        return {
-            'file_size': file_size,
-            'created_time': datetime.fromtimestamp(file_stats.st_ctime).isoformat(),
-            'modified_time': datetime.fromtimestamp(file_stats.st_mtime).isoformat(),
-            'estimated_packets': packet_count,
-            'protocols': list(protocols),
-            'analysis_method': 'tcpdump'
-        }
-        
+        return jsonify({
+            'status': 'success',
+            'pool': pcap_service.get_pool_stats()
+        }), 200
+
     except Exception as e:
-        logger.error(f"Error generating PCAP metadata: {str(e)}")
-        return {
-            'file_size': os.path.getsize(file_path) if os.path.exists(file_path) else 0,
-            'error': str(e)
-        } 
\ No newline at end of file
+        logger.error(f"Failed to get database pool stats: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
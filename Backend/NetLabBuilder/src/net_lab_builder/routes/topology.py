@@ -1,12 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
+import json
 import logging
 import subprocess
 import os
+import time
 from services.topology_service import TopologyService
+from net_lab_builder.config import _config
+from net_lab_builder.live_capture import LivePacketHub
 
 logger = logging.getLogger(__name__)
 topology_bp = Blueprint('topology', __name__, url_prefix='/api')
 topology_service = TopologyService()
+live_packet_hub = LivePacketHub.shared()
 
 @topology_bp.route('/user-topologies/<user_id>', methods=['GET'])
 def get_user_topologies(user_id):
@@ -40,6 +45,26 @@ def start_topology():
             'details': 'Check server logs for more information'
         }), 500
 
+@topology_bp.route('/topology-status/<user_id>', methods=['GET'])
+def get_topology_status(user_id):
+    """Get the build progress and state of a user's topology"""
+    try:
+        result = topology_service.get_topology_status(user_id)
+        return jsonify(result), 200 if result['status'] == 'success' else 404
+    except Exception as e:
+        logger.error(f"Failed to get topology status for user {user_id}: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@topology_bp.route('/stop-topology/<user_id>', methods=['POST'])
+def stop_topology(user_id):
+    """Stop and tear down a user's topology"""
+    try:
+        result = topology_service.stop_topology(user_id)
+        return jsonify(result), 202 if result['status'] == 'success' else 404
+    except Exception as e:
+        logger.error(f"Failed to stop topology for user {user_id}: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @topology_bp.route('/node-routing/<node_id>', methods=['GET'])
 def get_node_routing(node_id):
     """Get routing table for a specific node"""
@@ -65,7 +90,89 @@ def clear_topology(user_id):
     """Clear all nodes for a user's topology"""
     try:
         result = topology_service.clear_topology(user_id)
-        return jsonify(result), 200
+        return jsonify(result), 202
     except Exception as e:
         logger.error(f"Failed to clear topology for user {user_id}: {str(e)}")
-        return jsonify({'status': 'error', 'message': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@topology_bp.route('/teardown-jobs/<job_id>', methods=['GET'])
+def get_teardown_job(job_id):
+    """Get the state and progress of a teardown started by clear-topology"""
+    result = topology_service.get_teardown_job(job_id)
+    return jsonify(result), 200 if result['status'] == 'success' else 404
+
+@topology_bp.route('/warm-pool/<user_id>', methods=['POST'])
+def warm_pool(user_id):
+    """
+    Start node containers for a user's next topology in the background, e.g. when the lab page is opened,
+    so the topology starts without creating them. The optional JSON body {"size": n} overrides 'warm_pool_size'.
+    """
+    try:
+        size = (request.get_json(silent=True) or {}).get('size')
+        if size is not None and (not isinstance(size, int) or isinstance(size, bool) or size < 0):
+            return jsonify({'status': 'error', 'message': 'size must be a non-negative integer'}), 400
+        result = topology_service.warm_pool(user_id, size)
+        return jsonify(result), 202
+    except Exception as e:
+        logger.error(f"Failed to warm the pool for user {user_id}: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@topology_bp.route('/warm-pool', methods=['GET'])
+def get_warm_pool_stats():
+    """Get the warm pool metrics, e.g. how many nodes were claimed from the pool and how many were created"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'pool': topology_service.get_warm_pool_stats()
+        }), 200
+    except Exception as e:
+        logger.error(f"Failed to get warm pool stats: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@topology_bp.route('/live-packets/<user_id>', methods=['GET'])
+def stream_live_packets(user_id):
+    """
+    Stream the packets of a user's running topology as Server-Sent Events
+
+    Every 'packets' event carries a batch of packet summaries, the number of packets dropped for this client
+    because of its rate limit (?rate=<packets per second>) or a full queue, and packet and byte counters per
+    node and per address pair for the graph. An 'end' event is sent when the topology is stopped.
+    """
+    try:
+        if topology_service.get_topology_status(user_id)['status'] != 'success':
+            return jsonify({'status': 'error', 'message': f'No topology is running for user {user_id}'}), 404
+
+        label = f"{_config['label']}-{user_id}"
+        try:
+            subscription = live_packet_hub.subscribe(label, max_rate=request.args.get('rate', type=float))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 429
+
+        def events():
+            try:
+                yield 'retry: 3000\n\n'
+                sent = 0.0
+                while True:
+                    # Batches are sent at most every live_capture_batch_interval seconds
+                    time.sleep(max(0.0, sent + _config['live_capture_batch_interval'] - time.monotonic()))
+                    packets, dropped = subscription.take(
+                        _config['live_capture_batch_size'], _config['live_capture_heartbeat']
+                    )
+                    if not packets and topology_service.get_topology_status(user_id)['status'] != 'success':
+                        yield 'event: end\ndata: {}\n\n'
+                        return
+                    payload = {'packets': packets, 'dropped': dropped, **live_packet_hub.counters(label)}
+                    yield f"event: packets\ndata: {json.dumps(payload)}\n\n"
+                    sent = time.monotonic()
+            finally:
+                live_packet_hub.unsubscribe(label, subscription)
+
+        return Response(
+            events(),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    except Exception as e:
+        logger.error(f"Failed to stream live packets for user {user_id}: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+try:
+    import zstandard
+except ImportError:  # compression is optional, blobs are stored as is without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+COMPRESSED_SUFFIX = '.zst'
+
+
+class BlobStore:
+    """
+    A content-addressed store of files on disk.
+
+    A blob is named after the SHA-256 of its content and stored at '<root>/<first two hex digits>/<digest>',
+    so storing the same capture twice keeps a single file. Blobs are written to a temporary file in the
+    store and renamed into place, so readers never see a partial blob. With compression 'zstd' new blobs
+    are compressed with the zstandard package, the digest is always that of the uncompressed content.
+
+    A blob that is shared by several rows must only be deleted once no row refers to it. Savers pin the
+    blob they stored until their row is inserted, and delete skips pinned blobs and checks the remaining
+    references under the same lock that puts take, so a concurrent save of the same content never ends up
+    with a row that points at a removed blob. Pins only cover the savers of the current process.
+    """
+
+    def __init__(self, root, compression=None):
+        if compression not in (None, 'zstd'):
+            raise ValueError(f"Unknown blob compression '{compression}', expected 'zstd' or None")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("Blob compression 'zstd' requires the zstandard package")
+        self.root = root
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._pins = {}
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+
+    def _path(self, digest):
+        if len(digest) != 64 or not all(c in '0123456789abcdef' for c in digest):
+            raise ValueError(f"Invalid blob digest '{digest}'")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def locate(self, digest):
+        """
+        Get the file of a blob
+
+        Returns:
+            Tuple of the path and whether the file is compressed, or None if the blob does not exist
+        """
+        path = self._path(digest)
+        if os.path.exists(path):
+            return path, False
+        if os.path.exists(path + COMPRESSED_SUFFIX):
+            return path + COMPRESSED_SUFFIX, True
+        return None
+
+    def put_file(self, file_path, pin=False):
+        """
+        Store the content of a file, reading it in chunks
+
+        Args:
+            file_path: The file to store
+            pin: Whether to pin the blob until release is called, see put_chunks
+
+        Returns:
+            Tuple of the hex digest and the uncompressed size
+        """
+        with open(file_path, 'rb') as source:
+            return self.put_chunks(iter(lambda: source.read(CHUNK_SIZE), b''), pin=pin)
+
+    def put_chunks(self, chunks, pin=False):
+        """
+        Store content that arrives in chunks, e.g. from a network stream, without holding it in memory
+
+        Args:
+            chunks: The content
+            pin: Whether to keep delete from removing the blob until release is called, e.g. until the
+                row that refers to it is inserted
+
+        Returns:
+            Tuple of the hex digest and the uncompressed size
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                writer = zstandard.ZstdCompressor().stream_writer(target) if self.compression else target
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    writer.write(chunk)
+                if self.compression:
+                    writer.flush(zstandard.FLUSH_FRAME)
+            digest = digest.hexdigest()
+            with self._lock:
+                if self.locate(digest) is None:
+                    path = self._path(digest) + (COMPRESSED_SUFFIX if self.compression else '')
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(temp_path, path)
+                    logger.info(f"Stored blob {digest} ({size} bytes)")
+                else:
+                    logger.info(f"Blob {digest} already stored")
+                if pin:
+                    self._pins[digest] = self._pins.get(digest, 0) + 1
+            return digest, size
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def open(self, digest):
+        """
+        Open a blob for reading its uncompressed content
+
+        Raises:
+            FileNotFoundError: If the blob does not exist
+        """
+        location = self.locate(digest)
+        if location is None:
+            raise FileNotFoundError(f"Blob {digest} not found")
+        path, compressed = location
+        if not compressed:
+            return open(path, 'rb')
+        if zstandard is None:
+            raise ValueError(f"Blob {digest} is compressed and the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+
+    def iter_chunks(self, digest):
+        """Yield the uncompressed content of a blob in chunks"""
+        with self.open(digest) as blob:
+            yield from iter(lambda: blob.read(CHUNK_SIZE), b'')
+
+    def release(self, digest):
+        """Unpin a blob that was stored with pin=True"""
+        with self._lock:
+            pins = self._pins.get(digest, 0) - 1
+            if pins > 0:
+                self._pins[digest] = pins
+            else:
+                self._pins.pop(digest, None)
+
+    def delete(self, digest, unreferenced=None):
+        """
+        Remove a blob unless it is pinned
+
+        Args:
+            digest: The blob to remove
+            unreferenced: Called under the store's lock to check that nothing refers to the blob anymore,
+                the blob is kept if it returns False
+
+        Returns:
+            Whether the blob was removed
+        """
+        with self._lock:
+            if self._pins.get(digest) or (unreferenced is not None and not unreferenced()):
+                return False
+            location = self.locate(digest)
+            if location is None:
+                return False
+            os.remove(location[0])
+            return True
+
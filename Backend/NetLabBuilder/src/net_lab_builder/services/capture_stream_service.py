@@ -0,0 +1,229 @@
+import io
+import logging
+import os
+import sys
+import tarfile
+import threading
+from datetime import datetime
+import docker
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from net_lab_builder.capture_policy import segment_name, sort_segments
+from net_lab_builder.components.pcap_merger import exec_lister, local_lister
+from net_lab_builder.config import _config
+from net_lab_builder.container_state_cache import ContainerStateCache
+from net_lab_builder.pcap_reader import PCAP_HEADER_LENGTH
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _ChunkReader(io.RawIOBase):
+    """A readable file over an iterator of byte chunks, such as the archive stream of the Docker API"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class CaptureStream:
+    """
+    The content of a capture file that is read while it is sent, with the size it had when it was opened.
+
+    Iterating yields the content in chunks and closes the underlying file or archive stream afterwards,
+    also when the iteration is abandoned, e.g. because the client disconnected.
+    """
+
+    def __init__(self, chunks, size, modified):
+        self.size = size
+        self.modified = modified
+        self._chunks = chunks
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        """Close the underlying file or archive stream without reading the rest"""
+        self._chunks.close()
+
+    def metadata(self):
+        """File metadata in the format the save route stores"""
+        return {
+            'file_size': self.size,
+            'modified_time': datetime.fromtimestamp(self.modified).isoformat() if self.modified else None,
+        }
+
+
+def open_local_capture(path, chunk_size=CHUNK_SIZE):
+    """
+    Open a local file and return a CaptureStream of the bytes it had at that moment, so appends by the
+    pcap merger while the file is sent do not change its length
+    """
+    f = open(path, 'rb')
+    stat = os.fstat(f.fileno())
+
+    def chunks():
+        with f:
+            remaining = stat.st_size
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    return CaptureStream(chunks(), stat.st_size, stat.st_mtime)
+
+
+def open_archive_capture(archive_chunks, chunk_size=CHUNK_SIZE):
+    """
+    Return a CaptureStream of the first regular file of a tar stream, e.g. the result of Container.get_archive,
+    without buffering the archive
+
+    Raises:
+        FileNotFoundError: If the archive contains no regular file
+    """
+    archive = tarfile.open(fileobj=io.BufferedReader(_ChunkReader(archive_chunks), chunk_size), mode='r|')
+    for member in archive:
+        if member.isfile():
+            f = archive.extractfile(member)
+            break
+    else:
+        archive.close()
+        raise FileNotFoundError('The archive contains no file')
+
+    def chunks():
+        with archive:
+            yield from iter(lambda: f.read(chunk_size), b'')
+
+    return CaptureStream(chunks(), member.size, member.mtime)
+
+
+def join_captures(captures):
+    """
+    Return a CaptureStream of the segments of a rotated capture, oldest first, as one capture. The segments
+    were written with the same global header, which is dropped from all but the first.
+    """
+    if len(captures) == 1:
+        return captures[0]
+
+    def chunks():
+        try:
+            for index, capture in enumerate(captures):
+                skip = PCAP_HEADER_LENGTH if index else 0
+                for chunk in capture:
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        chunk, skip = chunk[dropped:], skip - dropped
+                    if chunk:
+                        yield chunk
+        finally:
+            for capture in captures:
+                capture.close()
+
+    size = captures[0].size + sum(capture.size - PCAP_HEADER_LENGTH for capture in captures[1:])
+    modified = max(capture.modified or 0 for capture in captures) or None
+    return CaptureStream(chunks(), size, modified)
+
+
+class CaptureStreamService:
+    """
+    Streams the merged capture of a user's running topology.
+
+    The file is read from the mountpoint of the capture volume when the backend runs on the Docker host, and
+    otherwise from the archive stream of the pcap merger container. Either way it is sent in chunks while it is
+    read, without copying it to a temporary file first. Segments the merged capture was rotated into under the
+    topology's capture policy are sent before it, as one capture.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self._mountpoints = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The Docker client, connected on first use so the routes can be imported without a Docker daemon"""
+        if self._client is None:
+            self._client = docker.from_env()
+        return self._client
+
+    def _mountpoint(self, label):
+        """The readable mountpoint of the capture volume of a topology, or None"""
+        with self._lock:
+            if label not in self._mountpoints:
+                try:
+                    mountpoint = self.client.volumes.get(f"pcap_data_{label}").attrs.get('Mountpoint')
+                except docker.errors.NotFound:
+                    return None
+                self._mountpoints[label] = mountpoint if mountpoint and os.access(mountpoint, os.R_OK) else None
+            return self._mountpoints[label]
+
+    def open_merged_capture(self, user_id):
+        """
+        Open the merged capture of a user's topology
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            CaptureStream, or None if the pcap merger of the user is not running
+
+        Raises:
+            FileNotFoundError: If the merged capture does not exist yet
+            docker.errors.APIError: If the archive could not be read
+        """
+        label = f"{_config['label']}-{user_id}"
+        container_name = f"{label}-pcap-merger"
+        if ContainerStateCache.shared(self.client).status(container_name) != 'running':
+            return None
+
+        target = _config['pcap_merge_target']
+        mountpoint = self._mountpoint(label)
+        if mountpoint:
+            lister = local_lister(mountpoint)
+        else:
+            lister = exec_lister(self.client.containers.get(container_name))
+        segments = [path for path in lister() if segment_name(path) == segment_name(target)]
+        if target not in segments:
+            raise FileNotFoundError(f"{target} not found in {container_name}")
+
+        # All segments are opened right away, so rotation and retention while the capture is sent do not change it
+        captures = []
+        try:
+            for path in sort_segments(segments, current=[target]):
+                try:
+                    captures.append(self._open_segment(container_name, mountpoint, path))
+                except FileNotFoundError:
+                    # Segments expired since the listing are left out
+                    if path == target:
+                        raise
+        except Exception:
+            for capture in captures:
+                capture.close()
+            raise
+        return join_captures(captures)
+
+    def _open_segment(self, container_name, mountpoint, path):
+        if mountpoint:
+            return open_local_capture(os.path.join(mountpoint, os.path.relpath(path, '/pcap')))
+        try:
+            archive_chunks, _ = self.client.api.get_archive(container_name, path, chunk_size=CHUNK_SIZE)
+        except docker.errors.NotFound as e:
+            raise FileNotFoundError(f"{path} not found in {container_name}") from e
+        return open_archive_capture(archive_chunks)
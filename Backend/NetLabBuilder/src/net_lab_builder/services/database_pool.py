@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of MySQL connections.
+
+    At most 'size' connections are open. A caller waits up to 'timeout' seconds for a free connection
+    instead of failing right away like mysql.connector's own pool. Connections that were idle for more than
+    'health_check_interval' seconds are pinged before they are handed out and reopened if the server closed
+    them, and connections that were in use when an error was raised are closed instead of reused, since
+    they may hold unread results.
+    """
+
+    def __init__(self, size, timeout, health_check_interval, connect=mysql.connector.connect, **db_config):
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect = connect
+        self._db_config = db_config
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._stats = {
+            'acquired': 0,
+            'timeouts': 0,
+            'opened': 0,
+            'discarded': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection for the duration of the with block.
+
+        Raises:
+            PoolError: If no connection became free within the timeout.
+            mysql.connector.Error: If a connection could not be opened.
+        """
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolError(f'No database connection became free within {self.timeout} seconds')
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats['acquired'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        try:
+            connection = self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+        try:
+            yield connection
+        except BaseException:
+            self._discard(connection)
+            raise
+        else:
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, released = self._idle.pop()
+            if time.monotonic() - released < self.health_check_interval:
+                return connection
+            try:
+                connection.ping(reconnect=False)
+                return connection
+            except mysql.connector.Error as e:
+                logger.info(f'Dropping stale database connection: {e}')
+                self._discard(connection)
+        connection = self._connect(**self._db_config)
+        with self._lock:
+            self._stats['opened'] += 1
+        return connection
+
+    def _discard(self, connection):
+        with self._lock:
+            self._stats['discarded'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Closes the idle connections, borrowed ones are closed when they are returned"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        """
+        Returns the pool metrics.
+
+        Returns:
+            dict: The size, the number of idle connections, how often connections were acquired, timed out,
+                opened and discarded, and the total, average and maximum time callers waited for a connection.
+        """
+        with self._lock:
+            stats = dict(self._stats, size=self.size, idle=len(self._idle))
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['acquired'] if stats['acquired'] else 0.0
+        return stats
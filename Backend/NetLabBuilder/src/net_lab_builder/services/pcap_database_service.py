@@ -2,46 +2,124 @@ import mysql.connector
 import json
 import os
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from pcap_converter import convert_pcap_data_to_json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from net_lab_builder.config import _config
+from pcap_analysis import analyze_capture, capture_metadata
+from pcap_query import LRUCache, PacketQuery, page_packets
+from pcap_summary import PacketSummary
+from .blob_store import BlobStore
+from .database_pool import ConnectionPool
 from .pcap_parsing_service import PcapParsingService
 
 logger = logging.getLogger(__name__)
 
 class PcapDatabaseService:
+    # Set once the added columns are known to exist, checked by the first session of the process
+    _schema_checked = False
+    _schema_lock = threading.Lock()
+    # One pool per process, shared by the request threads, so requests reuse open connections
+    _pool = None
+    _pool_lock = threading.Lock()
+    # Captures are stored on disk by content hash, only the hash and size are kept in MySQL
+    _blob_store = None
+    # Columns added after the first release of init.sql, added to existing databases by ensure_schema
+    _added_columns = {
+        'pcap_summary': "LONGBLOB COMMENT 'Compressed columnar per-packet summary' AFTER pcap_json",
+        'pcap_sha256': "CHAR(64) COMMENT 'SHA-256 of the capture in the blob store' AFTER pcap_data, "
+                       "ADD INDEX idx_pcap_sha256 (pcap_sha256)",
+    }
+    # Stored captures never change, so their decoded summaries and query results are shared by all instances
+    _summaries = LRUCache(_config["pcap_summary_cache_size"])
+    _matches = LRUCache(_config["pcap_query_cache_size"])
+
     def __init__(self):
         self.db_config = {
-            'host': 'localhost',
-            'port': 3307,
-            'user': 'pcap_user',
-            'password': 'pcap_user_password', # TODO env
-            'database': 'pcap_db',
+            'host': _config['pcap_db_host'],
+            'port': _config['pcap_db_port'],
+            'user': _config['pcap_db_user'],
+            'password': _config['pcap_db_password'],
+            'database': _config['pcap_db_name'],
             'charset': 'utf8mb4',
-            'autocommit': True
+            'autocommit': True,
+            'connection_timeout': _config['pcap_db_connect_timeout']
         }
-        self.connection = None
         self.pcap_parsing_service = PcapParsingService()
 
-    def connect(self):
-        """Establish database connection"""
+    def _get_pool(self):
+        """Get the process-wide connection pool, creating it on first use"""
+        with PcapDatabaseService._pool_lock:
+            if PcapDatabaseService._pool is None:
+                PcapDatabaseService._pool = ConnectionPool(
+                    size=_config['pcap_db_pool_size'],
+                    timeout=_config['pcap_db_pool_timeout'],
+                    health_check_interval=_config['pcap_db_health_check_interval'],
+                    **self.db_config
+                )
+            return PcapDatabaseService._pool
+
+    def _get_blob_store(self) -> BlobStore:
+        """Get the process-wide blob store, creating its directory on first use"""
+        with PcapDatabaseService._pool_lock:
+            if PcapDatabaseService._blob_store is None:
+                PcapDatabaseService._blob_store = BlobStore(
+                    _config['pcap_blob_root'], compression=_config['pcap_blob_compression']
+                )
+            return PcapDatabaseService._blob_store
+
+    @contextmanager
+    def session(self, dictionary: bool = False):
+        """
+        Borrow a pooled connection and yield a cursor on it
+        
+        Args:
+            dictionary: Whether the cursor returns rows as dictionaries
+            
+        Raises:
+            mysql.connector.Error: If no connection is available
+        """
+        with self._get_pool().connection() as connection:
+            if not PcapDatabaseService._schema_checked:
+                with PcapDatabaseService._schema_lock:
+                    if not PcapDatabaseService._schema_checked:
+                        self.ensure_schema(connection)
+            cursor = connection.cursor(dictionary=dictionary)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    def ensure_schema(self, connection):
+        """Add the columns that were introduced after init.sql to databases that were created before them"""
+        cursor = connection.cursor()
         try:
-            self.connection = mysql.connector.connect(**self.db_config)
-            logger.info("Connected to PCAP database")
-            return True
-        except mysql.connector.Error as e:
-            logger.error(f"Failed to connect to database: {e}")
-            return False
+            for column, definition in PcapDatabaseService._added_columns.items():
+                cursor.execute("""
+                    SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'pcap_files' AND COLUMN_NAME = %s
+                """, (column,))
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute(f"ALTER TABLE pcap_files ADD COLUMN {column} {definition}")
+                    logger.info(f"Added {column} column to pcap_files")
+            PcapDatabaseService._schema_checked = True
+        finally:
+            cursor.close()
 
-    def disconnect(self):
-        """Close database connection"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            logger.info("Disconnected from PCAP database")
+    def get_pool_stats(self) -> Dict:
+        """
+        Get the connection pool metrics, e.g. how long requests waited for a connection
+        
+        Returns:
+            Dictionary with the metrics, see ConnectionPool.stats
+        """
+        return self._get_pool().stats()
 
     def save_pcap_file(self, creator: str, file_path: str, topology_info: Dict, 
                        metadata: Dict, connections: List[Dict]) -> Optional[int]:
@@ -59,33 +137,73 @@ class PcapDatabaseService:
             PCAP file ID if successful, None otherwise
         """
         try:
-            if not self.connect():
-                return None
-
-            cursor = self.connection.cursor()
-            
-            pcap_data = None
-            file_size = 0
+            pcap_sha256 = None
+            file_size = metadata.get('file_size', 0)
             if os.path.exists(file_path):
-                with open(file_path, 'rb') as f:
-                    pcap_data = f.read()
-                file_size = len(pcap_data)
-            else:
-                file_size = metadata.get('file_size', 0)
-            
-            pcap_json = None
-            if pcap_data:
-                logger.info("Converting PCAP data to JSON format...")
-                pcap_json = convert_pcap_data_to_json(pcap_data)
-                if pcap_json:
-                    logger.info("PCAP to JSON conversion successful")
-                else:
-                    logger.warning("PCAP to JSON conversion failed, continuing without JSON data")
+                # The capture is streamed into the blob store, MySQL only keeps its hash
+                pcap_sha256, file_size = self._get_blob_store().put_file(file_path, pin=True)
+        except OSError as e:
+            logger.error(f"Error storing PCAP file: {e}")
+            return None
+        
+        filename = os.path.basename(file_path) if file_path else None
+        return self._save_stored_pcap(creator, filename, pcap_sha256, file_size, topology_info, metadata, connections)
+
+    def save_pcap_stream(self, creator: str, chunks: Iterable[bytes], filename: str, topology_info: Dict,
+                         metadata: Dict, connections: List[Dict]) -> Optional[int]:
+        """
+        Save a PCAP file that arrives in chunks, e.g. from a container archive, and its metadata to database
+        
+        Args:
+            creator: User ID of the creator
+            chunks: Content of the PCAP file
+            filename: Name of the PCAP file
+            topology_info: Dictionary with topology information
+            metadata: Complete metadata JSON
+            connections: List of connection dictionaries
             
+        Returns:
+            PCAP file ID if successful, None otherwise
+        """
+        try:
+            pcap_sha256, file_size = self._get_blob_store().put_chunks(chunks, pin=True)
+        except Exception as e:
+            logger.error(f"Error storing PCAP stream: {e}")
+            return None
+        
+        return self._save_stored_pcap(creator, filename, pcap_sha256, file_size, topology_info, metadata, connections)
+
+    def _save_stored_pcap(self, creator: str, filename: Optional[str], pcap_sha256: Optional[str], file_size: int,
+                          topology_info: Dict, metadata: Dict, connections: List[Dict]) -> Optional[int]:
+        """Analyze a capture in the blob store and insert its row, then unpin the blob"""
+        try:
+            return self._insert_stored_pcap(creator, filename, pcap_sha256, file_size, topology_info, metadata, connections)
+        finally:
+            if pcap_sha256:
+                self._get_blob_store().release(pcap_sha256)
+
+    def _insert_stored_pcap(self, creator: str, filename: Optional[str], pcap_sha256: Optional[str], file_size: int,
+                            topology_info: Dict, metadata: Dict, connections: List[Dict]) -> Optional[int]:
+        try:
+            pcap_summary = None
             real_connections = []
-            if pcap_data:
-                logger.info("Extracting connections from PCAP data...")
-                real_connections = self.pcap_parsing_service.get_connections_for_graph(pcap_data)
+            if pcap_sha256 and file_size:
+                # One pass over the capture yields the packet summary, the connections and the metadata
+                logger.info("Analyzing PCAP data...")
+                try:
+                    path, compressed = self.locate_pcap_blob(pcap_sha256)
+                    if compressed:
+                        with self._get_blob_store().open(pcap_sha256) as blob:
+                            analysis = analyze_capture(blob)
+                    else:
+                        analysis = analyze_capture(path)
+                    pcap_summary = analysis['summary'].encode()
+                    real_connections = self.pcap_parsing_service.convert_connections_to_graph_format(analysis['connections'])
+                    metadata = {**metadata, **capture_metadata(analysis)}
+                    logger.info(f"Analyzed {analysis['totals']['packets']} packets")
+                except ValueError as e:
+                    logger.warning(f"PCAP analysis failed, continuing without packet summary: {e}")
+
                 if real_connections:
                     logger.info(f"Successfully extracted {len(real_connections)} connections from PCAP data")
                 else:
@@ -94,29 +212,30 @@ class PcapDatabaseService:
             
             insert_query = """
                 INSERT INTO pcap_files 
-                (creator, filename, file_path, pcap_data, pcap_json, file_size, topology_name, topology_type, 
+                (creator, filename, file_path, pcap_sha256, pcap_summary, file_size, topology_name, topology_type, 
                  node_count, capture_duration, metadata_json, connections_json, connection_count)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """
             
-            cursor.execute(insert_query, (
-                creator,
-                os.path.basename(file_path) if file_path else f"pcap_{creator}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pcap",
-                "database_stored", 
-                pcap_data,
-                pcap_json,
-                file_size,
-                topology_info.get('name', 'Unknown'),
-                topology_info.get('type', 'unknown'),
-                topology_info.get('node_count', 0),
-                topology_info.get('capture_duration', 0),
-                json.dumps(metadata),
-                json.dumps(real_connections),
-                len(real_connections)
-            ))
-            
-            pcap_id = cursor.lastrowid
-            cursor.close()
+            # The capture is analyzed before a connection is borrowed, so the pool is only held for the insert
+            with self.session() as cursor:
+                cursor.execute(insert_query, (
+                    creator,
+                    filename or f"pcap_{creator}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pcap",
+                    "blob_stored",
+                    pcap_sha256,
+                    pcap_summary,
+                    file_size,
+                    topology_info.get('name', 'Unknown'),
+                    topology_info.get('type', 'unknown'),
+                    topology_info.get('node_count', 0),
+                    topology_info.get('capture_duration', 0),
+                    json.dumps(metadata),
+                    json.dumps(real_connections),
+                    len(real_connections)
+                ))
+                pcap_id = cursor.lastrowid
+            
             logger.info(f"Saved PCAP file and metadata with ID: {pcap_id}")
             return pcap_id
             
@@ -126,8 +245,6 @@ class PcapDatabaseService:
         except Exception as e:
             logger.error(f"Error saving PCAP file: {e}")
             return None
-        finally:
-            self.disconnect()
 
     def get_pcap_files_by_creator(self, creator: str) -> List[Dict]:
         """
@@ -140,31 +257,24 @@ class PcapDatabaseService:
             List of PCAP file dictionaries (without pcap_data for JSON serialization)
         """
         try:
-            if not self.connect():
-                return []
-
-            cursor = self.connection.cursor(dictionary=True)
-            
-            query = """
-                SELECT id, creator, filename, file_path, file_size, topology_name, topology_type, 
-                       node_count, capture_duration, metadata_json, connections_json, connection_count,
-                       created_at, updated_at
-                FROM pcap_files 
-                WHERE creator = %s 
-                ORDER BY created_at DESC
-            """
+            with self.session(dictionary=True) as cursor:
+                query = """
+                    SELECT id, creator, filename, file_path, file_size, topology_name, topology_type, 
+                           node_count, capture_duration, metadata_json, connections_json, connection_count,
+                           created_at, updated_at
+                    FROM pcap_files 
+                    WHERE creator = %s 
+                    ORDER BY created_at DESC
+                """
             
-            cursor.execute(query, (creator,))
-            results = cursor.fetchall()
+                cursor.execute(query, (creator,))
+                results = cursor.fetchall()
             
-            cursor.close()
-            return results
+                return results
             
         except mysql.connector.Error as e:
             logger.error(f"Database error: {e}")
             return []
-        finally:
-            self.disconnect()
 
     def get_pcap_file_by_id(self, pcap_id: int, include_data: bool = False) -> Optional[Dict]:
         """
@@ -172,38 +282,31 @@ class PcapDatabaseService:
         
         Args:
             pcap_id: PCAP file ID
-            include_data: Whether to include pcap_data (for downloads)
+            include_data: Whether to include pcap_data, which only files saved before the blob store have
             
         Returns:
             PCAP file dictionary or None
         """
         try:
-            if not self.connect():
-                return None
-
-            cursor = self.connection.cursor(dictionary=True)
-            
-            if include_data:
-                query = "SELECT * FROM pcap_files WHERE id = %s"
-            else:
-                query = """
-                    SELECT id, creator, filename, file_path, file_size, topology_name, topology_type, 
-                           node_count, capture_duration, metadata_json, connections_json, connection_count,
-                           created_at, updated_at
-                    FROM pcap_files WHERE id = %s
-                """
+            with self.session(dictionary=True) as cursor:
+                if include_data:
+                    query = "SELECT * FROM pcap_files WHERE id = %s"
+                else:
+                    query = """
+                        SELECT id, creator, filename, file_path, pcap_sha256, file_size, topology_name, topology_type, 
+                               node_count, capture_duration, metadata_json, connections_json, connection_count,
+                               created_at, updated_at
+                        FROM pcap_files WHERE id = %s
+                    """
             
-            cursor.execute(query, (pcap_id,))
-            result = cursor.fetchone()
+                cursor.execute(query, (pcap_id,))
+                result = cursor.fetchone()
             
-            cursor.close()
-            return result
+                return result
             
         except mysql.connector.Error as e:
             logger.error(f"Database error: {e}")
             return None
-        finally:
-            self.disconnect()
 
     def delete_pcap_file(self, pcap_id: int, creator: str) -> bool:
         """
@@ -217,19 +320,25 @@ class PcapDatabaseService:
             True if successful, False otherwise
         """
         try:
-            if not self.connect():
-                return False
-
-            cursor = self.connection.cursor()
+            with self.session() as cursor:
+                cursor.execute("SELECT pcap_sha256 FROM pcap_files WHERE id = %s AND creator = %s", (pcap_id, creator))
+                row = cursor.fetchone()
+                pcap_sha256 = row[0] if row else None
             
-            delete_query = "DELETE FROM pcap_files WHERE id = %s AND creator = %s"
-            cursor.execute(delete_query, (pcap_id, creator))
+                delete_query = "DELETE FROM pcap_files WHERE id = %s AND creator = %s"
+                cursor.execute(delete_query, (pcap_id, creator))
             
-            if cursor.rowcount == 0:
-                logger.warning(f"PCAP file {pcap_id} not found or not owned by {creator}")
-                return False
+                if cursor.rowcount == 0:
+                    logger.warning(f"PCAP file {pcap_id} not found or not owned by {creator}")
+                    return False
             
-            cursor.close()
+            # Blobs are shared by files with the same content, the last one removes it. The references are
+            # counted under the blob store's lock, so a concurrent save of the same content keeps the blob
+            if pcap_sha256:
+                self._get_blob_store().delete(pcap_sha256, unreferenced=lambda: self._count_blob_rows(pcap_sha256) == 0)
+            
+            PcapDatabaseService._summaries.discard(lambda key: key == pcap_id)
+            PcapDatabaseService._matches.discard(lambda key: key[0] == pcap_id)
             logger.info(f"Deleted PCAP metadata with ID: {pcap_id}")
             return True
             
@@ -239,8 +348,33 @@ class PcapDatabaseService:
         except Exception as e:
             logger.error(f"Error deleting PCAP metadata: {e}")
             return False
-        finally:
-            self.disconnect()
+
+    def _count_blob_rows(self, pcap_sha256: str) -> int:
+        """Count the files that refer to a blob"""
+        with self.session() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM pcap_files WHERE pcap_sha256 = %s", (pcap_sha256,))
+            return cursor.fetchone()[0]
+
+    def locate_pcap_blob(self, pcap_sha256: str) -> Optional[Tuple[str, bool]]:
+        """
+        Get the file of a stored capture
+        
+        Args:
+            pcap_sha256: Hash of the capture
+            
+        Returns:
+            Tuple of the path and whether it is compressed, or None if the blob is missing
+        """
+        return self._get_blob_store().locate(pcap_sha256)
+
+    def iter_pcap_blob(self, pcap_sha256: str):
+        """
+        Yield the uncompressed content of a stored capture in chunks
+        
+        Args:
+            pcap_sha256: Hash of the capture
+        """
+        return self._get_blob_store().iter_chunks(pcap_sha256)
 
     def get_pcap_json_by_id(self, pcap_id: int) -> Optional[str]:
         """
@@ -253,23 +387,70 @@ class PcapDatabaseService:
             JSON string or None
         """
         try:
-            if not self.connect():
-                return None
+            with self.session(dictionary=True) as cursor:
+                query = "SELECT pcap_json FROM pcap_files WHERE id = %s"
+                cursor.execute(query, (pcap_id,))
+                result = cursor.fetchone()
+            
+                return result['pcap_json'] if result else None
+            
+        except mysql.connector.Error as e:
+            logger.error(f"Database error: {e}")
+            return None
 
-            cursor = self.connection.cursor(dictionary=True)
+    def get_pcap_summary_by_id(self, pcap_id: int) -> Optional[PacketSummary]:
+        """
+        Get the decoded packet summary of a PCAP file
+        
+        Args:
+            pcap_id: PCAP file ID
             
-            query = "SELECT pcap_json FROM pcap_files WHERE id = %s"
-            cursor.execute(query, (pcap_id,))
-            result = cursor.fetchone()
+        Returns:
+            PacketSummary or None if the file has no summary, e.g. because it was saved with a JSON representation
+        """
+        try:
+            with self.session() as cursor:
+                query = "SELECT pcap_summary FROM pcap_files WHERE id = %s"
+                cursor.execute(query, (pcap_id,))
+                result = cursor.fetchone()
             
-            cursor.close()
-            return result['pcap_json'] if result else None
+            if not result or not result[0]:
+                return None
+            return PacketSummary.decode(result[0])
             
         except mysql.connector.Error as e:
             logger.error(f"Database error: {e}")
             return None
-        finally:
-            self.disconnect()
+        except ValueError as e:
+            logger.error(f"Invalid packet summary of PCAP file {pcap_id}: {e}")
+            return None
+
+    def query_packets(self, pcap_id: int, query: PacketQuery, offset: int = 0, limit: int = 100,
+                      after: Optional[int] = None) -> Optional[Dict]:
+        """
+        Get one page of the packets of a PCAP file that match a query
+        
+        The decoded summary and the matching packets of recent queries are cached, so paging through a capture
+        only costs building the rows of the page.
+        
+        Args:
+            pcap_id: PCAP file ID
+            query: Filters and order of the packets
+            offset: Number of matching packets to skip
+            limit: Number of packets to return, at most pcap_query_max_limit
+            after: Frame number of the last packet of the previous page, instead of offset
+            
+        Returns:
+            Dictionary with the page, see page_packets, or None if the file has no summary
+            
+        Raises:
+            ValueError: If the page is invalid
+        """
+        summary = PcapDatabaseService._summaries.get_or_create(pcap_id, lambda: self.get_pcap_summary_by_id(pcap_id))
+        if summary is None:
+            return None
+        matches = PcapDatabaseService._matches.get_or_create((pcap_id, *query.key()), lambda: query.matches(summary))
+        return page_packets(summary, matches, query, offset, min(limit, _config["pcap_query_max_limit"]), after)
 
     def get_pcap_statistics(self, creator: str) -> Dict:
         """
@@ -282,45 +463,37 @@ class PcapDatabaseService:
             Dictionary with statistics
         """
         try:
-            if not self.connect():
-                return {}
-
-            cursor = self.connection.cursor(dictionary=True)
-            
-            stats_query = """
-                SELECT 
-                    COUNT(*) as total_files,
-                    SUM(file_size) as total_size,
-                    AVG(file_size) as avg_size,
-                    COUNT(DISTINCT topology_type) as topology_types,
-                    SUM(node_count) as total_nodes,
-                    SUM(capture_duration) as total_duration
-                FROM pcap_files 
-                WHERE creator = %s
-            """
-            
-            cursor.execute(stats_query, (creator,))
-            stats = cursor.fetchone()
+            with self.session(dictionary=True) as cursor:
+                stats_query = """
+                    SELECT 
+                        COUNT(*) as total_files,
+                        SUM(file_size) as total_size,
+                        AVG(file_size) as avg_size,
+                        COUNT(DISTINCT topology_type) as topology_types,
+                        SUM(node_count) as total_nodes,
+                        SUM(capture_duration) as total_duration
+                    FROM pcap_files 
+                    WHERE creator = %s
+                """
             
-            topology_query = """
-                SELECT topology_type, COUNT(*) as count
-                FROM pcap_files 
-                WHERE creator = %s 
-                GROUP BY topology_type
-            """
+                cursor.execute(stats_query, (creator,))
+                stats = cursor.fetchone()
             
-            cursor.execute(topology_query, (creator,))
-            topology_stats = cursor.fetchall()
+                topology_query = """
+                    SELECT topology_type, COUNT(*) as count
+                    FROM pcap_files 
+                    WHERE creator = %s 
+                    GROUP BY topology_type
+                """
             
-            cursor.close()
+                cursor.execute(topology_query, (creator,))
+                topology_stats = cursor.fetchall()
             
-            return {
-                'basic_stats': stats,
-                'topology_breakdown': topology_stats
-            }
+                return {
+                    'basic_stats': stats,
+                    'topology_breakdown': topology_stats
+                }
             
         except mysql.connector.Error as e:
             logger.error(f"Database error: {e}")
-            return {}
-        finally:
-            self.disconnect() 
\ No newline at end of file
+            return {}
\ No newline at end of file
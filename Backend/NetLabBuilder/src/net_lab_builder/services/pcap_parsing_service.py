@@ -5,9 +5,9 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 try:
-    from ..pcap_parser import parse_pcap_connections_from_data, convert_connections_to_graph_format
+    from ..pcap_parser import parse_pcap_connections, parse_pcap_connections_from_data, convert_connections_to_graph_format
 except ImportError:
-    from pcap_parser import parse_pcap_connections_from_data, convert_connections_to_graph_format
+    from pcap_parser import parse_pcap_connections, parse_pcap_connections_from_data, convert_connections_to_graph_format
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +24,7 @@ class PcapParsingService:
         Extract connection data from PCAP binary data
         
         Args:
-            pcap_data: Binary PCAP data
+            pcap_data: Binary PCAP data, as bytes, memoryview or binary stream
             
         Returns:
             List of connection dictionaries with source, destination, and packet count
@@ -58,10 +58,8 @@ class PcapParsingService:
         try:
             self.logger.info(f"Extracting connections from PCAP file: {file_path}")
             
-            with open(file_path, 'rb') as f:
-                pcap_data = f.read()
-            
-            return self.extract_connections_from_pcap_data(pcap_data)
+            # The file is memory mapped by the parser instead of being read into memory first
+            return parse_pcap_connections(file_path)
             
         except Exception as e:
             self.logger.error(f"Error extracting connections from PCAP file {file_path}: {str(e)}")
@@ -7,27 +7,27 @@ import docker
 from collections import defaultdict
 import psutil
 import os
-import threading
+import sys
 import time
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from net_lab_builder.container_state_cache import ContainerStateCache
+
 logger = logging.getLogger(__name__)
 
 class TerminalService:
-    def __init__(self):
-        self.client = docker.from_env()
+    def __init__(self, client=None):
+        self.client = client or docker.from_env()
+        self.containers = ContainerStateCache.shared(self.client)
         self.active_sessions = defaultdict(dict)
         self.container_ports = {}  # Maps container_name to port
         self.ttyd_processes = {}  # Maps container_name to process info
-        self.event_listener_thread = None
-        self.should_stop_listener = False
         
         self._start_docker_event_listener()
 
     def get_own_nodes(self, user_id, host):
         try:
-            containers = self.client.containers.list(
-                filters={'name': f'{user_id}'}
-            )
+            containers = self.containers.user_containers(user_id, status='running')
         except Exception as e:
             logger.error(f"Error getting containers for user {user_id}: {str(e)}")
             return {
@@ -94,9 +94,11 @@ class TerminalService:
 
     def start_ttyd(self, container_name, session_id, host):
         try:
-            container = self.client.containers.get(container_name)
-            if container.status != 'running':
-                container.start()
+            status = self.containers.status(container_name)
+            if status is None:
+                raise docker.errors.NotFound(f'No such container: {container_name}')
+            if status != 'running':
+                self.client.containers.get(container_name).start()
                 logger.info(f"Started container: {container_name}")
         except Exception as e:
             logger.error(f"Container {container_name} not found: {str(e)}")
@@ -249,13 +251,7 @@ exec -a "{process_name}" ttyd --writable -p {port} docker exec -it {container_na
     def _cleanup_orphaned_processes(self):
         """Clean up any ttyd processes that are no longer associated with running containers"""
         try:
-            running_containers = set()
-            try:
-                for container in self.client.containers.list():
-                    running_containers.add(container.name)
-            except Exception as e:
-                logger.warning(f"Could not get running containers list: {str(e)}")
-                return
+            running_containers = set(self.containers.names(status='running'))
             
             containers_to_cleanup = []
             for container_name in list(self.ttyd_processes.keys()):
@@ -342,50 +338,16 @@ exec -a "{process_name}" ttyd --writable -p {port} docker exec -it {container_na
             logger.error(f"Error during orphaned process cleanup by name: {str(e)}")
 
     def _start_docker_event_listener(self):
-        """Start a background thread to listen for Docker container events"""
-        try:
-            self.event_listener_thread = threading.Thread(
-                target=self._docker_event_listener_worker,
-                daemon=True,
-                name="DockerEventListener"
-            )
-            self.event_listener_thread.start()
-            logger.info("Started Docker event listener thread")
-        except Exception as e:
-            logger.error(f"Failed to start Docker event listener: {str(e)}")
+        """Listen for container events on the shared container state cache instead of a stream of our own"""
+        self.containers.add_listener(self._handle_docker_event)
+        logger.info("Listening for Docker container events")
 
-    def _docker_event_listener_worker(self):
-        """Worker thread that listens for Docker container events"""
+    def _handle_docker_event(self, action, state):
+        """Handle a container event of the container state cache"""
         try:
-            for event in self.client.events(
-                filters={'type': 'container'},
-                decode=True
-            ):
-                if self.should_stop_listener:
-                    break
-                
-                try:
-                    self._handle_docker_event(event)
-                except Exception as e:
-                    logger.error(f"Error handling Docker event: {str(e)}")
-                    
-        except Exception as e:
-            logger.error(f"Docker event listener error: {str(e)}")
-        finally:
-            logger.info("Docker event listener thread stopped")
-
-    def _handle_docker_event(self, event):
-        """Handle a Docker container event"""
-        try:
-            event_type = event.get('Type')
-            action = event.get('Action')
-            container_id = event.get('Actor', {}).get('ID')
-            container_name = event.get('Actor', {}).get('Attributes', {}).get('name')
-            
-            if not container_name:
-                return
+            container_name = state.name
             
-            logger.debug(f"Docker event: {event_type} - {action} - {container_name}")
+            logger.debug(f"Docker event: {action} - {container_name}")
             
             # Handle container stop/remove events
             if action in ['die', 'stop', 'destroy', 'kill']:
@@ -420,11 +382,9 @@ exec -a "{process_name}" ttyd --writable -p {port} docker exec -it {container_na
             logger.error(f"Error cleaning up orphaned processes for container {container_name}: {str(e)}")
 
     def stop_event_listener(self):
-        """Stop the Docker event listener thread"""
-        self.should_stop_listener = True
-        if self.event_listener_thread and self.event_listener_thread.is_alive():
-            self.event_listener_thread.join(timeout=5)
-            logger.info("Docker event listener stopped")
+        """Stop listening for Docker container events"""
+        self.containers.remove_listener(self._handle_docker_event)
+        logger.info("Docker event listener stopped")
 
     def start_ttyd_process(self, container_name, port):
         """"""
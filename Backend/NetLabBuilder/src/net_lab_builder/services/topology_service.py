@@ -1,30 +1,39 @@
 import logging
-import subprocess
 import os
-import docker
+import sys
 from collections import defaultdict
 from .terminal_service import TerminalService
+from .topology_supervisor import TopologySupervisor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from net_lab_builder.config import _config
+from net_lab_builder.container_state_cache import ContainerStateCache
+from net_lab_builder.topology_spec import TopologySpec
 
 logger = logging.getLogger(__name__)
 
 class TopologyService:
     def __init__(self):
-        self.client = docker.from_env()
+        self.supervisor = TopologySupervisor()
+        self.client = self.supervisor.client
+        self.containers = ContainerStateCache.shared(self.client)
         self.active_sessions = defaultdict(dict)
-        self.terminal_service = TerminalService()
+        self.terminal_service = TerminalService(self.client)
+
+    def _container(self, state):
+        """A container model for a cached container, without inspecting it"""
+        return self.client.containers.prepare_model({'Id': state.id, 'Name': state.name})
 
     def get_user_topologies(self, user_id):
         """Get all topologies for a specific user"""
         try:
-            containers = self.client.containers.list(
-                filters={'name': f'{user_id}'}
-            )
+            nodes = self.containers.user_containers(user_id, status='running')
 
             return {
                 'status': 'success',
                 'user_id': user_id,
-                'nodes': [c.name for c in containers],
-                'running': [c.status == 'running' for c in containers],
+                'nodes': [n.name for n in nodes],
+                'running': [n.status == 'running' for n in nodes],
             }
 
         except Exception as e:
@@ -34,10 +43,9 @@ class TopologyService:
     def start_topology(self, user_id, topology_name):
         """Start a new topology for a user"""
         try:
-            containers = self.client.containers.list(
-                filters={'name': f'prototype-{user_id}'}
-            )
-            if containers:
+            containers = self.containers.user_containers(user_id, status='running')
+            runtime = self.supervisor.status(user_id)
+            if containers or (runtime and runtime['phase'] != 'failed'):
                 return {
                     'status': 'error',
                     'user_id': user_id,
@@ -46,51 +54,28 @@ class TopologyService:
                     'details': f'Found {len(containers)} running containers for this user'
                 }
 
-            print(f"name:  {topology_name}")
-            topology_script = f"../../topologies_by_userid/{topology_name}_by_user.py"
-            
-            script_path = os.path.join(os.path.dirname(__file__), topology_script)
-            if not os.path.exists(script_path):
-                error_msg = f"Topology script not found: {script_path}"
-                logger.error(error_msg)
+            try:
+                if not isinstance(topology_name, str) or not topology_name:
+                    raise FileNotFoundError(f'Topology spec not found: {topology_name}')
+                spec = TopologySpec.by_name(topology_name)
+            except FileNotFoundError as e:
+                logger.error(str(e))
                 return {
                     'status': 'error',
                     'user_id': user_id,
                     'topology': topology_name,
-                    'message': error_msg,
-                    'details': f'Available topologies: {[f.split("_by_user.py")[0] for f in os.listdir(os.path.join(os.path.dirname(__file__), "../topologies_by_userid")) if f.endswith("_by_user.py")]}'
+                    'message': str(e),
+                    'details': f'Available topologies: {TopologySpec.available()}'
                 }
-            
-            cmd = ['python3', topology_script, user_id]
-            
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                cwd=os.path.dirname(__file__)
-            )
 
-            import time
-            time.sleep(2)
-            
-            if process.poll() is not None:
-                stdout, stderr = process.communicate()
-                error_output = stderr.decode('utf-8') if stderr else "Unknown error"
-                logger.error(f"Topology script failed to start: {error_output}")
-                return {
-                    'status': 'error',
-                    'user_id': user_id,
-                    'topology': topology_name,
-                    'message': f'Failed to start topology: {error_output}',
-                    'details': 'Check server logs for more information'
-                }
-            
-            logger.info(f"Topology script started successfully for user {user_id} with PID {process.pid}")
+            self.supervisor.start(user_id, spec)
+            self.active_sessions[user_id] = {'topology': topology_name}
+
+            logger.info(f"Topology {topology_name} queued for user {user_id}")
             return {
                 'status': 'success',
                 'user_id': user_id,
                 'topology': topology_name,
-                'pid': process.pid,
                 'message': f'Topology {topology_name} started for user {user_id}'
             }
 
@@ -98,29 +83,53 @@ class TopologyService:
             logger.error(f"Topology start failed: {str(e)}")
             raise
 
+    def get_topology_status(self, user_id):
+        """
+        Get the build progress and state of a user's topology. Topologies that failed or are
+        being stopped are reported with an error status, only pending, building and running
+        topologies are live.
+        """
+        status = self.supervisor.status(user_id)
+        if status is None:
+            return {
+                'status': 'error',
+                'user_id': user_id,
+                'message': f'No topology is managed for user {user_id}'
+            }
+        if status['phase'] not in ('pending', 'building', 'running'):
+            return {
+                'status': 'error',
+                'message': f"The topology of user {user_id} is {status['phase']}",
+                **status
+            }
+        return {'status': 'success', **status}
+
+    def stop_topology(self, user_id):
+        """Stop merging captures for a user's topology and tear it down"""
+        self.active_sessions.pop(user_id, None)
+        status = self.supervisor.stop(user_id)
+        if status is None:
+            return {
+                'status': 'error',
+                'user_id': user_id,
+                'message': f'No topology is managed for user {user_id}'
+            }
+        logger.info(f"Stopping topology for user {user_id}")
+        return {'status': 'success', **status}
+
     def get_node_routing(self, node_id):
         """Get routing table for a specific node"""
         try:
-            containers = self.client.containers.list(
-                filters={'name': node_id}
-            )
-            
-            if not containers:
-                logger.info(f"Exact match not found for {node_id}, trying partial match")
-                all_containers = self.client.containers.list()
-                matching_containers = [c for c in all_containers if node_id in c.name]
-                
-                if matching_containers:
-                    containers = matching_containers
-                    logger.info(f"Found {len(containers)} containers with partial match: {[c.name for c in containers]}")
-                else:
-                    logger.error(f"Node {node_id} not found (exact or partial match)")
-                    return {
-                        'status': 'error',
-                        'message': f'Node {node_id} not found'
-                    }
-            
-            container = containers[0]
+            state = self.containers.get(node_id)
+            
+            if state is None or state.status != 'running':
+                logger.error(f"Node {node_id} not found")
+                return {
+                    'status': 'error',
+                    'message': f'Node {node_id} not found'
+                }
+            
+            container = self._container(state)
             logger.info(f"Found container {container.name} for node {node_id}")
             
             result = container.exec_run('netstat -r')
@@ -187,22 +196,23 @@ class TopologyService:
     def delete_node(self, user_id, node_id):
         """Delete a specific node from user's topology"""
         try:
-            containers = self.client.containers.list(
-                filters={'name': node_id}
-            )
+            states = [
+                state for state in self.containers.user_containers(user_id, status='running')
+                if state.name == node_id
+            ]
             
-            if not containers:
+            if not states:
                 return {
                     'status': 'error',
                     'message': f'Node {node_id} not found'
                 }
             
-            container = containers[0]
+            container = self._container(states[0])
             
             self.terminal_service._cleanup_container_session(container.name)
             
-            container.stop()
-            container.remove()
+            container.stop(timeout=_config['teardown_grace'])
+            container.remove(force=True)
             
             logger.info(f"Node {node_id} deleted for user {user_id}")
             
@@ -216,30 +226,43 @@ class TopologyService:
             raise
 
     def clear_topology(self, user_id):
-        """Clear all nodes for a user's topology"""
-        try:
-            containers = self.client.containers.list(
-                filters={'name': f'{user_id}'}
-            )
-            
-            deleted_count = 0
-            for container in containers:
-                try:
-                    container.stop()
-                    container.remove()
-                    deleted_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to delete container {container.name}: {str(e)}")
-            
-            self.terminal_service.cleanup_all_sessions(user_id)
-            
-            logger.info(f"Cleared topology for user {user_id}, deleted {deleted_count} containers")
-            
+        """
+        Queue the removal of all nodes, links and the capture volume of a user's topology.
+        The teardown runs in the background, poll get_teardown_job with the returned job_id.
+        """
+        self.active_sessions.pop(user_id, None)
+        job = self.supervisor.teardown(
+            user_id, cleanup=lambda: self.terminal_service.cleanup_all_sessions(user_id)
+        )
+        logger.info(f"Clearing topology for user {user_id} in teardown job {job['job_id']}")
+        return {
+            'status': 'success',
+            'message': 'Topology teardown started',
+            **job
+        }
+
+    def warm_pool(self, user_id, size=None):
+        """Start filling the pool of ready node containers for a user's next topology"""
+        size = _config['warm_pool_size'] if size is None else size
+        self.supervisor.warm(user_id, size)
+        logger.info(f"Warming {size} node containers for user {user_id}")
+        return {
+            'status': 'success',
+            'user_id': user_id,
+            'size': size,
+            'message': f'Warming {size} node containers'
+        }
+
+    def get_warm_pool_stats(self):
+        """Get the warm pool metrics, e.g. how many nodes were claimed from the pool"""
+        return self.supervisor.warm_pool_stats()
+
+    def get_teardown_job(self, job_id):
+        """Get the state of a teardown job started by clear_topology"""
+        job = self.supervisor.job(job_id)
+        if job is None:
             return {
-                'status': 'success',
-                'message': f'Topology cleared successfully, deleted {deleted_count} nodes'
+                'status': 'error',
+                'message': f'Teardown job {job_id} not found'
             }
-            
-        except Exception as e:
-            logger.error(f"Failed to clear topology for user {user_id}: {str(e)}")
-            raise 
\ No newline at end of file
+        return {'status': 'success', **job} 
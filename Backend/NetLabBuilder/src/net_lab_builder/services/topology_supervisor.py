@@ -0,0 +1,350 @@
+import heapq
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import docker
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from net_lab_builder.config import _config
+from net_lab_builder.network_controller import NetworkController
+from net_lab_builder.teardown import teardown
+from net_lab_builder.topology_builder import TopologyBuilder
+from net_lab_builder.warm_pool import WarmPool
+
+logger = logging.getLogger(__name__)
+
+
+class TopologyRuntime:
+    """State the supervisor keeps for one user's topology"""
+
+    __slots__ = (
+        'user_id', 'topology', 'phase', 'progress', 'error', 'started_at',
+        'timings', 'last_merge', 'controller', 'stopping', 'teardown', 'building'
+    )
+
+    def __init__(self, user_id, topology):
+        self.user_id = user_id
+        self.topology = topology
+        self.phase = 'pending'
+        self.progress = {'step': None, 'completed': 0, 'total': 0}
+        self.error = None
+        self.started_at = time.time()
+        self.timings = {}
+        self.last_merge = None
+        self.controller = None
+        self.stopping = False
+        # Whether the build tears the topology down when it finds stopping set
+        self.teardown = False
+        # Until _build is done, which then runs the teardown of a stop itself
+        self.building = True
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'topology': self.topology,
+            'phase': self.phase,
+            'progress': dict(self.progress),
+            'error': self.error,
+            'started_at': self.started_at,
+            'timings': self.timings,
+            'last_merge': self.last_merge,
+        }
+
+
+class TeardownJob:
+    """State of one bulk teardown of everything a user's topologies created"""
+
+    __slots__ = ('id', 'user_id', 'state', 'progress', 'removed', 'errors', 'started_at', 'finished_at')
+
+    def __init__(self, user_id):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.state = 'pending'
+        self.progress = {'step': None, 'completed': 0, 'total': 0}
+        self.removed = {'containers': [], 'networks': [], 'volumes': []}
+        self.errors = []
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'user_id': self.user_id,
+            'state': self.state,
+            'progress': dict(self.progress),
+            'removed': self.removed,
+            'errors': self.errors,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class TopologySupervisor:
+    """
+    Owns every running topology of the backend process.
+
+    Builds run on a small thread pool, and the periodic work of all running topologies (merging their
+    captures) is multiplexed on one scheduler thread that hands due ticks to a second pool. All
+    controllers share one Docker client, so a running topology only costs a TopologyRuntime and its
+    NetworkController instead of a Python interpreter.
+
+    Teardowns of everything a user's topologies created run as TeardownJobs on a third pool, so a
+    request only queues the job and the client polls it.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or docker.from_env(
+            max_pool_size=_config['supervisor_build_workers'] * _config['provisioning_workers']
+            + _config['supervisor_tick_workers']
+        )
+        self.runtimes = {}
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._schedule = []
+        self._wakeup = threading.Condition(self._lock)
+        self._build_pool = ThreadPoolExecutor(
+            max_workers=_config['supervisor_build_workers'], thread_name_prefix='TopologyBuild'
+        )
+        self._tick_pool = ThreadPoolExecutor(
+            max_workers=_config['supervisor_tick_workers'], thread_name_prefix='TopologyTick'
+        )
+        self._teardown_pool = ThreadPoolExecutor(
+            max_workers=_config['supervisor_teardown_workers'], thread_name_prefix='TopologyTeardown'
+        )
+        self._should_stop = False
+        self._scheduler_thread = threading.Thread(
+            target=self._scheduler_worker, daemon=True, name='TopologyScheduler'
+        )
+        self._scheduler_thread.start()
+
+    def start(self, user_id, spec):
+        """Queue a topology build for a user and return its runtime state"""
+        with self._lock:
+            current = self.runtimes.get(user_id)
+            if current is not None and current.phase != 'failed':
+                raise ValueError(f'User {user_id} already has a topology managed by the supervisor')
+            runtime = TopologyRuntime(user_id, spec.name)
+            self.runtimes[user_id] = runtime
+        self._build_pool.submit(self._build, runtime, spec)
+        return runtime.to_dict()
+
+    def stop(self, user_id, teardown=True):
+        """Stop the periodic work of a user's topology and optionally tear it down"""
+        with self._lock:
+            runtime = self.runtimes.get(user_id)
+            if runtime is None:
+                return None
+            # A build in progress tears down after apply() returns, so it never races the teardown
+            building = runtime.building
+            runtime.stopping = True
+            runtime.teardown = runtime.teardown or teardown
+            runtime.phase = 'stopping'
+        if not building:
+            self._build_pool.submit(self._teardown, runtime, teardown)
+        return runtime.to_dict()
+
+    def status(self, user_id):
+        """Return the state of a user's topology, or None if the supervisor does not manage one"""
+        with self._lock:
+            runtime = self.runtimes.get(user_id)
+            return runtime.to_dict() if runtime else None
+
+    def teardown(self, user_id, cleanup=None):
+        """
+        Queue the removal of all containers, networks and the capture volume of a user's topologies,
+        whether the supervisor manages them or not, and return the job. A teardown that is already
+        queued or running for the user is returned instead of starting another one.
+
+        Args:
+            user_id: User ID
+            cleanup: Called on the job's thread before the teardown, e.g. to end terminal sessions
+        """
+        with self._lock:
+            self._expire_jobs()
+            for job in self.jobs.values():
+                if job.user_id == user_id and job.state in ('pending', 'running'):
+                    return job.to_dict()
+            runtime = self.runtimes.get(user_id)
+            if runtime is not None:
+                runtime.stopping = True
+                # A build in progress removes what it created after the job listed the objects
+                runtime.teardown = True
+                runtime.phase = 'stopping'
+            job = TeardownJob(user_id)
+            self.jobs[job.id] = job
+        self._teardown_pool.submit(self._run_teardown, job, runtime, cleanup)
+        return job.to_dict()
+
+    def warm(self, user_id, size=None):
+        """
+        Queue filling the warm pool of a user, so the nodes of the user's next topology are claimed
+        from started containers instead of being created, see DockerAdapter.warm_nodes.
+
+        Args:
+            user_id: User ID
+            size: Containers kept ready, defaults to the 'warm_pool_size' config value
+        """
+        self._build_pool.submit(self._warm, user_id, size)
+
+    def warm_pool_stats(self):
+        """Return the hits, misses and sizes of the warm pools"""
+        return WarmPool.shared(self.client).stats()
+
+    def job(self, job_id):
+        """Return the state of a teardown job, or None if it is unknown or expired"""
+        with self._lock:
+            self._expire_jobs()
+            job = self.jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def shutdown(self):
+        """Stop the scheduler and the worker pools"""
+        with self._lock:
+            self._should_stop = True
+            self._wakeup.notify()
+        self._build_pool.shutdown(wait=False)
+        self._tick_pool.shutdown(wait=False)
+        self._teardown_pool.shutdown(wait=False)
+
+    def _build(self, runtime, spec):
+        with self._lock:
+            if not runtime.stopping:
+                runtime.phase = 'building'
+        try:
+            runtime.controller = NetworkController(user_id=runtime.user_id, client=self.client, topology=spec.name)
+            result = TopologyBuilder(runtime.controller, runtime.user_id).apply(
+                spec, progress=lambda step, completed, total: self._report(runtime, step, completed, total)
+            )
+            runtime.timings = result['timings']
+        except Exception as e:
+            logger.error(f"Building topology {spec.name} for user {runtime.user_id} failed: {str(e)}")
+            runtime.error = str(e)
+            if runtime.controller is not None:
+                # Remove what the build created, so the user can start a topology again
+                try:
+                    runtime.controller.stop_user_topology()
+                except Exception as rollback_error:
+                    logger.error(f"Rolling back topology {spec.name} for user {runtime.user_id} failed: {str(rollback_error)}")
+            with self._lock:
+                runtime.building = False
+                stopping = runtime.stopping
+                if not stopping:
+                    runtime.phase = 'failed'
+            if stopping:
+                # Stopped during the build, which was rolled back already
+                self._teardown(runtime, False)
+            return
+
+        with self._lock:
+            runtime.building = False
+            stopping = runtime.stopping
+            if not stopping:
+                runtime.phase = 'running'
+                self._schedule_tick(runtime, time.monotonic())
+        if stopping:
+            # stop() left the teardown to the build, now that no more objects are created
+            self._teardown(runtime, runtime.teardown)
+            return
+        logger.info(f"Topology {spec.name} for user {runtime.user_id} is running")
+
+    def _warm(self, user_id, size):
+        try:
+            with self._lock:
+                runtime = self.runtimes.get(user_id)
+            controller = runtime.controller if runtime and runtime.controller else None
+            if controller is None:
+                controller = NetworkController(user_id=user_id, client=self.client)
+            controller.adapter.warm_nodes(size)
+        except Exception as e:
+            logger.error(f"Warming the pool of user {user_id} failed: {str(e)}")
+
+    def _report(self, runtime, step, completed, total):
+        runtime.progress = {'step': step, 'completed': completed, 'total': total}
+
+    def _teardown(self, runtime, teardown):
+        try:
+            if teardown and runtime.controller:
+                runtime.controller.stop_user_topology()
+            runtime.phase = 'stopped'
+        except Exception as e:
+            logger.error(f"Tearing down topology for user {runtime.user_id} failed: {str(e)}")
+            runtime.phase = 'failed'
+            runtime.error = str(e)
+        finally:
+            with self._lock:
+                if self.runtimes.get(runtime.user_id) is runtime:
+                    del self.runtimes[runtime.user_id]
+
+    def _run_teardown(self, job, runtime, cleanup):
+        job.state = 'running'
+        try:
+            if cleanup:
+                cleanup()
+            label = f"{_config['label']}-{job.user_id}"
+            WarmPool.shared(self.client).remove(label)
+            result = teardown(
+                self.client,
+                label,
+                progress=lambda step, completed, total: self._report(job, step, completed, total),
+            )
+            job.removed = {kind: result[kind] for kind in ('containers', 'networks', 'volumes')}
+            job.errors = result['errors']
+            job.state = 'failed' if job.errors else 'done'
+        except Exception as e:
+            logger.error(f"Teardown of the topology of user {job.user_id} failed: {str(e)}")
+            job.errors.append(str(e))
+            job.state = 'failed'
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if runtime is not None and self.runtimes.get(job.user_id) is runtime:
+                    del self.runtimes[job.user_id]
+
+    def _expire_jobs(self):
+        """Must be called with the lock held"""
+        expired_before = time.time() - _config['teardown_job_ttl']
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at is not None and job.finished_at < expired_before:
+                del self.jobs[job_id]
+
+    def _schedule_tick(self, runtime, due):
+        """Must be called with the lock held"""
+        heapq.heappush(self._schedule, (due, id(runtime), runtime))
+        self._wakeup.notify()
+
+    def _scheduler_worker(self):
+        """Hand every due tick to the tick pool; a runtime is rescheduled once its tick has finished"""
+        with self._lock:
+            while not self._should_stop:
+                if not self._schedule:
+                    self._wakeup.wait()
+                    continue
+                due, _, runtime = self._schedule[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+                heapq.heappop(self._schedule)
+                if runtime.stopping:
+                    continue
+                self._tick_pool.submit(self._tick, runtime)
+
+    def _tick(self, runtime):
+        keep_running = True
+        try:
+            keep_running = runtime.controller.adapter.pcap_merge_once()
+            runtime.last_merge = time.time()
+        except Exception as e:
+            logger.error(f"Merge tick for user {runtime.user_id} failed: {str(e)}")
+
+        with self._lock:
+            if runtime.stopping:
+                return
+            if keep_running:
+                self._schedule_tick(runtime, time.monotonic() + _config['pcap_merge_interval'])
+            else:
+                logger.info(f"Stopped merging captures for user {runtime.user_id}")
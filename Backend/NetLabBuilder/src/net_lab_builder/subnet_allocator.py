@@ -0,0 +1,314 @@
+from ipaddress import ip_address, ip_network
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import docker
+from docker.models.networks import Network as DockerNetwork
+
+from .utils import LoggerFactory
+from .config import _config
+
+
+class SubnetAllocator:
+    """
+    The SubnetAllocator class hands out subnets for Docker networks from an address pool without asking the Docker daemon.
+
+    The pool is split into equally sized slots of 'prefixlen' bits, and larger subnets take several aligned slots. For every slot the allocator keeps a reference count of the
+    Docker networks whose subnet overlaps it in a bytearray, so finding a free subnet is a search for the first zero byte from a
+    moving cursor, and freed slots are handed out again first. The counts are seeded once from the networks that exist on the host
+    and kept up to date by watching the 'create' and 'destroy' network events of the Docker daemon, so networks created or removed
+    by other processes are taken into account as well.
+
+    All methods are thread safe. One allocator per pool is shared by all DockerAdapters of a process, see SubnetAllocator.shared.
+
+    Attributes:
+        first (int): The first address of the pool.
+        last (int): The last address of the pool.
+        prefixlen (int): The prefix length of the allocated subnets.
+        size (int): The number of slots in the pool.
+        __counts: Number of networks overlapping each slot.
+        __networks: Slot range of every known Docker network, by network id.
+        __pending: Slot ranges that were allocated but are not yet bound to a network id.
+        __blocked: Slot ranges that must not be allocated, see block.
+        __released: Slots that were freed and are reused before the cursor moves on.
+    """
+
+    __shared: Dict[Tuple, "SubnetAllocator"] = {}
+    __shared_lock = threading.Lock()
+
+    def __init__(self, pool: Tuple[str, str] = None, prefixlen: int = None) -> None:
+        self.__logger = LoggerFactory.get_logger(
+            "SubnetAllocator", log_level=_config["log_level"]
+        )
+        first, last = pool if pool else _config["subnet_pool"]
+        self.prefixlen = prefixlen if prefixlen else _config["subnet_prefixlen"]
+        self.first = int(ip_address(first))
+        self.last = int(ip_address(last))
+        self.__host_bits = 32 - self.prefixlen
+        if self.first & ((1 << self.__host_bits) - 1):
+            raise ValueError(f"Subnet pool start {first} is not aligned to /{self.prefixlen}")
+        if self.last < self.first:
+            raise ValueError(f"Subnet pool end {last} lies before its start {first}")
+        self.size = ((self.last - self.first) >> self.__host_bits) + 1
+        self.__lock = threading.Lock()
+        self.__counts = bytearray(self.size)
+        self.__networks: Dict[str, Tuple[int, int]] = {}
+        self.__pending: List[Tuple[int, int]] = []
+        self.__blocked: List[Tuple[int, int]] = []
+        self.__released: List[int] = []
+        self.__cursor = 0
+        self.__client = None
+        self.__watcher = None
+
+    @classmethod
+    def shared(
+        cls, client: docker.DockerClient, pool: Tuple[str, str] = None, prefixlen: int = None
+    ) -> "SubnetAllocator":
+        """
+        Returns the allocator of the current process for a pool, creating, seeding and starting it on first use.
+
+        Args:
+            client (docker.DockerClient): The client used to seed the allocator and to watch network events.
+            pool (Tuple[str, str], optional): The first and last address of the pool. Defaults to the 'subnet_pool' config value.
+            prefixlen (int, optional): The prefix length of the pool's slots. Defaults to the 'subnet_prefixlen' config value.
+
+        Returns:
+            SubnetAllocator: The process-wide allocator for the pool.
+        """
+        key = (tuple(pool or _config["subnet_pool"]), prefixlen or _config["subnet_prefixlen"])
+        with cls.__shared_lock:
+            if key not in cls.__shared:
+                allocator = cls(*key)
+                allocator.watch(client)
+                cls.__shared[key] = allocator
+            return cls.__shared[key]
+
+    @property
+    def free(self) -> int:
+        """
+        The number of subnets that can currently be allocated.
+        """
+        with self.__lock:
+            return self.__counts.count(0)
+
+    def allocate(self, prefixlen: int = None) -> str:
+        """
+        Reserves the next free subnet of the pool. The reservation is kept until it is bound to the created network with
+        bind or given back with release.
+
+        Args:
+            prefixlen (int, optional): The prefix length of the subnet, at most the allocator's prefix length, for subnets
+                that span several aligned slots. Defaults to the allocator's prefix length.
+
+        Returns:
+            str: The reserved subnet in CIDR notation.
+
+        Raises:
+            ValueError: If the pool has no free subnet of that size.
+        """
+        prefixlen = prefixlen if prefixlen else self.prefixlen
+        if prefixlen > self.prefixlen:
+            raise ValueError(f"Cannot allocate a /{prefixlen} from a pool of /{self.prefixlen} subnets")
+        width = 1 << (self.prefixlen - prefixlen)
+        with self.__lock:
+            slot = self.__take_slots(width)
+            if slot is None and self.__client is not None:
+                # Destroy events may have been missed while the watcher was reconnecting
+                self.__sync_locked(self.__client.networks.list())
+                slot = self.__take_slots(width)
+            if slot is None:
+                raise ValueError(
+                    f"No free /{prefixlen} subnet left in pool {ip_address(self.first)}-{ip_address(self.last)}"
+                )
+            slots = (slot, slot + width - 1)
+            self.__mark(slots, 1)
+            self.__pending.append(slots)
+        return f"{ip_address(self.first + (slot << self.__host_bits))}/{prefixlen}"
+
+    def reserve(self, subnet: str) -> None:
+        """
+        Marks an explicitly chosen subnet as used until it is bound or released, so it is not handed out by allocate.
+        Subnets outside of the pool are accepted and ignored.
+        """
+        slots = self.__slot_range(subnet)
+        if slots is None:
+            return
+        with self.__lock:
+            self.__mark(slots, 1)
+            self.__pending.append(slots)
+
+    def bind(self, subnet: str, network_id: str) -> None:
+        """
+        Turns the reservation of a subnet into the allocation of the created network, which is freed again once the
+        network's 'destroy' event is seen.
+        """
+        slots = self.__slot_range(subnet)
+        if slots is None:
+            return
+        with self.__lock:
+            if slots in self.__pending:
+                self.__pending.remove(slots)
+            if network_id in self.__networks:
+                # The 'create' event of the network was handled first and already counted it
+                self.__mark(slots, -1)
+            else:
+                self.__networks[network_id] = slots
+
+    def release(self, subnet: str) -> None:
+        """
+        Gives back a reservation made with allocate or reserve, e.g. after creating the network failed.
+        """
+        slots = self.__slot_range(subnet)
+        if slots is None:
+            return
+        with self.__lock:
+            if slots in self.__pending:
+                self.__pending.remove(slots)
+                self.__mark(slots, -1)
+
+    def block(self, subnet: str) -> None:
+        """
+        Permanently marks a subnet as used, e.g. because the Docker daemon reported that it overlaps a route of the host.
+        """
+        slots = self.__slot_range(subnet)
+        if slots is None:
+            return
+        with self.__lock:
+            if slots not in self.__blocked:
+                self.__blocked.append(slots)
+                self.__mark(slots, 1)
+
+    def network_created(self, network_id: str, subnet: Optional[str]) -> None:
+        """
+        Accounts for a network that was created outside of this allocator.
+        """
+        slots = self.__slot_range(subnet) if subnet else None
+        if slots is None:
+            return
+        with self.__lock:
+            if network_id not in self.__networks:
+                self.__networks[network_id] = slots
+                self.__mark(slots, 1)
+
+    def network_removed(self, network_id: str) -> None:
+        """
+        Frees the subnet of a removed network.
+        """
+        with self.__lock:
+            slots = self.__networks.pop(network_id, None)
+            if slots is not None:
+                self.__mark(slots, -1)
+
+    def sync(self, networks: Iterable[DockerNetwork]) -> None:
+        """
+        Rebuilds the allocation state from a list of Docker networks, keeping blocked subnets and reservations that are not bound yet.
+        """
+        with self.__lock:
+            self.__sync_locked(networks)
+
+    def watch(self, client: docker.DockerClient) -> None:
+        """
+        Seeds the allocator from the networks on the host and starts a daemon thread that follows the network events of
+        the Docker daemon. The event stream is opened before seeding, so no network created in between is missed.
+        """
+        self.__client = client
+        events = self.__open_events(time.time())
+        self.sync(client.networks.list())
+        self.__watcher = threading.Thread(
+            target=self.__watch_events, args=(events,), daemon=True, name="SubnetAllocatorEvents"
+        )
+        self.__watcher.start()
+
+    def __open_events(self, since: float):
+        return self.__client.events(
+            since=int(since),
+            filters={"type": "network", "event": ["create", "destroy"]},
+            decode=True,
+        )
+
+    def __watch_events(self, events) -> None:
+        while True:
+            try:
+                for event in events:
+                    network_id = event.get("Actor", {}).get("ID")
+                    if event.get("Action") == "destroy":
+                        self.network_removed(network_id)
+                    elif event.get("Action") == "create":
+                        self.network_created(network_id, self.__network_subnet(network_id))
+            except Exception as e:
+                self.__logger.error(f"Network event stream failed, resyncing subnets: {e}")
+            time.sleep(1)
+            try:
+                events = self.__open_events(time.time())
+                self.sync(self.__client.networks.list())
+            except Exception as e:
+                self.__logger.error(f"Could not reconnect to network events: {e}")
+
+    def __network_subnet(self, network_id: str) -> Optional[str]:
+        try:
+            config = self.__client.networks.get(network_id).attrs["IPAM"]["Config"]
+        except docker.errors.NotFound:
+            return None
+        return config[0]["Subnet"] if config else None
+
+    def __sync_locked(self, networks: Iterable[DockerNetwork]) -> None:
+        self.__counts = bytearray(self.size)
+        self.__networks = {}
+        self.__released = []
+        self.__cursor = 0
+        for network in networks:
+            config = network.attrs["IPAM"]["Config"]
+            slots = self.__slot_range(config[0]["Subnet"]) if config else None
+            if slots is not None:
+                self.__networks[network.id] = slots
+                self.__mark(slots, 1)
+        for slots in self.__pending + self.__blocked:
+            self.__mark(slots, 1)
+        self.__logger.debug(
+            f"Synced subnet allocator: {len(self.__networks)} networks in pool, {self.__counts.count(0)} subnets free"
+        )
+
+    def __take_slots(self, width: int) -> Optional[int]:
+        """
+        Returns the first slot of a free run of 'width' slots that is aligned to 'width', or None if there is none.
+        """
+        if width == 1:
+            while self.__released:
+                slot = self.__released.pop()
+                if self.__counts[slot] == 0:
+                    return slot
+        free_run = bytes(width)
+        for start, end in ((self.__cursor, self.size), (0, self.__cursor + width - 1)):
+            start = -(-start // width) * width
+            while start < end:
+                slot = self.__counts.find(free_run, start, min(end, self.size))
+                if slot == -1:
+                    break
+                if slot % width == 0:
+                    self.__cursor = slot + width
+                    return slot
+                start = -(-slot // width) * width
+        return None
+
+    def __mark(self, slots: Tuple[int, int], delta: int) -> None:
+        lo, hi = slots
+        for slot in range(lo, hi + 1):
+            count = self.__counts[slot] + delta
+            self.__counts[slot] = min(max(count, 0), 255)
+            if count == 0 and delta < 0:
+                self.__released.append(slot)
+
+    def __slot_range(self, subnet: str) -> Optional[Tuple[int, int]]:
+        """
+        Returns the first and last slot overlapping a subnet, or None if it lies outside of the pool.
+        """
+        network = ip_network(subnet, strict=False)
+        if network.version != 4:
+            return None
+        start = max(int(network.network_address), self.first)
+        end = min(int(network.broadcast_address), self.last)
+        if start > end:
+            return None
+        return (start - self.first) >> self.__host_bits, (end - self.first) >> self.__host_bits
+
@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import docker
+
+from .config import _config
+from .utils import LoggerFactory
+
+# Called as progress(phase, completed, total) like the progress of NetworkController.build_topology
+Progress = Callable[[str, int, int], None]
+
+
+def teardown(
+    client: docker.DockerClient,
+    label: str,
+    grace: float = None,
+    workers: int = None,
+    volumes: bool = True,
+    progress: Progress = None,
+) -> Dict[str, List[str]]:
+    """
+    Removes every container, network and, optionally, volume with the given label key in bulk.
+
+    Containers are stopped with a short grace period and force-removed concurrently, so the teardown of a topology takes
+    about one grace period instead of the stop timeout of every container in turn. Networks are removed once their
+    containers are gone, then volumes. Objects that cannot be removed are reported instead of aborting the teardown,
+    and objects that are already gone count as removed.
+
+    Args:
+        client (docker.DockerClient): The client to use.
+        label (str): The label key of the objects, e.g. the label of a user's topology.
+        grace (float, optional): Seconds containers get to stop before they are killed. Defaults to the 'teardown_grace'
+            config value, 0 kills them right away.
+        workers (int, optional): Objects removed concurrently. Defaults to the 'teardown_workers' config value.
+        volumes (bool, optional): Whether to remove the volumes, e.g. the capture volume. Defaults to True.
+        progress (Progress, optional): Called whenever an object was removed, and once with completed=0 per phase.
+
+    Returns:
+        Dict[str, List[str]]: The names of the removed "containers", "networks" and "volumes", and the "errors".
+    """
+    logger = LoggerFactory.get_logger("Teardown", log_level=_config["log_level"])
+    grace = _config["teardown_grace"] if grace is None else grace
+    workers = workers or _config["teardown_workers"]
+    progress = progress or (lambda phase, completed, total: None)
+    result = {"containers": [], "networks": [], "volumes": [], "errors": []}
+
+    def remove_container(container) -> None:
+        if grace and container.status == "running":
+            client.api.stop(container.id, timeout=grace)
+        client.api.remove_container(container.id, force=True)
+
+    def remove_network(network) -> None:
+        try:
+            network.remove()
+        except docker.errors.APIError as e:
+            if e.status_code == 404:
+                raise
+            # Containers of other labels are still attached
+            network.reload()
+            for container_id in network.attrs.get("Containers") or {}:
+                network.disconnect(container_id, force=True)
+            network.remove()
+
+    phases = [
+        ("containers", lambda: client.containers.list(all=True, sparse=True, filters={"label": label}), remove_container),
+        ("networks", lambda: client.networks.list(filters={"label": label}), remove_network),
+    ]
+    if volumes:
+        phases.append(
+            ("volumes", lambda: client.volumes.list(filters={"label": label}), lambda volume: volume.remove(force=True))
+        )
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Teardown") as pool:
+        for phase, list_objects, remove in phases:
+            try:
+                objects = list_objects()
+            except docker.errors.APIError as e:
+                result["errors"].append(f"Listing {phase} failed: {e}")
+                continue
+            progress(phase, 0, len(objects))
+            futures = {pool.submit(remove, obj): _object_name(obj) for obj in objects}
+            for completed, (future, name) in enumerate(futures.items(), start=1):
+                try:
+                    future.result()
+                except docker.errors.NotFound:
+                    pass
+                except docker.errors.APIError as e:
+                    logger.error(f"Removing {name} failed: {e}")
+                    result["errors"].append(f"Removing {name} failed: {e}")
+                    continue
+                result[phase].append(name)
+                progress(phase, completed, len(objects))
+
+    logger.info(
+        f"Removed {len(result['containers'])} containers, {len(result['networks'])} networks and "
+        f"{len(result['volumes'])} volumes of {label} with {len(result['errors'])} errors"
+    )
+    return result
+
+
+def _object_name(obj) -> str:
+    # Sparse containers only carry 'Names'
+    return obj.name or obj.attrs["Names"][0].lstrip("/")
@@ -0,0 +1,207 @@
+import sys
+from typing import Callable, Dict
+
+import docker
+
+from .utils import LoggerFactory
+from .components.network import Network
+from .components.node import Node
+from .network_controller import NetworkController
+from .topology_spec import TopologySpec
+from .config import _config
+
+
+class TopologyBuilder:
+    """
+    Builds a TopologySpec for one user inside the current process.
+
+    The builder turns the spec into a plan with fixed container and network names, compares the plan with
+    what is already running for the user's label and only applies the difference: missing nodes and
+    networks are created, missing attachments are made and, when pruning, nodes and networks that are
+    no longer part of the spec are removed. Applying the same spec twice is therefore a no-op.
+    """
+
+    def __init__(self, controller: NetworkController, user_id: str) -> None:
+        self.controller = controller
+        self.user_id = user_id
+        self.__logger = LoggerFactory.get_logger(
+            "TopologyBuilder", log_level=_config["log_level"]
+        )
+
+    def plan(self, spec: TopologySpec) -> Dict:
+        """
+        Renders the spec for the user and assigns every node a fixed container name.
+
+        Node names follow the '<label>_<base name>_<count>' scheme of NetworkController, with the count
+        taken from the node's position in the spec, so the same spec always maps to the same containers.
+
+        Returns:
+            dict: The rendered spec with an additional "node_names" {<node id>: <container name>} entry.
+        """
+        plan = spec.render(self.user_id)
+        plan["node_names"] = {
+            key: f"{self.controller.label}_{base_name}_{101 + index}"
+            for index, (key, base_name) in enumerate(plan["nodes"].items())
+        }
+        return plan
+
+    def diff(self, plan: Dict) -> Dict:
+        """
+        Compares a plan with the node containers and networks currently running under the controller's label,
+        using one sparse container list and one network list.
+
+        Returns:
+            dict: {
+                "nodes": {<node id>: <base name>} of nodes to create,
+                "networks": {<network name>: [<node id>, ...]} of attachments to make,
+                "existing_nodes": {<node id>: DockerContainer} of planned nodes that already run,
+                "existing_networks": {<network name>: DockerNetwork} of planned networks that already exist,
+                "remove_nodes": [(<container name>, DockerContainer)] of nodes that are not part of the plan,
+                "remove_networks": [DockerNetwork] of networks that are not part of the plan,
+            }
+        """
+        # Leaves out the pcap merger and the warm pool containers that create_node claims
+        nodes = [Node(container) for container in self.controller.adapter.get_node_containers(sparse=True)]
+        containers = {node.name: node.container for node in nodes}
+        docker_networks = {
+            network.name: network for network in self.controller.adapter.get_networks() or []
+        }
+        planned_names = set(plan["node_names"].values())
+
+        existing_nodes = {
+            key: containers[name] for key, name in plan["node_names"].items() if name in containers
+        }
+        attached = {
+            key: set(container.attrs.get("NetworkSettings", {}).get("Networks", {}))
+            for key, container in existing_nodes.items()
+        }
+        attachments = {}
+        for network_name, node_keys in plan["networks"].items():
+            missing = [key for key in node_keys if network_name not in attached.get(key, ())]
+            if missing:
+                attachments[network_name] = missing
+
+        return {
+            "nodes": {key: base for key, base in plan["nodes"].items() if key not in existing_nodes},
+            "networks": attachments,
+            "existing_nodes": existing_nodes,
+            "existing_networks": {
+                name: network for name, network in docker_networks.items() if name in plan["networks"]
+            },
+            "remove_nodes": [
+                (name, container) for name, container in containers.items() if name not in planned_names
+            ],
+            "remove_networks": [
+                network for name, network in docker_networks.items() if name not in plan["networks"]
+            ],
+        }
+
+    def apply(
+        self, spec: TopologySpec, capture: bool = True, prune: bool = True, progress: Callable = None
+    ) -> Dict:
+        """
+        Brings the running topology of the user in line with the spec.
+
+        Args:
+            spec (TopologySpec): The topology to build.
+            capture (bool): Whether to start tcpdump on newly created nodes. Defaults to True.
+            prune (bool): Whether to remove nodes and networks that are not part of the spec. Defaults to True.
+            progress (Callable, optional): Passed on to NetworkController.build_topology.
+
+        Returns:
+            dict: The result of NetworkController.build_topology for the delta, with an additional
+                  "removed" {"nodes": [...], "networks": [...]} entry listing the pruned object names.
+        """
+        plan = self.plan(spec)
+        delta = self.diff(plan)
+        self.__logger.info(
+            f"Applying topology {spec.name} for {self.user_id}: {len(delta['nodes'])} nodes to create, "
+            f"{sum(len(keys) for keys in delta['networks'].values())} attachments to make, "
+            f"{len(delta['remove_nodes'])} nodes and {len(delta['remove_networks'])} networks to remove"
+        )
+
+        removed = {"nodes": [], "networks": []}
+        if prune:
+            removed = self.__remove(delta["remove_nodes"], delta["remove_networks"])
+
+        # Only nodes and networks that get new attachments need to be wrapped
+        touched_nodes = {key for keys in delta["networks"].values() for key in keys}
+        result = self.controller.build_topology(
+            {
+                "nodes": delta["nodes"],
+                "node_names": plan["node_names"],
+                "networks": delta["networks"],
+                "subnets": plan["subnets"],
+                "routing": plan["routing"],
+                "capture_policy": plan["capture"],
+            },
+            capture=capture,
+            progress=progress,
+            existing={
+                "nodes": {
+                    key: Node(container)
+                    for key, container in delta["existing_nodes"].items()
+                    if key in touched_nodes
+                },
+                "networks": {
+                    name: Network(network)
+                    for name, network in delta["existing_networks"].items()
+                    if name in delta["networks"]
+                },
+            },
+        )
+        result["removed"] = removed
+        return result
+
+    def __remove(self, containers, networks) -> Dict:
+        removed = {"nodes": [], "networks": []}
+        for name, container in containers:
+            try:
+                container.remove(force=True)
+                removed["nodes"].append(name)
+            except docker.errors.APIError as e:
+                self.__logger.error(f"Error removing container {name}: {e}")
+        for network in networks:
+            try:
+                network.reload()
+                for container_id in network.attrs.get("Containers") or {}:
+                    network.disconnect(container_id, force=True)
+                network.remove()
+                removed["networks"].append(network.name)
+            except docker.errors.APIError as e:
+                self.__logger.error(f"Error removing network {network.name}: {e}")
+        return removed
+
+
+def main() -> None:
+    """
+    Builds a bundled or file-based topology for a user and merges its captures until interrupted.
+
+    Usage: python -m net_lab_builder.topology_builder <topology name or spec file> [user_id]
+    """
+    if len(sys.argv) < 2:
+        print("Usage: python -m net_lab_builder.topology_builder <topology> [user_id]")
+        sys.exit(1)
+    topology = sys.argv[1]
+    user_id = sys.argv[2] if len(sys.argv) > 2 else "guest-user"
+    spec = (
+        TopologySpec.load(topology)
+        if topology.endswith((".json", ".yaml", ".yml"))
+        else TopologySpec.by_name(topology)
+    )
+
+    nc = None
+    try:
+        nc = NetworkController(user_id=user_id, topology=spec.name)
+        TopologyBuilder(nc, user_id).apply(spec)
+        print(f"{spec.name} topology running... Press Ctrl+C to stop.")
+        nc.pcap_merge()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if nc:
+            nc.stop_user_topology()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from .capture_policy import CapturePolicy
+
+TOPOLOGY_DIR = Path(__file__).parent.resolve() / "topologies"
+ROUTING_PROTOCOLS = ("ospf", "none")
+GENERATORS = ("ring", "line", "star", "full_mesh")
+
+
+class TopologySpec:
+    """
+    A declarative description of a topology, loaded from a JSON (or, if PyYAML is installed, YAML) file.
+
+    A spec either lists its nodes and links explicitly:
+
+        {
+            "name": "star",
+            "routing": "ospf",
+            "nodes": [{"id": "central", "base_name": "central-{user_id}"}, ...],
+            "links": [{"name": "net-{user_id}-1", "nodes": ["central", "node1"], "subnet": "172.120.0.0/16"}, ...]
+        }
+
+    or asks for a generated shape, which is how large topologies are described without listing every node:
+
+        {"name": "big-ring", "generate": {"type": "ring", "size": 200}}
+
+    '{user_id}' in node base names and link names is replaced when the spec is rendered for a user.
+    The optional 'subnet' of a link pins the subnet of its network, otherwise one is allocated.
+    The optional 'capture' section sets the CapturePolicy of the topology, e.g. {"capture": {"segment_mb": 20}}.
+
+    Attributes:
+        name (str): The name of the topology.
+        routing (str): The routing protocol configured on the nodes, one of ROUTING_PROTOCOLS.
+        nodes (List[dict]): The nodes as {"id", "base_name"} dictionaries, in creation order.
+        links (List[dict]): The links as {"name", "nodes", "subnet"} dictionaries.
+        capture (CapturePolicy): How the nodes capture their traffic and how long captures are kept.
+    """
+
+    def __init__(self, data: Dict) -> None:
+        self.name = data.get("name", "topology")
+        self.routing = data.get("routing", "ospf")
+        self.capture = CapturePolicy.from_dict(data.get("capture"))
+        if "generate" in data:
+            self.nodes, self.links = self.__generate(**data["generate"])
+        else:
+            self.nodes = [dict(node) for node in data.get("nodes", [])]
+            self.links = [dict(link) for link in data.get("links", [])]
+        self.__validate()
+
+    @classmethod
+    def load(cls, path: str) -> "TopologySpec":
+        """
+        Loads a spec from a .json, .yaml or .yml file.
+
+        Raises:
+            ValueError: If the file type is not supported or the spec is invalid.
+        """
+        with open(path) as f:
+            if path.endswith((".yaml", ".yml")):
+                if yaml is None:
+                    raise ValueError("PyYAML is required to load YAML topology specs")
+                data = yaml.safe_load(f)
+            elif path.endswith(".json"):
+                data = json.load(f)
+            else:
+                raise ValueError(f"Unsupported topology spec file: {path}")
+        data.setdefault("name", Path(path).stem)
+        return cls(data)
+
+    @classmethod
+    def by_name(cls, name: str) -> "TopologySpec":
+        """
+        Loads one of the bundled specs from the 'topologies' directory.
+
+        Raises:
+            FileNotFoundError: If there is no spec with that name.
+        """
+        if Path(name).name != name:
+            raise FileNotFoundError(f"Topology spec not found: {name}")
+        for extension in (".json", ".yaml", ".yml"):
+            path = TOPOLOGY_DIR / f"{name}{extension}"
+            if path.is_file():
+                return cls.load(str(path))
+        raise FileNotFoundError(f"Topology spec not found: {name}")
+
+    @staticmethod
+    def available() -> List[str]:
+        """
+        Returns the names of all bundled specs.
+        """
+        return sorted(
+            os.path.splitext(entry)[0]
+            for entry in os.listdir(TOPOLOGY_DIR)
+            if entry.endswith((".json", ".yaml", ".yml"))
+        )
+
+    def render(self, user_id: str) -> Dict:
+        """
+        Substitutes the user id into the spec.
+
+        Returns:
+            dict: {"nodes": {<node id>: <base name>}, "networks": {<network name>: [<node id>, ...]},
+                   "subnets": {<network name>: <subnet>}, "routing": <protocol>, "capture": <CapturePolicy>}
+        """
+        networks = {}
+        subnets = {}
+        for link in self.links:
+            network_name = link["name"].replace("{user_id}", user_id)
+            networks[network_name] = list(link["nodes"])
+            if link.get("subnet"):
+                subnets[network_name] = link["subnet"]
+        return {
+            "nodes": {
+                node["id"]: node["base_name"].replace("{user_id}", user_id) for node in self.nodes
+            },
+            "networks": networks,
+            "subnets": subnets,
+            "routing": self.routing,
+            "capture": self.capture,
+        }
+
+    @staticmethod
+    def __generate(type: str, size: int, base_name: str = "node-{user_id}", link_name: str = "net-{user_id}-{index}"):
+        if type not in GENERATORS:
+            raise ValueError(f"Unknown topology generator '{type}', expected one of {GENERATORS}")
+        node_ids = [f"node{i}" for i in range(1, size + 1)]
+        if type == "star":
+            node_ids = ["central"] + node_ids[:-1]
+            pairs = [("central", node_id) for node_id in node_ids[1:]]
+        elif type == "full_mesh":
+            pairs = [(a, b) for i, a in enumerate(node_ids) for b in node_ids[i + 1:]]
+        else:
+            pairs = list(zip(node_ids, node_ids[1:]))
+            if type == "ring" and size > 2:
+                pairs.append((node_ids[-1], node_ids[0]))
+        nodes = [{"id": node_id, "base_name": base_name} for node_id in node_ids]
+        links = [
+            {"name": link_name.replace("{index}", str(index)), "nodes": list(pair)}
+            for index, pair in enumerate(pairs, start=1)
+        ]
+        return nodes, links
+
+    def __validate(self) -> None:
+        if self.routing not in ROUTING_PROTOCOLS:
+            raise ValueError(f"Unknown routing protocol '{self.routing}', expected one of {ROUTING_PROTOCOLS}")
+        node_ids = set()
+        for node in self.nodes:
+            if "id" not in node or "base_name" not in node:
+                raise ValueError(f"Node entries need an 'id' and a 'base_name': {node}")
+            if node["id"] in node_ids:
+                raise ValueError(f"Duplicate node id: {node['id']}")
+            node_ids.add(node["id"])
+        link_names = set()
+        for link in self.links:
+            if "name" not in link or not link.get("nodes"):
+                raise ValueError(f"Link entries need a 'name' and a list of 'nodes': {link}")
+            if link["name"] in link_names:
+                raise ValueError(f"Duplicate link name: {link['name']}")
+            link_names.add(link["name"])
+            unknown = [node_id for node_id in link["nodes"] if node_id not in node_ids]
+            if unknown:
+                raise ValueError(f"Link {link['name']} references unknown nodes: {unknown}")
@@ -1,13 +1,13 @@
-from ipaddress import ip_network
 import logging
 import re
 
 
-def create_ipv4_from_subnet(subnet: str, node_count: int) -> str:
-    network = ip_network(subnet, strict=False)
-    base_address_int = int(network.network_address)
-    new_address_int = base_address_int + node_count
-    return network.network_address.__class__(new_address_int).exploded
+def prefixlen_for_hosts(hosts: int, longest: int = 30) -> int:
+    """
+    Returns the longest IPv4 prefix length whose subnet holds the given number of hosts next to the network,
+    broadcast and gateway addresses, but at most 'longest'.
+    """
+    return min(longest, 32 - (hosts + 2).bit_length())
 
 
 def extract_number(name):
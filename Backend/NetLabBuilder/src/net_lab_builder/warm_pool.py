@@ -0,0 +1,207 @@
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+import docker
+from docker.models.containers import Container as DockerContainer
+
+from .config import _config
+from .container_state_cache import WARM_NAME_PREFIX, ContainerState, ContainerStateCache
+from .utils import LoggerFactory
+
+# Creates and starts a node container with the given name
+NodeFactory = Callable[[str], DockerContainer]
+
+
+class WarmNodes:
+    """
+    The pooled containers of one label key.
+
+    Attributes:
+        create (NodeFactory): Creates the containers of the pool, see DockerAdapter.warm_nodes.
+        size (int): The number of containers kept ready.
+        ready (Deque[Tuple[str, str]]): Id and name of the started containers that can be claimed, oldest first.
+        pending (int): The number of containers being created.
+    """
+
+    __slots__ = ("create", "size", "ready", "pending")
+
+    def __init__(self, create: NodeFactory, size: int) -> None:
+        self.create = create
+        self.size = size
+        self.ready: Deque[Tuple[str, str]] = deque()
+        self.pending = 0
+
+
+class WarmPool:
+    """
+    The WarmPool class keeps started, network-less node containers ready, so that DockerAdapter.create_node claims one
+    and only renames it instead of creating and starting a container while a topology is built.
+
+    Docker cannot change the labels or mounts of a container once it is created, so containers are pooled per label key
+    of a user's topologies: they carry the labels and the pcap volume of the user from the start and are named with
+    WARM_NAME_PREFIX, which ContainerStateCache.user_containers leaves out, until they are claimed. As the topology is not
+    known yet when they are created, claimed nodes lack the 'netlab.topology' label.
+
+    A pool is filled up to its size in the background by fill and refilled after every claim. Containers that die while
+    they wait are dropped from the pool, see the container state cache. Before the objects of a label are torn down, the
+    pool of the label is removed, so no containers are created while they are removed.
+
+    All methods are thread safe. One pool is shared by all DockerAdapters of a process, see WarmPool.shared.
+
+    Attributes:
+        hits (int): Nodes that were claimed from the pool.
+        misses (int): Nodes that were created because the pool of their label was empty.
+    """
+
+    __shared = None
+    __shared_lock = threading.Lock()
+
+    def __init__(self, client: docker.DockerClient, workers: int = None) -> None:
+        self.__logger = LoggerFactory.get_logger("WarmPool", log_level=_config["log_level"])
+        self.__client = client
+        self.__lock = threading.Lock()
+        self.__pools: Dict[str, WarmNodes] = {}
+        self.__executor = ThreadPoolExecutor(
+            max_workers=workers or _config["warm_pool_workers"], thread_name_prefix="WarmPool"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def shared(cls, client: docker.DockerClient) -> "WarmPool":
+        """
+        Returns the pool of the current process, creating it on first use.
+
+        Args:
+            client (docker.DockerClient): The client used to rename claimed containers and to remove surplus ones.
+
+        Returns:
+            WarmPool: The process-wide pool.
+        """
+        with cls.__shared_lock:
+            if cls.__shared is None:
+                pool = cls(client)
+                ContainerStateCache.shared(client).add_listener(pool.handle)
+                cls.__shared = pool
+            return cls.__shared
+
+    def fill(self, label: str, create: NodeFactory, size: int = None) -> None:
+        """
+        Keeps 'size' containers of a label ready and starts creating the missing ones in the background.
+
+        Args:
+            label (str): The label key of the containers.
+            create (NodeFactory): Creates and starts a container of the label with the given name.
+            size (int, optional): The number of containers kept ready. Defaults to the 'warm_pool_size' config value, 0
+                removes the pool like remove.
+        """
+        size = _config["warm_pool_size"] if size is None else size
+        with self.__lock:
+            if not size:
+                self.__pools.pop(label, None)
+                return
+            pool = self.__pools.get(label)
+            if pool is None:
+                pool = self.__pools[label] = WarmNodes(create, size)
+            pool.create = create
+            pool.size = size
+            self.__refill(label, pool)
+
+    def claim(self, label: str, name: str) -> Optional[DockerContainer]:
+        """
+        Takes a ready container of a label and renames it.
+
+        Args:
+            label (str): The label key of the container.
+            name (str): The name of the node.
+
+        Returns:
+            Optional[DockerContainer]: The renamed container, or None if the pool of the label is empty.
+
+        Raises:
+            docker.errors.APIError: If the container cannot be renamed, e.g. because the name is taken.
+        """
+        while True:
+            with self.__lock:
+                pool = self.__pools.get(label)
+                if pool is None or not pool.ready:
+                    self.misses += 1
+                    return None
+                container_id, warm_name = pool.ready.popleft()
+                self.hits += 1
+                self.__refill(label, pool)
+            try:
+                self.__client.api.rename(container_id, name)
+            except docker.errors.NotFound:
+                # Removed before the cache reported it, try the next one
+                with self.__lock:
+                    self.hits -= 1
+                continue
+            self.__logger.debug(f"Claimed {warm_name} as {name}")
+            return self.__client.containers.get(container_id)
+
+    def remove(self, label: str) -> None:
+        """
+        Forgets the pool of a label, e.g. before its objects are torn down. Its containers are left to the teardown and
+        containers still being created are removed once they are started.
+        """
+        with self.__lock:
+            self.__pools.pop(label, None)
+
+    def handle(self, action: str, state: ContainerState) -> None:
+        """
+        Drops containers that died or were removed from the pools. Registered with the container state cache.
+        """
+        if action not in ("die", "kill", "destroy") or not state.name.startswith(WARM_NAME_PREFIX):
+            return
+        with self.__lock:
+            for pool in self.__pools.values():
+                entry = (state.id, state.name)
+                if entry in pool.ready:
+                    pool.ready.remove(entry)
+
+    def stats(self) -> Dict:
+        """
+        Returns the hit and miss counts and the ready, pending and target containers of every pool.
+        """
+        with self.__lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "pools": {
+                    label: {"size": pool.size, "ready": len(pool.ready), "pending": pool.pending}
+                    for label, pool in self.__pools.items()
+                },
+            }
+
+    def __refill(self, label: str, pool: WarmNodes) -> None:
+        """
+        Starts creating the missing containers of a pool. Must be called with the lock held.
+        """
+        for _ in range(pool.size - len(pool.ready) - pool.pending):
+            pool.pending += 1
+            self.__executor.submit(self.__create, label, pool)
+
+    def __create(self, label: str, pool: WarmNodes) -> None:
+        name = f"{WARM_NAME_PREFIX}{uuid.uuid4().hex[:12]}"
+        try:
+            container = pool.create(name)
+        except Exception as e:
+            # Not retried, the next claim or fill tries again
+            self.__logger.error(f"Creating warm container {name} for {label} failed: {e}")
+            with self.__lock:
+                pool.pending -= 1
+            return
+        with self.__lock:
+            pool.pending -= 1
+            keep = self.__pools.get(label) is pool and len(pool.ready) < pool.size
+            if keep:
+                pool.ready.append((container.id, name))
+        if not keep:
+            try:
+                container.remove(force=True)
+            except docker.errors.APIError as e:
+                self.__logger.error(f"Removing surplus warm container {name} failed: {e}")
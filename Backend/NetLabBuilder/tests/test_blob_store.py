@@ -0,0 +1,64 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from src.net_lab_builder.services import blob_store
+from src.net_lab_builder.services.blob_store import BlobStore
+
+CONTENT = b"\xd4\xc3\xb2\xa1" + bytes(range(256)) * 5000
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "merged.pcap")
+        with open(self.source, "wb") as f:
+            f.write(CONTENT)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_stores_by_content_hash(self):
+        store = BlobStore(os.path.join(self.directory.name, "blobs"))
+        digest, size = store.put_file(self.source)
+        self.assertEqual((digest, size), (hashlib.sha256(CONTENT).hexdigest(), len(CONTENT)))
+        path, compressed = store.locate(digest)
+        self.assertFalse(compressed)
+        self.assertEqual(os.path.basename(os.path.dirname(path)), digest[:2])
+        self.assertEqual(b"".join(store.iter_chunks(digest)), CONTENT)
+
+        self.assertEqual(store.put_file(self.source), (digest, size))
+        self.assertEqual(os.listdir(os.path.join(store.root, "tmp")), [])
+        self.assertTrue(store.delete(digest))
+        self.assertIsNone(store.locate(digest))
+        self.assertFalse(store.delete(digest))
+
+    def test_pinned_and_referenced_blobs_are_kept(self):
+        store = BlobStore(os.path.join(self.directory.name, "blobs"))
+        digest, _ = store.put_file(self.source, pin=True)
+        self.assertFalse(store.delete(digest, unreferenced=lambda: True))
+        store.release(digest)
+        self.assertFalse(store.delete(digest, unreferenced=lambda: False))
+        self.assertTrue(store.delete(digest, unreferenced=lambda: True))
+        self.assertIsNone(store.locate(digest))
+
+    def test_rejects_invalid_digests(self):
+        store = BlobStore(os.path.join(self.directory.name, "blobs"))
+        with self.assertRaises(ValueError):
+            store.locate("../" * 20 + "etc/passwd")
+        with self.assertRaises(FileNotFoundError):
+            store.open("0" * 64)
+
+    @unittest.skipIf(blob_store.zstandard is None, "zstandard is not installed")
+    def test_zstd_compression(self):
+        store = BlobStore(os.path.join(self.directory.name, "blobs"), compression="zstd")
+        digest, size = store.put_file(self.source)
+        path, compressed = store.locate(digest)
+        self.assertTrue(compressed)
+        self.assertLess(os.path.getsize(path), size)
+        self.assertEqual(b"".join(store.iter_chunks(digest)), CONTENT)
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            BlobStore(os.path.join(self.directory.name, "blobs"), compression="lz4")
@@ -0,0 +1,57 @@
+import unittest
+
+from src.net_lab_builder.capture_policy import CapturePolicy, parse_segment, sort_segments
+
+
+class TestCapturePolicy(unittest.TestCase):
+    def test_tcpdump_command(self):
+        policy = CapturePolicy(snaplen=128, filter="not port 22", segment_mb=20, segment_seconds=3600)
+        self.assertEqual(
+            policy.tcpdump_command("lab_r1"),
+            ["tcpdump", "-i", "any", "-s", "128", "-C", "20", "-G", "3600", "-Z", "root",
+             "-w", "/pcap/lab_r1.%Y%m%d%H%M%S.pcap", "not port 22"],
+        )
+        self.assertEqual(CapturePolicy().tcpdump_command("lab_r1"), ["tcpdump", "-i", "any", "-w", "/pcap/lab_r1.pcap"])
+
+    def test_default_policy_does_not_rotate(self):
+        policy = CapturePolicy.from_dict()
+        self.assertFalse(policy.rotates)
+        self.assertEqual(policy.tcpdump_command("lab_r1"), ["tcpdump", "-i", "any", "-w", "/pcap/lab_r1.pcap"])
+
+    def test_parse_segment(self):
+        self.assertEqual(parse_segment("/pcap/lab_r1.pcap"), ("lab_r1", "", 0))
+        self.assertEqual(parse_segment("/pcap/lab_r1.pcap12"), ("lab_r1", "", 12))
+        self.assertEqual(parse_segment("/pcap/lab_r1.20240101120000.pcap3"), ("lab_r1", "20240101120000", 3))
+        self.assertIsNone(parse_segment("/pcap/notes.txt"))
+        self.assertEqual(
+            sort_segments(["/pcap/merged.pcap", "/pcap/merged.20240102000000.pcap", "/pcap/merged.20240101000000.pcap"],
+                          current=["/pcap/merged.pcap"]),
+            ["/pcap/merged.20240101000000.pcap", "/pcap/merged.20240102000000.pcap", "/pcap/merged.pcap"],
+        )
+
+    def test_expires_segments_beyond_the_ring_and_the_age(self):
+        segments = {f"/pcap/r1.pcap{index or ''}": (100, 1000 + index) for index in range(5)}
+        segments["/pcap/r2.pcap"] = (100, 0)
+        self.assertEqual(
+            CapturePolicy(segment_mb=1, max_segments=3).expired(segments, now=2000),
+            ["/pcap/r1.pcap", "/pcap/r1.pcap1"],
+        )
+        # The newest segment of a capture is kept however old it is
+        self.assertEqual(
+            CapturePolicy(segment_mb=1, max_age=998).expired(segments, now=2000),
+            ["/pcap/r1.pcap", "/pcap/r1.pcap1"],
+        )
+        self.assertEqual(
+            CapturePolicy(segment_mb=1, max_segments=3).expired(
+                segments, now=2000, removable=lambda path, size: path != "/pcap/r1.pcap1"
+            ),
+            ["/pcap/r1.pcap"],
+        )
+
+    def test_invalid_policies(self):
+        with self.assertRaises(ValueError):
+            CapturePolicy.from_dict({"ring": 3})
+        with self.assertRaises(ValueError):
+            CapturePolicy(segment_mb=-1)
+        with self.assertRaises(ValueError):
+            CapturePolicy(filter="tcp\nport 80")
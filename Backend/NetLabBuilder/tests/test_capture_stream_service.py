@@ -0,0 +1,65 @@
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+
+from src.net_lab_builder.services.capture_stream_service import join_captures, open_archive_capture, open_local_capture
+
+CONTENT = bytes(range(256)) * 4000
+
+
+def tar_chunks(files, chunk_size=1000):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name, content in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = 1700000000
+            archive.addfile(info, io.BytesIO(content))
+    data = buffer.getvalue()
+    return (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+
+
+class TestCaptureStream(unittest.TestCase):
+    def test_archive_is_streamed_in_chunks(self):
+        capture = open_archive_capture(tar_chunks([("merged.pcap", CONTENT)]), chunk_size=4096)
+        self.assertEqual((capture.size, capture.modified), (len(CONTENT), 1700000000))
+        chunks = list(capture)
+        self.assertEqual(b"".join(chunks), CONTENT)
+        self.assertLessEqual(max(map(len, chunks)), 4096)
+
+    def test_archive_without_file(self):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as archive:
+            directory = tarfile.TarInfo("pcap")
+            directory.type = tarfile.DIRTYPE
+            archive.addfile(directory)
+        with self.assertRaises(FileNotFoundError):
+            open_archive_capture([buffer.getvalue()])
+
+    def test_local_file_is_read_up_to_its_size_when_opened(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "merged.pcap")
+            with open(path, "wb") as f:
+                f.write(CONTENT)
+            capture = open_local_capture(path, chunk_size=1 << 16)
+            with open(path, "ab") as f:
+                f.write(b"appended by the merger")
+            self.assertEqual(capture.size, len(CONTENT))
+            self.assertEqual(b"".join(capture), CONTENT)
+            self.assertEqual(capture.metadata()["file_size"], len(CONTENT))
+
+    def test_segments_are_joined_into_one_capture(self):
+        header = b"\xd4\xc3\xb2\xa1" + b"\x00" * 20
+        segments = [header + b"first", header + b"second", header + b"third"]
+        with tempfile.TemporaryDirectory() as directory:
+            captures = []
+            for index, content in enumerate(segments):
+                path = os.path.join(directory, f"merged.{index}.pcap")
+                with open(path, "wb") as f:
+                    f.write(content)
+                captures.append(open_local_capture(path, chunk_size=10))
+            capture = join_captures(captures)
+            self.assertEqual(b"".join(capture), header + b"firstsecondthird")
+            self.assertEqual(capture.size, len(header + b"firstsecondthird"))
@@ -0,0 +1,101 @@
+import unittest
+
+from docker.models.containers import Container
+
+from src.net_lab_builder.container_state_cache import ContainerStateCache
+
+
+def sparse_container(container_id, name, state, labels):
+    # As returned by containers.list(sparse=True)
+    return Container(attrs={"Id": container_id, "Names": [f"/{name}"], "State": state, "Labels": labels})
+
+
+def event(action, container_id, **attributes):
+    return {"Type": "container", "Action": action, "Actor": {"ID": container_id, "Attributes": attributes}}
+
+
+class TestContainerStateCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ContainerStateCache()
+        self.cache.sync(
+            [
+                sparse_container("a", "node-1", "running", {"lab": ""}),
+                sparse_container("b", "node-2", "exited", {"lab": ""}),
+                sparse_container("c", "other", "running", {}),
+            ]
+        )
+
+    def test_sync_from_sparse_list(self):
+        self.assertEqual(self.cache.status("node-2"), "exited")
+        self.assertEqual(self.cache.names(label="lab", status="running"), ["node-1"])
+        self.assertIsNone(self.cache.get("missing"))
+
+    def test_events_update_state(self):
+        self.cache.handle(event("start", "b", name="node-2"))
+        self.cache.handle(event("die", "a", name="node-1", exitCode="0"))
+        self.assertEqual(self.cache.names(label="lab", status="running"), ["node-2"])
+
+    def test_new_container_takes_labels_from_event(self):
+        self.cache.handle(event("create", "d", name="node-3", image="frr-node-image", lab=""))
+        self.cache.handle(event("start", "d", name="node-3", image="frr-node-image", lab=""))
+        self.assertIn("node-3", self.cache.names(label="lab", status="running"))
+        self.assertNotIn("image", self.cache.get("node-3").labels)
+
+    def test_destroy_and_rename(self):
+        self.cache.handle(event("rename", "a", name="node-9", oldName="/node-1"))
+        self.cache.handle(event("destroy", "b", name="node-2"))
+        self.assertIsNone(self.cache.get("node-1"))
+        self.assertIsNone(self.cache.get("node-2"))
+        self.assertEqual(self.cache.status("node-9"), "running")
+
+    def test_exec_events_are_ignored(self):
+        self.cache.handle(event("exec_start: ls -1 /pcap", "a", name="node-1"))
+        self.assertEqual(self.cache.status("node-1"), "running")
+
+    def test_find_by_label_and_name(self):
+        self.cache.handle(event("create", "d", name="node-3", lab=""))
+        self.assertEqual([state.name for state in self.cache.find(label="lab")], ["node-1", "node-2", "node-3"])
+        self.assertEqual([state.name for state in self.cache.find(name_contains="node", status="running")], ["node-1"])
+        self.cache.handle(event("destroy", "a", name="node-1"))
+        self.assertEqual([state.name for state in self.cache.find(label="lab")], ["node-2", "node-3"])
+        self.assertEqual(self.cache.find(label="missing"), [])
+
+    def test_user_containers_by_exact_labels(self):
+        self.cache.sync(
+            [
+                sparse_container("a", "prototype-ab_r_101", "running", {"prototype-ab": "", "netlab.user": "ab", "netlab.role": "node"}),
+                sparse_container("b", "prototype-ab-pcap-merger", "running", {"prototype-ab": "", "netlab.user": "ab", "netlab.role": "pcap-merger"}),
+                sparse_container("c", "prototype-abc_r_101", "running", {"prototype-abc": "", "netlab.user": "abc", "netlab.role": "node"}),
+                # Created before the structured labels
+                sparse_container("d", "prototype-ab_r_102", "exited", {"prototype-ab": ""}),
+            ]
+        )
+        names = lambda states: [state.name for state in states]
+        self.assertEqual(names(self.cache.user_containers("ab")), ["prototype-ab-pcap-merger", "prototype-ab_r_101", "prototype-ab_r_102"])
+        self.assertEqual(names(self.cache.user_containers("ab", status="running", role="node")), ["prototype-ab_r_101"])
+        self.assertEqual(names(self.cache.user_containers("abc")), ["prototype-abc_r_101"])
+        self.cache.handle(event("destroy", "c", name="prototype-abc_r_101"))
+        self.assertEqual(self.cache.user_containers("abc"), [])
+
+    def test_user_containers_leave_out_warm_containers_until_claimed(self):
+        labels = {"prototype-ab": "", "netlab.user": "ab", "netlab.role": "node"}
+        self.cache.sync([sparse_container("a", "netlab-warm-0123", "running", labels)])
+        self.assertEqual(self.cache.user_containers("ab"), [])
+        self.cache.handle(event("rename", "a", name="prototype-ab_r_101"))
+        self.assertEqual([state.name for state in self.cache.user_containers("ab")], ["prototype-ab_r_101"])
+
+    def test_listeners_receive_events(self):
+        received = []
+        listener = lambda action, state: received.append((action, state.name, state.status))
+        self.cache.add_listener(listener)
+        self.cache.add_listener(lambda action, state: 1 / 0)
+        self.cache.handle(event("die", "a", name="node-1"))
+        self.cache.handle(event("exec_start: ls", "a", name="node-1"))
+        self.cache.handle(event("destroy", "a", name="node-1"))
+        self.cache.remove_listener(listener)
+        self.cache.handle(event("start", "b", name="node-2"))
+        self.assertEqual(received, [("die", "node-1", "exited"), ("destroy", "node-1", "exited")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import threading
+import unittest
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+from src.net_lab_builder.services.database_pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.closed = False
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise mysql.connector.errors.OperationalError("MySQL Connection not available")
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+
+    def connect(self, **config):
+        self.opened.append(FakeConnection())
+        return self.opened[-1]
+
+    def test_reuses_connections(self):
+        pool = ConnectionPool(size=2, timeout=1, health_check_interval=60, connect=self.connect)
+        for _ in range(3):
+            with pool.connection() as connection:
+                self.assertIs(connection, self.opened[0])
+        stats = pool.stats()
+        self.assertEqual((stats["acquired"], stats["opened"], stats["idle"]), (3, 1, 1))
+
+    def test_times_out_when_exhausted(self):
+        pool = ConnectionPool(size=1, timeout=0.05, health_check_interval=60, connect=self.connect)
+        with pool.connection():
+            with self.assertRaises(PoolError):
+                with pool.connection():
+                    pass
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_waits_for_a_free_connection(self):
+        pool = ConnectionPool(size=1, timeout=5, health_check_interval=60, connect=self.connect)
+        borrowed, release = threading.Event(), threading.Event()
+
+        def hold():
+            with pool.connection():
+                borrowed.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        borrowed.wait()
+        threading.Timer(0.05, release.set).start()
+        with pool.connection() as connection:
+            self.assertIs(connection, self.opened[0])
+        thread.join()
+        self.assertGreater(pool.stats()["wait_time_max"], 0.01)
+
+    def test_replaces_stale_and_failed_connections(self):
+        pool = ConnectionPool(size=1, timeout=1, health_check_interval=0, connect=self.connect)
+        with pool.connection() as connection:
+            connection.alive = False
+        with pool.connection() as connection:
+            self.assertIs(connection, self.opened[1])
+        self.assertTrue(self.opened[0].closed)
+
+        with self.assertRaises(RuntimeError):
+            with pool.connection():
+                raise RuntimeError()
+        self.assertTrue(self.opened[1].closed)
+        self.assertEqual(pool.stats()["idle"], 0)
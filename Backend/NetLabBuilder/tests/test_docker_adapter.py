@@ -0,0 +1,39 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import docker
+
+from src.net_lab_builder.docker_adapter import DockerAdapter
+
+
+@patch("src.net_lab_builder.docker_adapter.ImageRegistry")
+@patch("src.net_lab_builder.docker_adapter.WarmPool")
+@patch("src.net_lab_builder.docker_adapter.SubnetAllocator")
+@patch("src.net_lab_builder.docker_adapter.ContainerStateCache")
+class TestPcapMergeOnce(unittest.TestCase):
+    def adapter(self, cache, get):
+        # The cache has not seen the merger
+        cache.shared.return_value.status.return_value = None
+        client = MagicMock()
+        client.containers.get.side_effect = get
+        return DockerAdapter(label="prototype-alice", client=client), client
+
+    def test_stops_when_the_daemon_does_not_know_the_merger(self, cache, *_):
+        adapter, client = self.adapter(cache, docker.errors.NotFound("gone"))
+        self.assertFalse(adapter.pcap_merge_once())
+        client.containers.get.assert_called_with("prototype-alice-pcap-merger")
+
+    def test_skips_the_pass_when_the_merger_cannot_be_looked_up(self, cache, *_):
+        adapter, _ = self.adapter(cache, docker.errors.APIError("busy"))
+        self.assertTrue(adapter.pcap_merge_once())
+
+    def test_merges_with_a_merger_missing_from_the_cache(self, cache, *_):
+        adapter, _ = self.adapter(cache, None)
+        adapter._DockerAdapter__get_pcap_segments = MagicMock(return_value={})
+        adapter._DockerAdapter__get_pcap_files = MagicMock(return_value=[])
+        self.assertTrue(adapter.pcap_merge_once())
+        adapter._DockerAdapter__get_pcap_segments.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
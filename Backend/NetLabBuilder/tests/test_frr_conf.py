@@ -0,0 +1,50 @@
+import unittest
+
+from src.net_lab_builder.components.frr_conf import FrrConfig
+
+
+class TestFrrConfig(unittest.TestCase):
+    def test_add_ospf_network(self):
+        config = FrrConfig.template()
+        self.assertEqual(config.add_ospf_network("10.128.0.0/29"), "eth0")
+        self.assertEqual(config.add_ospf_network("10.128.0.8/29"), "eth1")
+        rendered = config.get_config()
+        self.assertIn("router ospf\n  network 10.128.0.0/29 area 0.0.0.0\n  network 10.128.0.8/29 area 0.0.0.0\n", rendered)
+        self.assertIn("interface eth1\n  ip ospf area 0.0.0.0\n", rendered)
+        self.assertTrue(rendered.startswith("hostname node"))
+
+    def test_add_ospf_network_on_detected_interface(self):
+        config = FrrConfig.template()
+        self.assertEqual(config.add_ospf_network("10.128.0.0/29", interface="eth3"), "eth3")
+        self.assertEqual(config.add_ospf_network("10.128.0.0/29", interface="eth3"), "eth3")
+        rendered = config.get_config()
+        self.assertEqual(rendered.count("interface eth3\n"), 1)
+        self.assertNotIn("interface eth0\n", rendered)
+
+    def test_round_trip(self):
+        config = FrrConfig.template()
+        config.add_ospf_network("10.128.0.0/29")
+        parsed = FrrConfig(config.get_config())
+        self.assertEqual(parsed.get_config(), config.get_config())
+        self.assertEqual(parsed.digest(), config.digest())
+        self.assertEqual(parsed.ospf_networks, ["10.128.0.0/29"])
+        self.assertEqual(parsed.add_ospf_network("10.128.0.8/29"), "eth1")
+
+    def test_digest_changes_with_content(self):
+        config = FrrConfig.template()
+        digest = config.digest()
+        self.assertEqual(FrrConfig.template().digest(), digest)
+        config.add_ospf_network("10.128.0.0/29")
+        self.assertNotEqual(config.digest(), digest)
+
+    def test_creates_router_ospf_section(self):
+        config = FrrConfig("hostname node\n")
+        config.add_ospf_network("172.101.0.0/16")
+        self.assertEqual(
+            config.get_config(),
+            "hostname node\nrouter ospf\n  network 172.101.0.0/16 area 0.0.0.0\ninterface eth0\n  ip ospf area 0.0.0.0\n",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
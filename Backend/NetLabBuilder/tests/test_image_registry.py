@@ -0,0 +1,66 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+import docker
+
+from src.net_lab_builder.image_registry import DIGEST_LABEL, ImageRegistry, dockerfile_digest
+
+
+class TestImageRegistry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.context = os.path.join(self.directory.name, "frr-node")
+        os.makedirs(os.path.join(self.context, "__pycache__"))
+        self.write("Dockerfile", "FROM frrouting/frr\n")
+        self.write("frr.conf", "hostname r1\n")
+        self.client = MagicMock()
+        self.built = MagicMock()
+        self.client.images.build.return_value = (self.built, [])
+        self.registry = ImageRegistry(self.client, self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.context, name), "w") as f:
+            f.write(content)
+
+    def test_digest_follows_the_build_context(self):
+        digest = dockerfile_digest(self.context)
+        self.write(os.path.join("__pycache__", "frr.pyc"), "bytecode")
+        self.assertEqual(dockerfile_digest(self.context), digest)
+        self.write("frr.conf", "hostname r2\n")
+        self.assertNotEqual(dockerfile_digest(self.context), digest)
+
+    def test_image_of_the_current_digest_is_reused(self):
+        image = MagicMock(labels={DIGEST_LABEL: dockerfile_digest(self.context)})
+        self.client.images.get.return_value = image
+        self.assertIs(self.registry.get("frr-node"), image)
+        self.assertIs(self.registry.get("frr-node"), image)
+        self.client.images.get.assert_called_once_with("frr-node-image")
+        self.client.images.build.assert_not_called()
+
+    def test_outdated_or_missing_image_is_built_once(self):
+        self.client.images.get.return_value = MagicMock(labels={DIGEST_LABEL: "outdated"})
+        threads = [threading.Thread(target=self.registry.get, args=("frr-node",)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.client.images.build.assert_called_once()
+        self.assertEqual(
+            self.client.images.build.call_args.kwargs["labels"][DIGEST_LABEL], dockerfile_digest(self.context)
+        )
+        self.assertEqual(self.registry.images(), {"frr-node": self.built})
+
+        registry = ImageRegistry(self.client, self.directory.name)
+        self.client.images.get.side_effect = docker.errors.ImageNotFound("frr-node-image")
+        registry.get("frr-node")
+        self.assertEqual(self.client.images.build.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from unittest import mock
+
+from src.net_lab_builder.live_capture import LivePacketHub, LiveSubscription
+from tests.test_pcap_analysis import TCP_SYN, ethernet
+
+
+class TestLiveSubscription(unittest.TestCase):
+    def test_rate_limit_drops_packets_beyond_the_rate(self):
+        subscription = LiveSubscription(max_rate=10, queue_size=100)
+        subscription.offer(list(range(25)))
+        packets, dropped = subscription.take(100, timeout=0)
+        self.assertEqual((packets, dropped), (list(range(10)), 15))
+        self.assertEqual(subscription.take(100, timeout=0), ([], 0))
+
+    def test_full_queue_drops_oldest_packets(self):
+        subscription = LiveSubscription(max_rate=100, queue_size=5)
+        subscription.offer(list(range(8)))
+        self.assertEqual(subscription.take(3, timeout=0), ([3, 4, 5], 3))
+        self.assertEqual(subscription.take(3, timeout=0), ([6, 7], 0))
+
+    def test_close_wakes_waiting_clients(self):
+        subscription = LiveSubscription(max_rate=100, queue_size=5)
+        subscription.close()
+        self.assertEqual(subscription.take(3, timeout=10), ([], 0))
+
+
+class TestLivePacketHub(unittest.TestCase):
+    def test_publishes_summaries_and_counters_to_subscribers(self):
+        hub = LivePacketHub()
+        packet = ethernet(TCP_SYN)
+        # Without subscribers nothing is decoded
+        with mock.patch("src.net_lab_builder.live_capture.dissect") as dissect:
+            hub.publish("lab-u1", "/pcap/lab-u1_r1.pcap", 1, [(0, len(packet), packet)])
+        dissect.assert_not_called()
+
+        subscription = hub.subscribe("lab-u1", max_rate=100)
+        hub.publish("lab-u1", "/pcap/lab-u1_r1.pcap", 1, [(1_500_000_000, len(packet), memoryview(packet))] * 2)
+        packets, _ = subscription.take(10, timeout=0)
+        self.assertEqual(len(packets), 2)
+        self.assertEqual(
+            {key: packets[0][key] for key in ("time", "node", "src", "dst", "protocol")},
+            {"time": 1.5, "node": "lab-u1_r1", "src": "10.0.0.1", "dst": "10.0.0.2", "protocol": "tcp"},
+        )
+        counters = hub.counters("lab-u1")
+        self.assertEqual(counters["nodes"], {"lab-u1_r1": {"packets": 2, "bytes": 2 * len(packet)}})
+        self.assertEqual(counters["links"], [{"source": "10.0.0.1", "target": "10.0.0.2", "packets": 2, "bytes": 2 * len(packet)}])
+
+        hub.unsubscribe("lab-u1", subscription)
+        self.assertEqual(hub.counters("lab-u1"), {"nodes": {}, "links": []})
+
+    def test_limits_clients_per_topology(self):
+        hub = LivePacketHub()
+        with mock.patch.dict("src.net_lab_builder.live_capture._config", live_capture_max_clients=1):
+            hub.subscribe("lab-u1")
+            with self.assertRaises(ValueError):
+                hub.subscribe("lab-u1")
+            hub.subscribe("lab-u2")
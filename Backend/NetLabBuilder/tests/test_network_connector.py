@@ -4,10 +4,11 @@ from unittest.mock import Mock, patch
 from src.net_lab_builder.network_controller import NetworkController
 from src.net_lab_builder.components.node import Node
 from src.net_lab_builder.components.network import Network
+from src.net_lab_builder.components.frr_conf import FrrConfig
 
 
 class TestNetworkController(unittest.TestCase):
-    @patch("src.net_lab_builder.docker_adapter.DockerAdapter")
+    @patch("src.net_lab_builder.network_controller.DockerAdapter")
     @patch("src.net_lab_builder.utils.LoggerFactory.get_logger")
     def setUp(self, mock_logger, mock_adapter):
         self.controller = NetworkController()
@@ -19,11 +20,13 @@ class TestNetworkController(unittest.TestCase):
         self.controller._NetworkController__generate_container_name = Mock(
             return_value=node_name
         )
+        self.controller.adapter.create_node.return_value.name = node_name
         self.controller.create_node()
         self.controller.adapter.create_node.assert_called_with(name=node_name)
 
     def test_get_node_by_name_or_id(self):
         node_id = "mock_node_id"
+        self.controller.adapter.get_container.return_value.name = "mock_node_name_101"
         self.controller.get_node_by_name_or_id(node_id=node_id)
         self.controller.adapter.get_container.assert_called_with(node_id)
 
@@ -45,10 +48,43 @@ class TestNetworkController(unittest.TestCase):
 
     def test_connect_node_to_network(self):
         network = Mock(spec=Network)
+        network.id = "mock_network_id"
+        network.name = "mock_network_name"
         node = Mock(spec=Node)
+        node.id = "mock_node_id"
         node.name = "mock_node_name"
+        node.container = Mock()
+        node.interfaces = []
+        node.frr_config = FrrConfig("router ospf\n")
+        node.wait_for_interface.return_value = "eth1"
+        network.subnet = "10.128.0.0/29"
         self.controller.connect_node_to_network(network, node)
-        network.connect_node.assert_called_with(node)
+        network.connect_node.assert_called_with(node, configure_routing=False)
+        node.wait_for_interface.assert_called_with(network.connect_node.return_value)
+        node.write_frr_config.assert_called_once()
+        node.reload_frr.assert_called_once()
+        self.assertEqual(node.interfaces, ["eth1"])
+        self.assertIn("interface eth1\n", node.write_frr_config.call_args[0][0].get_config())
+
+    @patch("src.net_lab_builder.network_controller.Network")
+    @patch("src.net_lab_builder.network_controller.Node")
+    def test_build_topology(self, mock_node, mock_network):
+        self.controller.adapter.get_containers.return_value = []
+        result = self.controller.build_topology(
+            {
+                "nodes": {"a": "node", "b": "node"},
+                "networks": {"net-1": ["a", "b"]},
+            }
+        )
+        self.assertEqual(set(result["nodes"]), {"a", "b"})
+        self.assertEqual(set(result["networks"]), {"net-1"})
+        self.assertEqual(self.controller.adapter.create_node.call_count, 2)
+        self.controller.adapter.create_network.assert_called_once_with(name="net-1", subnet=None, hosts=2)
+        self.assertIn("total", result["timings"])
+
+    def test_build_topology_unknown_node(self):
+        with self.assertRaises(ValueError):
+            self.controller.build_topology({"nodes": {}, "networks": {"net-1": ["a"]}})
 
     def test_pcap_merge(self):
         self.controller.pcap_merge()
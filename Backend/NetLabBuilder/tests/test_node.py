@@ -0,0 +1,35 @@
+import unittest
+from unittest.mock import MagicMock
+
+from src.net_lab_builder.components.node import Node
+
+
+class TestNode(unittest.TestCase):
+    def setUp(self):
+        self.container = MagicMock()
+        self.container.name = None
+        self.container.attrs = {"Names": ["/prototype-alice_node-alice_101"], "State": "running"}
+        self.container.status = "running"
+
+    def test_wraps_sparse_container_without_api_calls(self):
+        node = Node(self.container)
+        self.assertEqual(node.name, "prototype-alice_node-alice_101")
+        self.assertEqual(node.count, 101)
+        self.assertEqual(node.status, "running")
+        self.assertEqual(self.container.method_calls, [])
+
+    def test_frr_config_is_read_once(self):
+        # The config is read with a positional command and written through an exec socket
+        self.container.exec_run.side_effect = lambda *args, **kwargs: (0, b"router ospf\n") if args else MagicMock()
+        node = Node(self.container)
+        node.add_network(MagicMock(subnet="10.128.0.0/29"))
+        node.add_network(MagicMock(subnet="10.128.0.8/29"))
+        self.container.exec_run.assert_any_call("cat /etc/frr/frr.conf")
+        reads = [c for c in self.container.exec_run.call_args_list if c.args == ("cat /etc/frr/frr.conf",)]
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(node.interfaces, ["eth0", "eth1"])
+        self.assertIn("network 10.128.0.8/29 area 0.0.0.0", node.frr_config.get_config())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import struct
+import unittest
+
+from src.net_lab_builder.pcap_analysis import PcapAggregator, SummaryRowAggregator, analyze_capture, capture_metadata
+
+A, B = bytes((10, 0, 0, 1)), bytes((10, 0, 0, 2))
+
+
+def ipv4(src, dst, protocol, payload):
+    return bytes([0x45, 0, 0, 20 + len(payload), 0, 0, 0, 0, 64, protocol, 0, 0]) + src + dst + payload
+
+
+def ethernet(packet, ethertype=b"\x08\x00"):
+    return b"\x00" * 12 + ethertype + packet
+
+
+def pcap(packets):
+    data = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 262144, 1)
+    for seconds, packet in packets:
+        data += struct.pack("<IIII", seconds, 500000, len(packet), len(packet)) + packet
+    return data
+
+
+TCP_SYN = ipv4(A, B, 6, struct.pack("!HHIIBBHHH", 40000, 179, 7, 0, 0x50, 0x02, 1024, 0, 0))
+UDP_DNS = ipv4(B, A, 17, struct.pack("!HHHH", 53, 5353, 12, 0) + b"\x00" * 4)
+OSPF_HELLO = ipv4(A, bytes((224, 0, 0, 5)), 89, b"\x02\x01" + b"\x00" * 22)
+ARP_REQUEST = struct.pack("!HHBBH", 1, 0x0800, 6, 4, 1) + b"\x00" * 6 + A + b"\x00" * 6 + B
+CAPTURE = pcap([
+    (10, ethernet(TCP_SYN)),
+    (11, ethernet(UDP_DNS)),
+    (12, ethernet(OSPF_HELLO)),
+    (14, ethernet(ARP_REQUEST, b"\x08\x06")),
+])
+
+
+class TestPcapAnalysis(unittest.TestCase):
+    def test_single_pass_results(self):
+        results = analyze_capture(CAPTURE)
+        self.assertEqual(results["totals"], {"packets": 4, "bytes": sum(14 + len(p) for p in (TCP_SYN, UDP_DNS, OSPF_HELLO, ARP_REQUEST))})
+        self.assertEqual(results["protocols"], {"tcp": 1, "dns": 1, "ospf": 1, "arp": 1})
+        self.assertEqual(results["time_range"]["duration"], 4.0)
+        self.assertIn({"source": "10.0.0.1", "destination": "10.0.0.2", "packets": 1}, results["connections"])
+        self.assertEqual(len(results["connections"]), 3)
+
+    def test_summary_rows(self):
+        rows = analyze_capture(CAPTURE, [SummaryRowAggregator()])["rows"]
+        self.assertEqual(rows[0]["frame.protocols"], "eth:ethertype:ip:tcp")
+        self.assertEqual(rows[0]["_ws.col.Info"], "40000 → 179 [SYN] Seq=7 Ack=0 Win=1024 Len=0")
+        self.assertEqual(rows[1]["frame.time_relative"], "1.000000000")
+        self.assertEqual(rows[1]["frame.protocols"], "eth:ethertype:ip:udp:dns")
+        self.assertEqual(rows[2]["_ws.col.Info"], "Hello Packet")
+        self.assertEqual(rows[3]["_ws.col.Info"], "Who has 10.0.0.2? Tell 10.0.0.1")
+        self.assertEqual(rows[3]["ip.src"], "")
+
+    def test_metadata_has_exact_count(self):
+        metadata = capture_metadata(analyze_capture(CAPTURE))
+        self.assertEqual(metadata["packet_count"], 4)
+        self.assertEqual(metadata["estimated_packets"], 4)
+        self.assertIn("OSPF", metadata["protocols"])
+
+    def test_custom_aggregator(self):
+        class Ports(PcapAggregator):
+            name = "ports"
+
+            def __init__(self):
+                self.ports = set()
+
+            def add(self, packet):
+                if packet.dst_port is not None:
+                    self.ports.add(packet.dst_port)
+
+            def result(self):
+                return sorted(self.ports)
+
+        self.assertEqual(analyze_capture(CAPTURE, [Ports()]), {"ports": [179, 5353]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import struct
+import unittest
+
+from src.net_lab_builder.components.pcap_merger import PCapMerger
+
+
+def pcap_header(nanoseconds=False):
+    return struct.pack("<IHHiIII", 0xA1B23C4D if nanoseconds else 0xA1B2C3D4, 2, 4, 0, 0, 262144, 1)
+
+
+def record(seconds, fraction, payload=b"\x00" * 14):
+    return struct.pack("<IIII", seconds, fraction, len(payload), len(payload)) + payload
+
+
+class MemoryFiles:
+    def __init__(self):
+        self.files = {}
+        self.target = b""
+        self.reads = []
+
+    def read(self, offsets):
+        self.reads.append(dict(offsets))
+        chunks = {}
+        for path, offset in offsets.items():
+            if path in self.files:
+                offset = offset if len(self.files[path]) >= offset else 0
+                chunks[path] = (offset, self.files[path][offset:])
+        return chunks
+
+    def write(self, data, truncate):
+        self.target = data if truncate else self.target + data
+
+
+class TestPCapMerger(unittest.TestCase):
+    def setUp(self):
+        self.io = MemoryFiles()
+        self.merger = PCapMerger(self.io.read, self.io.write)
+
+    def timestamps(self):
+        data, position, result = self.io.target, 24, []
+        while position < len(data):
+            seconds, fraction, length, _ = struct.unpack_from("<IIII", data, position)
+            result.append((seconds, fraction))
+            position += 16 + length
+        return result
+
+    def test_merges_only_new_records(self):
+        self.io.files = {"a": pcap_header() + record(1, 0), "b": pcap_header() + record(2, 0)}
+        self.assertEqual(self.merger.merge(["a", "b"]), 1)
+        # Neither file grew, so the held back record of b is written
+        self.assertEqual(self.merger.merge(["a", "b"]), 1)
+        self.io.files["a"] += record(3, 0)
+        self.assertEqual(self.merger.merge(["a", "b"]), 1)
+        self.assertEqual(self.io.reads[-1], {"a": 54, "b": 54})
+        self.assertEqual(self.timestamps(), [(1, 0), (2, 0), (3, 0)])
+        self.assertEqual(self.io.target[:24], pcap_header())
+
+    def test_holds_back_records_newer_than_other_active_files(self):
+        self.io.files = {"a": pcap_header() + record(1, 0) + record(5, 0), "b": pcap_header() + record(2, 0)}
+        self.assertEqual(self.merger.merge(["a", "b"]), 2)
+        self.io.files["b"] += record(3, 0)
+        self.assertEqual(self.merger.merge(["a", "b"]), 1)
+        self.assertEqual(self.merger.merge(["a", "b"]), 1)
+        self.assertEqual(self.timestamps(), [(1, 0), (2, 0), (3, 0), (5, 0)])
+
+    def test_partial_record_is_read_again(self):
+        complete = pcap_header() + record(1, 0)
+        self.io.files = {"a": complete + record(2, 0)[:10]}
+        self.assertEqual(self.merger.merge(["a"]), 1)
+        self.assertEqual(self.merger.files["a"].offset, len(complete))
+        self.io.files["a"] = complete + record(2, 0)
+        self.assertEqual(self.merger.merge(["a"]), 1)
+
+    def test_converts_nanosecond_files(self):
+        self.io.files = {"a": pcap_header() + record(1, 500), "b": pcap_header(True) + record(1, 250000)}
+        self.merger.merge(["a", "b"])
+        self.merger.merge(["a", "b"])
+        self.assertEqual(self.timestamps(), [(1, 250), (1, 500)])
+
+    def test_truncated_file_is_read_from_start(self):
+        self.io.files = {"a": pcap_header() + record(1, 0) + record(2, 0)}
+        self.merger.merge(["a"])
+        self.io.files["a"] = pcap_header() + record(7, 0)
+        self.assertEqual(self.merger.merge(["a"]), 1)
+        self.assertEqual(self.timestamps(), [(1, 0), (2, 0), (7, 0)])
+
+    def test_skips_non_pcap_files(self):
+        self.io.files = {"a": pcap_header() + record(1, 0), "b": b"\x0a\x0d\x0d\x0a" + b"\x00" * 40}
+        self.assertEqual(self.merger.merge(["a", "b"]), 1)
+        self.assertTrue(self.merger.files["b"].skipped)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+    def test_observer_receives_new_packets_of_each_file(self):
+        observed = []
+        merger = PCapMerger(
+            self.io.read,
+            self.io.write,
+            observer=lambda path, linktype, packets: observed.append(
+                (path, linktype, [(timestamp, length, bytes(data)) for timestamp, length, data in packets])
+            ),
+        )
+        self.io.files = {"a": pcap_header() + record(1, 5, b"\x01" * 14), "b": pcap_header(nanoseconds=True)}
+        merger.merge(["a", "b"])
+        self.io.files["b"] += record(2, 7, b"\x02" * 14)
+        merger.merge(["a", "b"])
+        self.assertEqual(
+            observed,
+            [("a", 1, [(1_000_005_000, 14, b"\x01" * 14)]), ("b", 1, [(2_000_000_007, 14, b"\x02" * 14)])],
+        )
+
+    def test_new_target_and_merged_files(self):
+        self.io.files = {"a": pcap_header() + record(1, 0), "b": pcap_header() + record(2, 0)}
+        self.merger.merge(["a", "b"])
+        self.assertEqual(self.merger.target_size, len(self.io.target))
+        self.assertTrue(self.merger.merged_up_to("a", len(self.io.files["a"])))
+        # The record of b is held back until a catches up
+        self.assertFalse(self.merger.merged_up_to("b", len(self.io.files["b"])))
+        self.merger.start_new_target()
+        self.assertEqual(self.merger.merge(["a", "b"]), 1)
+        self.assertEqual(self.io.target, pcap_header() + record(2, 0))
+        self.assertTrue(self.merger.merged_up_to("b", len(self.io.files["b"])))
@@ -0,0 +1,82 @@
+import unittest
+
+from src.net_lab_builder.pcap_query import LRUCache, PacketQuery, page_packets
+from src.net_lab_builder.pcap_summary import PacketSummary
+
+A, B, C = "10.0.0.1", "10.0.0.2", "10.0.0.3"
+
+
+def summary_of(packets):
+    summary = PacketSummary()
+    for timestamp, src, dst, protocols, length in packets:
+        summary.append(timestamp, src, dst, protocols, length, "")
+    return PacketSummary.decode(summary.encode())
+
+
+SUMMARY = summary_of(
+    [
+        (0, A, B, "eth:ethertype:ip:tcp", 60),
+        (1_000_000_000, B, A, "eth:ethertype:ip:tcp", 1500),
+        (2_000_000_000, C, "224.0.0.5", "eth:ethertype:ip:ospf", 90),
+        (3_000_000_000, A, C, "eth:ethertype:ip:udp", 120),
+        (4_000_000_000, None, None, "eth:ethertype:arp", 42),
+    ]
+)
+
+
+def numbers(query, summary=SUMMARY, **page):
+    result = page_packets(summary, query.matches(summary), query, **page)
+    return [int(row["frame.number"]) for row in result["packets"]], result
+
+
+class TestPacketQuery(unittest.TestCase):
+    def test_index_survives_encoding(self):
+        self.assertEqual(list(SUMMARY.protocol_postings["tcp"]), [0, 1])
+        self.assertEqual(list(SUMMARY.address_postings[SUMMARY.addresses.index(A)]), [0, 1, 3])
+        self.assertTrue(SUMMARY.time_sorted)
+
+    def test_filters(self):
+        self.assertEqual(numbers(PacketQuery(ip=A))[0], [1, 2, 4])
+        self.assertEqual(numbers(PacketQuery(protocols=["OSPF", "arp"]))[0], [3, 5])
+        self.assertEqual(numbers(PacketQuery(ip=A, protocols=["tcp", "udp"], start=0.5))[0], [2, 4])
+        self.assertEqual(numbers(PacketQuery(start=1, end=3))[0], [2, 3, 4])
+        self.assertEqual(numbers(PacketQuery(ip="192.0.2.1"))[0], [])
+
+    def test_time_filter_without_time_order(self):
+        summary = summary_of([(5, A, B, "ip:tcp", 1), (1_000_000_005, A, B, "ip:tcp", 1), (0, A, B, "ip:tcp", 1)])
+        self.assertFalse(summary.time_sorted)
+        self.assertEqual(numbers(PacketQuery(ip=A, end=0.5), summary)[0], [1, 3])
+
+    def test_sorting(self):
+        self.assertEqual(numbers(PacketQuery(sort="length", descending=True))[0], [2, 4, 3, 1, 5])
+        self.assertEqual(numbers(PacketQuery(sort="src"))[0], [5, 1, 4, 2, 3])
+        self.assertEqual(numbers(PacketQuery(sort="protocol"))[0], [5, 3, 1, 2, 4])
+        with self.assertRaises(ValueError):
+            PacketQuery(sort="info")
+
+    def test_pagination(self):
+        page, result = numbers(PacketQuery(), offset=0, limit=2)
+        self.assertEqual((page, result["total"], result["next_offset"], result["next_cursor"]), ([1, 2], 5, 2, 2))
+        self.assertEqual(numbers(PacketQuery(), after=result["next_cursor"], limit=2)[0], [3, 4])
+        page, result = numbers(PacketQuery(), offset=4, limit=2)
+        self.assertEqual((page, result["next_offset"], result["next_cursor"]), ([5], None, None))
+
+        query = PacketQuery(ip=A, descending=True)
+        page, result = numbers(query, limit=1)
+        self.assertEqual(page, [4])
+        self.assertEqual(numbers(query, after=result["next_cursor"])[0], [2, 1])
+        with self.assertRaises(ValueError):
+            numbers(PacketQuery(sort="time"), after=1)
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.get_or_create("a", lambda: 1)
+        cache.get_or_create("b", lambda: 2)
+        cache.get_or_create("a", lambda: 0)
+        cache.get_or_create("c", lambda: 3)
+        self.assertEqual(cache.get_or_create("a", lambda: 0), 1)
+        self.assertEqual(cache.get_or_create("b", lambda: 0), 0)
+        cache.discard(lambda key: key == "b")
+        self.assertIsNone(cache.get_or_create("b", lambda: None))
@@ -0,0 +1,86 @@
+import io
+import os
+import struct
+import tempfile
+import unittest
+
+from src.net_lab_builder.pcap_reader import count_ipv4_pairs, ipv4_pair, iter_records, open_capture
+
+
+def ipv4(src, dst):
+    return bytes([0x45, 0, 0, 20, 0, 0, 0, 0, 64, 17, 0, 0]) + bytes(src) + bytes(dst)
+
+
+def pcap(linktype, packets, byte_order="<"):
+    data = struct.pack(byte_order + "IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 262144, linktype)
+    for seconds, packet in enumerate(packets):
+        data += struct.pack(byte_order + "IIII", seconds, 0, len(packet), len(packet)) + packet
+    return data
+
+
+def pcapng_block(block_type, body):
+    body += b"\x00" * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+A, B = (10, 0, 0, 1), (10, 0, 0, 2)
+ETHERNET = b"\x00" * 12 + b"\x08\x00" + ipv4(A, B)
+VLAN = b"\x00" * 12 + b"\x81\x00\x00\x05\x08\x00" + ipv4(B, A)
+ARP = b"\x00" * 12 + b"\x08\x06" + b"\x00" * 28
+
+
+class TestPcapReader(unittest.TestCase):
+    def test_ethernet_with_vlan(self):
+        counts = count_ipv4_pairs(pcap(1, [ETHERNET, VLAN, ETHERNET, ARP]))
+        self.assertEqual({ipv4_pair(key): count for key, count in counts.items()}, {("10.0.0.1", "10.0.0.2"): 2, ("10.0.0.2", "10.0.0.1"): 1})
+
+    def test_linux_cooked_captures(self):
+        sll = b"\x00" * 14 + b"\x08\x00" + ipv4(A, B)
+        sll2 = b"\x08\x00" + b"\x00" * 18 + ipv4(A, B)
+        self.assertEqual(sum(count_ipv4_pairs(pcap(113, [sll, sll])).values()), 2)
+        self.assertEqual(sum(count_ipv4_pairs(pcap(276, [sll2])).values()), 1)
+
+    def test_big_endian_and_truncated_record(self):
+        data = pcap(101, [ipv4(A, B), ipv4(A, B)], byte_order=">")
+        self.assertEqual(len(list(iter_records(data[:-5]))), 1)
+
+    def test_pcapng(self):
+        section = pcapng_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+        # Interface with nanosecond timestamps
+        interface = pcapng_block(1, struct.pack("<HHI", 1, 0, 0) + struct.pack("<HHB", 9, 1, 9) + b"\x00" * 7)
+        packet = pcapng_block(6, struct.pack("<IIIII", 0, 0, 1500, len(ETHERNET), len(ETHERNET)) + ETHERNET)
+        records = list(iter_records(section + interface + packet + packet))
+        self.assertEqual([(linktype, timestamp) for linktype, timestamp, _, _, _ in records], [(1, 1500), (1, 1500)])
+        self.assertEqual(sum(count_ipv4_pairs(section + interface + packet).values()), 1)
+
+    def test_open_capture_maps_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "a.pcap")
+            with open(path, "wb") as f:
+                f.write(pcap(1, [ETHERNET]))
+            with open_capture(path) as capture:
+                self.assertEqual(sum(count_ipv4_pairs(capture).values()), 1)
+            open(path, "wb").close()
+            with open_capture(path) as capture:
+                self.assertEqual(count_ipv4_pairs(capture), {})
+
+    def test_sources(self):
+        data = pcap(1, [ETHERNET, VLAN])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "a.pcap")
+            with open(path, "wb") as f:
+                f.write(data)
+            with open(path, "rb") as f:
+                sources = [path, data, bytearray(data), memoryview(data), io.BytesIO(data), f, io.BufferedReader(io.BytesIO(data))]
+                for source in sources:
+                    with open_capture(source) as capture:
+                        self.assertEqual(sum(count_ipv4_pairs(capture).values()), 2)
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            list(iter_records(b"not a capture"))
+
+
+if __name__ == "__main__":
+    unittest.main()
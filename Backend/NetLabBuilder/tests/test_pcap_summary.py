@@ -0,0 +1,43 @@
+import json
+import unittest
+
+from src.net_lab_builder.pcap_analysis import SummaryRowAggregator, analyze_capture, default_aggregators
+from src.net_lab_builder.pcap_summary import PacketSummary, format_relative_time
+from tests.test_pcap_analysis import A, B, CAPTURE, TCP_SYN, ethernet, ipv4, pcap
+
+
+class TestPacketSummary(unittest.TestCase):
+    def test_round_trip_matches_rows(self):
+        results = analyze_capture(CAPTURE, default_aggregators() + [SummaryRowAggregator()])
+        decoded = PacketSummary.decode(results["summary"].encode())
+        self.assertEqual(decoded.rows(), results["rows"])
+        self.assertEqual(decoded.rows(1, 3), results["rows"][1:3])
+        self.assertEqual(decoded.to_columns(), results["summary"].to_columns())
+
+    def test_ipv6_addresses(self):
+        summary = PacketSummary()
+        summary.append(5, "fe80::1", "ff02::5", "eth:ethertype:ipv6:ospf", 90, "Hello Packet")
+        row = PacketSummary.decode(summary.encode()).row(0)
+        self.assertEqual((row["ip.src"], row["ipv6.src"], row["ipv6.dst"]), ("", "fe80::1", "ff02::5"))
+
+    def test_encoded_size(self):
+        packets = []
+        for i in range(2000):
+            payload = ipv4(A, B, 17, bytes([0x02, 0x08, 0x02, 0x08, 0, 12, 0, 0]) + b"\x00" * 4) if i % 2 else TCP_SYN
+            packets.append((1000 + i // 100, ethernet(payload)))
+        results = analyze_capture(pcap(packets), default_aggregators() + [SummaryRowAggregator()])
+        rows_json = json.dumps(results["rows"], indent=2).encode()
+        self.assertLess(len(results["summary"].encode()) * 10, len(rows_json))
+        self.assertLess(len(json.dumps(results["summary"].to_columns())) * 5, len(rows_json))
+
+    def test_format_relative_time(self):
+        self.assertEqual(format_relative_time(1_000_250_000), "1.000250000")
+        self.assertEqual(format_relative_time(-5), "-0.000000005")
+
+    def test_rejects_other_blobs(self):
+        with self.assertRaises(ValueError):
+            PacketSummary.decode(b'[{"frame.number": "1"}]')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from src.net_lab_builder.subnet_allocator import SubnetAllocator
+from src.net_lab_builder.utils import prefixlen_for_hosts
+
+
+def docker_network(network_id, subnet):
+    network = MagicMock()
+    network.id = network_id
+    network.attrs = {"IPAM": {"Config": [{"Subnet": subnet}]}}
+    return network
+
+
+class TestSubnetAllocator(unittest.TestCase):
+    def setUp(self):
+        self.allocator = SubnetAllocator(pool=("172.101.0.0", "172.104.255.255"), prefixlen=16)
+
+    def test_skips_used_subnets(self):
+        self.allocator.sync([docker_network("a", "172.101.0.0/16"), docker_network("b", "172.102.5.0/24")])
+        self.assertEqual(self.allocator.allocate(), "172.103.0.0/16")
+        self.assertEqual(self.allocator.free, 1)
+
+    def test_exhausted_pool(self):
+        for _ in range(4):
+            self.allocator.allocate()
+        with self.assertRaises(ValueError):
+            self.allocator.allocate()
+
+    def test_destroyed_network_is_reused(self):
+        subnet = self.allocator.allocate()
+        self.allocator.bind(subnet, "net-1")
+        self.allocator.allocate()
+        self.allocator.network_removed("net-1")
+        self.assertEqual(self.allocator.allocate(), subnet)
+
+    def test_create_event_before_bind_is_counted_once(self):
+        subnet = self.allocator.allocate()
+        self.allocator.network_created("net-1", subnet)
+        self.allocator.bind(subnet, "net-1")
+        self.allocator.network_removed("net-1")
+        self.assertEqual(self.allocator.free, 4)
+
+    def test_release_and_block(self):
+        subnet = self.allocator.allocate()
+        self.allocator.release(subnet)
+        self.allocator.block(subnet)
+        self.assertNotEqual(self.allocator.allocate(), subnet)
+        self.allocator.sync([])
+        self.assertEqual(self.allocator.free, 2)
+
+    def test_small_subnets_from_large_pool(self):
+        allocator = SubnetAllocator(pool=("10.0.0.0", "10.255.255.255"), prefixlen=29)
+        allocator.sync([docker_network("a", "10.0.0.0/28")])
+        self.assertEqual(allocator.allocate(), "10.0.0.16/29")
+        self.assertEqual(allocator.size, 2 ** 21)
+
+    def test_larger_subnets_are_aligned(self):
+        allocator = SubnetAllocator(pool=("10.0.0.0", "10.0.0.255"), prefixlen=29)
+        self.assertEqual(allocator.allocate(), "10.0.0.0/29")
+        self.assertEqual(allocator.allocate(prefixlen_for_hosts(6, 29)), "10.0.0.16/28")
+        self.assertEqual(allocator.allocate(), "10.0.0.32/29")
+        self.assertEqual(allocator.allocate(prefixlen_for_hosts(2, 29)), "10.0.0.40/29")
+        self.assertEqual(allocator.allocate(26), "10.0.0.64/26")
+        with self.assertRaises(ValueError):
+            allocator.allocate(24)
+
+    def test_concurrent_allocations_are_unique(self):
+        allocator = SubnetAllocator(pool=("10.0.0.0", "10.0.255.255"), prefixlen=29)
+        subnets = []
+
+        def allocate():
+            for _ in range(200):
+                subnets.append(allocator.allocate())
+
+        threads = [threading.Thread(target=allocate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(subnets)), 1600)
+
+
+if __name__ == "__main__":
+    unittest.main()
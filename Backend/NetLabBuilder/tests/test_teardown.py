@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock
+
+import docker
+from docker.models.containers import Container
+
+from src.net_lab_builder.teardown import teardown
+
+
+def sparse_container(container_id, name, state):
+    # As returned by containers.list(sparse=True)
+    return Container(attrs={"Id": container_id, "Names": [f"/{name}"], "State": state})
+
+
+def named(name):
+    obj = MagicMock()
+    obj.name = name
+    return obj
+
+
+class TestTeardown(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.containers.list.return_value = [
+            sparse_container("a", "r1", "running"),
+            sparse_container("b", "r2", "exited"),
+            sparse_container("c", "gone", "running"),
+        ]
+        self.client.api.remove_container.side_effect = lambda container_id, force: (
+            self.raise_(docker.errors.NotFound("gone")) if container_id == "c" else None
+        )
+        self.network = named("link-1")
+        self.client.networks.list.return_value = [self.network]
+        self.volume = named("pcap")
+        self.client.volumes.list.return_value = [self.volume]
+
+    @staticmethod
+    def raise_(error):
+        raise error
+
+    def test_removes_everything_with_the_label(self):
+        progress = []
+        result = teardown(self.client, "lab", grace=1, workers=4, progress=lambda *args: progress.append(args))
+        self.assertEqual(
+            result, {"containers": ["r1", "r2", "gone"], "networks": ["link-1"], "volumes": ["pcap"], "errors": []}
+        )
+        # Only running containers get their grace period
+        stopped = sorted(call.args[0] for call in self.client.api.stop.call_args_list)
+        self.assertEqual(stopped, ["a", "c"])
+        self.client.containers.list.assert_called_once_with(all=True, sparse=True, filters={"label": "lab"})
+        self.volume.remove.assert_called_once_with(force=True)
+        self.assertEqual(progress[0], ("containers", 0, 3))
+        self.assertEqual(progress[-1], ("volumes", 1, 1))
+
+    def test_errors_are_reported(self):
+        self.network.remove.side_effect = docker.errors.APIError("in use")
+        self.network.attrs = {"Containers": {}}
+        result = teardown(self.client, "lab", grace=0, volumes=False)
+        self.assertEqual(result["networks"], [])
+        self.assertEqual(len(result["errors"]), 1)
+        self.assertIn("link-1", result["errors"][0])
+        self.client.api.stop.assert_not_called()
+        self.client.volumes.list.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from unittest.mock import MagicMock
+
+from docker.models.containers import Container
+
+from src.net_lab_builder.docker_adapter import DockerAdapter
+from src.net_lab_builder.topology_builder import TopologyBuilder
+from src.net_lab_builder.topology_spec import TopologySpec
+
+
+def sparse_container(name, role):
+    # As returned by containers.list(sparse=True)
+    labels = {"prototype-alice": "", "netlab.user": "alice", "netlab.role": role}
+    return Container(attrs={"Id": name, "Names": [f"/{name}"], "State": "running", "Labels": labels}, client=MagicMock())
+
+
+class TestTopologyBuilder(unittest.TestCase):
+    def test_apply_keeps_warm_containers_and_the_merger(self):
+        containers = [
+            sparse_container("netlab-warm-0123", "node"),
+            sparse_container("prototype-alice-pcap-merger", "pcap-merger"),
+            sparse_container("prototype-alice_old_101", "node"),
+        ]
+        controller = MagicMock()
+        controller.label = "prototype-alice"
+        controller.adapter.get_containers.return_value = containers
+        controller.adapter.get_node_containers = lambda sparse=False: DockerAdapter.get_node_containers(
+            controller.adapter, sparse
+        )
+        controller.adapter.get_networks.return_value = []
+        controller.build_topology.return_value = {}
+
+        result = TopologyBuilder(controller, "alice").apply(TopologySpec.by_name("star"))
+
+        self.assertEqual(result["removed"]["nodes"], ["prototype-alice_old_101"])
+        self.assertEqual(len(controller.build_topology.call_args.args[0]["nodes"]), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
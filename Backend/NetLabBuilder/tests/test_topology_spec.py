@@ -0,0 +1,41 @@
+import unittest
+
+from src.net_lab_builder.topology_spec import TopologySpec
+
+
+class TestTopologySpec(unittest.TestCase):
+    def test_bundled_specs_load(self):
+        for name in TopologySpec.available():
+            spec = TopologySpec.by_name(name)
+            self.assertTrue(spec.nodes)
+            self.assertTrue(spec.links)
+
+    def test_render_substitutes_user_id(self):
+        spec = TopologySpec.by_name("star")
+        plan = spec.render("alice")
+        self.assertEqual(plan["nodes"]["central"], "central-alice")
+        self.assertEqual(plan["networks"]["net-alice-1"], ["central", "node1"])
+        self.assertEqual(plan["routing"], "ospf")
+
+    def test_generate_ring(self):
+        spec = TopologySpec({"generate": {"type": "ring", "size": 200}})
+        self.assertEqual(len(spec.nodes), 200)
+        self.assertEqual(len(spec.links), 200)
+        self.assertEqual(spec.links[-1]["nodes"], ["node200", "node1"])
+
+    def test_unknown_node_in_link(self):
+        with self.assertRaises(ValueError):
+            TopologySpec(
+                {
+                    "nodes": [{"id": "a", "base_name": "node"}],
+                    "links": [{"name": "net", "nodes": ["a", "b"]}],
+                }
+            )
+
+    def test_unknown_spec(self):
+        with self.assertRaises(FileNotFoundError):
+            TopologySpec.by_name("../../setup")
+
+
+if __name__ == "__main__":
+    unittest.main()
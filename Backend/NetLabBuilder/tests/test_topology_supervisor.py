@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.net_lab_builder.services import topology_supervisor
+from src.net_lab_builder.services.topology_supervisor import TopologySupervisor
+
+
+class TestTopologySupervisor(unittest.TestCase):
+    def setUp(self):
+        self.supervisor = TopologySupervisor(client=MagicMock())
+        self.events = []
+        self.applying = threading.Event()
+        self.release = threading.Event()
+        controller_patch = patch.object(topology_supervisor, "NetworkController")
+        builder_patch = patch.object(topology_supervisor, "TopologyBuilder")
+        self.controller = controller_patch.start().return_value
+        self.builder = builder_patch.start().return_value
+        self.addCleanup(controller_patch.stop)
+        self.addCleanup(builder_patch.stop)
+        self.addCleanup(self.supervisor.shutdown)
+        self.controller.stop_user_topology.side_effect = lambda: self.events.append("teardown")
+        self.builder.apply.side_effect = self.apply
+
+    def apply(self, spec, progress=None):
+        self.applying.set()
+        self.release.wait(5)
+        self.events.append("built")
+        return {"timings": {}}
+
+    def wait_until_unmanaged(self, user_id):
+        for _ in range(500):
+            if self.supervisor.status(user_id) is None:
+                return
+            time.sleep(0.01)
+        self.fail(f"Topology of {user_id} is still managed: {self.supervisor.status(user_id)}")
+
+    def test_stop_during_build_tears_down_after_the_build(self):
+        spec = MagicMock()
+        spec.name = "star"
+        self.supervisor.start("u1", spec)
+        self.assertTrue(self.applying.wait(5))
+
+        self.assertEqual(self.supervisor.stop("u1")["phase"], "stopping")
+        time.sleep(0.05)
+        self.assertEqual(self.events, [])
+        self.release.set()
+
+        self.wait_until_unmanaged("u1")
+        self.assertEqual(self.events, ["built", "teardown"])
+
+    def test_stop_during_failed_build_rolls_back_once(self):
+        spec = MagicMock()
+        spec.name = "star"
+        self.builder.apply.side_effect = lambda spec, progress=None: (self.applying.set(), self.release.wait(5), 1 / 0)
+        self.supervisor.start("u1", spec)
+        self.assertTrue(self.applying.wait(5))
+        self.supervisor.stop("u1")
+        self.release.set()
+
+        self.wait_until_unmanaged("u1")
+        self.assertEqual(self.events, ["teardown"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from src.net_lab_builder.container_state_cache import ContainerState
+from src.net_lab_builder.warm_pool import WarmPool
+
+
+class TestWarmPool(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.containers.get.side_effect = lambda container_id: f"container {container_id}"
+        # One worker, so containers become ready in the order they were created
+        self.pool = WarmPool(self.client, workers=1)
+        self.created = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def create(self, name):
+        self.release.wait()
+        container = MagicMock()
+        container.id = f"id-{len(self.created)}"
+        self.created.append((container.id, name, container))
+        return container
+
+    def wait_ready(self, label, ready):
+        for _ in range(200):
+            pools = self.pool.stats()["pools"]
+            if pools.get(label, {}).get("ready", 0) == ready and not pools[label]["pending"]:
+                return
+            time.sleep(0.01)
+        self.fail(f"Pool {label} has not {ready} ready containers: {self.pool.stats()}")
+
+    def test_claim_renames_and_refills(self):
+        self.pool.fill("lab-u1", self.create, 2)
+        self.wait_ready("lab-u1", 2)
+        self.assertEqual(self.pool.claim("lab-u1", "r1"), "container id-0")
+        self.client.api.rename.assert_called_once_with("id-0", "r1")
+        self.wait_ready("lab-u1", 2)
+        self.assertEqual(len(self.created), 3)
+        self.assertIsNone(self.pool.claim("lab-u2", "r1"))
+        self.assertEqual((self.pool.hits, self.pool.misses), (1, 1))
+
+    def test_dead_containers_are_dropped(self):
+        self.pool.fill("lab-u1", self.create, 1)
+        self.wait_ready("lab-u1", 1)
+        _, name, _ = self.created[0]
+        self.pool.handle("die", ContainerState("id-0", name, "exited", {}))
+        self.assertEqual(self.pool.stats()["pools"]["lab-u1"]["ready"], 0)
+
+    def test_containers_created_after_remove_are_removed(self):
+        self.release.clear()
+        self.pool.fill("lab-u1", self.create, 1)
+        self.pool.remove("lab-u1")
+        self.release.set()
+        for _ in range(200):
+            if self.created and self.created[0][2].remove.called:
+                break
+            time.sleep(0.01)
+        self.created[0][2].remove.assert_called_once_with(force=True)
+        self.assertEqual(self.pool.stats()["pools"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,23 +1,18 @@
-from scapy.all import rdpcap
 import json
 import sys
 import os
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Backend", "NetLabBuilder", "src"))
+
+from net_lab_builder.pcap_reader import count_ipv4_pairs, ipv4_pair, open_capture
+
 def parse_pcap(file_path):
-    packets = rdpcap(file_path)
-    connections = {}
-
-    for pkt in packets:
-        if pkt.haslayer('IP'):
-            src = pkt['IP'].src
-            dst = pkt['IP'].dst
-            key = (src, dst)
-            if key not in connections:
-                connections[key] = 0
-            connections[key] += 1
+    with open_capture(file_path) as capture:
+        connections = count_ipv4_pairs(capture)
 
     result = []
-    for (src, dst), count in connections.items():
+    for key, count in connections.items():
+        src, dst = ipv4_pair(key)
         result.append({
             "source": src,
             "destination": dst,